@@ -3,33 +3,124 @@ Author: Kia Kalani
 Version: 1.00
 This module is responsible for setting up the
 database all around the project.
-Last Revised: 9/24/24
+Last Revised: 10/18/26
 '''
+import contextvars
+import functools
+import importlib
+import os
+import threading
+import click
 from flask import current_app
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker, declarative_base
+from flask.cli import AppGroup
+from sqlalchemy.orm import configure_mappers, scoped_session, sessionmaker, declarative_base
+from server.DB.engine import create_db_engine, create_read_engines
+from server.DB.routing import SXRoutingSession
+
+# The modules defining the orm models, imported in this order
+AS_MODEL_MODULES = (
+    'server.DB.versions',
+    'server.DB.sxuser',
+    'server.DB.sxcustomer',
+    'server.DB.sxpatient',
+    'server.DB.sxproduct',
+    'server.DB.sxinvoice',
+    'server.DB.sxsales',
+    'server.DB.sxstock',
+    'server.DB.changes'
+)
+
+class _QueryProperty:
+    '''
+    Model.query, a query of the model in the session of the current app.
+    '''
+
+    def __get__(self, o_instance, o_owner):
+        return current_app.config['DB']['session'].query(o_owner)
+
+# The base of every model. It does not depend on any app so the models
+# can be imported once per process and shared by all of the apps.
+SXBase = declarative_base()
+SXBase.query = _QueryProperty()
+
+# The key of the session used by the async requests (see server.DB.aio).
+# Requests served by threads get a session per thread.
+o_session_scope = contextvars.ContextVar('sx_session_scope', default=None)
+
+def _session_scope():
+    o_scope = o_session_scope.get()
+    return threading.get_ident() if o_scope is None else o_scope
+
+def load_models() -> None:
+    '''
+    A method for importing every module of AS_MODEL_MODULES so that all
+    of the models are mapped. The modules are only imported once per process.
+    '''
+    for s_module in AS_MODEL_MODULES:
+        importlib.import_module(s_module)
+    configure_mappers()
 
 def init():
     '''
     A method for setting up the database and add
-    all the necessary models.
+    all the necessary models. The schema is not touched,
+    it gets upgraded by create_schema (flask db upgrade).
     '''
-    # Creating db instance
-    engine = create_engine(f'sqlite:///test.db')
-    db_session = scoped_session(sessionmaker(autoflush=False, bind=engine))
-    base = declarative_base()
-    base.query = db_session.query_property()
+    # Creating db instance from DATABASE_URL (see server.DB.engine)
+    engine = create_db_engine(current_app.config)
+    # The engines of the read_only functions (see server.DB.routing)
+    ao_readers = create_read_engines(current_app.config, engine)
+    db_session = scoped_session(
+        sessionmaker(
+            class_=SXRoutingSession,
+            autoflush=False,
+            bind=engine,
+            ao_readers=ao_readers
+        ),
+        scopefunc=_session_scope
+    )
 
     current_app.config['DB'] = {
         'engine': engine,
+        'read_engines': ao_readers,
         'session': db_session,
-        'base': base
+        'base': SXBase
     }
+    load_models()
+    # A forked worker must not reuse the connections of its parent
+    for o_engine in [engine, *ao_readers]:
+        os.register_at_fork(after_in_child=functools.partial(o_engine.dispose, close=False))
+
+    # The log of the changes the clients follow (see server.REST.changes),
+    # which reads the tables collected by the versions below
+    import server.DB.changes as changes
+    current_app.config['DB']['changes'] = changes.SXChangeFeed(
+        engine,
+        int(current_app.config.get('CHANGES_BUFFER', 10000)),
+        float(current_app.config.get('CHANGES_POLL', 1.0))
+    )
+    changes.track_changes(db_session.session_factory, current_app.config['DB']['changes'].wake)
+
+    # Versions of the tables for the caches derived from them
+    import server.DB.versions as versions
+    current_app.config['DB']['versions'] = versions.SXTableVersions(
+        engine,
+        float(current_app.config.get('TABLE_VERSION_REFRESH', 1.0))
+    )
+    versions.track_table_changes(db_session.session_factory, current_app.config['DB']['versions'])
+
+def create_schema(i_target: int = None, fn_log=None) -> list[int]:
+    '''
+    A method for upgrading the schema of the database to its latest
+    version (see server.DB.migrations). It must run within the app
+    context after init.
+    :param: i_target: the version to stop at, the latest by default.
+    :param: fn_log: a function called with a line for every version applied.
+    :return: the versions applied.
+    '''
+    import server.DB.migrations as migrations
+    return migrations.upgrade(current_app.config['DB']['engine'], i_target, fn_log)
 
-    # Loading all of the orm models
-    from server.DB.sxuser import SXUser
-    base.metadata.create_all(bind=engine)
-    
 def teardown():
     '''
     A method for removing the database instance
@@ -39,3 +130,36 @@ def teardown():
     def remove_db(exc=None):
         current_app.config['DB']['session'].remove()
 
+cli = AppGroup('db', help='Manage the database.')
+
+@cli.command('upgrade')
+@click.option('--to', 'i_target', type=int, help='The version to stop at.')
+def upgrade_db(i_target: int):
+    '''
+    Applies the versions of the schema missing from the database.
+    '''
+    if not create_schema(i_target, click.echo):
+        click.echo('the database is up to date')
+
+@cli.command('init')
+def init_db():
+    '''
+    Creates the database, the same as upgrade.
+    '''
+    if not create_schema(fn_log=click.echo):
+        click.echo('the database is up to date')
+
+@cli.command('status')
+def status_db():
+    '''
+    Lists the versions of the schema and whether they were applied.
+    '''
+    import server.DB.migrations as migrations
+    d_applied = migrations.applied(current_app.config['DB']['engine'])
+    for i_version, s_description, _ in migrations.available():
+        d_row = d_applied.get(i_version)
+        click.echo('{:04d} {:<8} {}'.format(
+            i_version,
+            'pending' if d_row is None else 'applied',
+            s_description if d_row is None else f"{s_description} ({d_row['sx_applied']:%Y-%m-%d %H:%M})"
+        ))
@@ -0,0 +1,122 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for running the models on
+an async engine. The models keep using the session of
+server.DB, which is bound to the async session of the
+calling task for the duration of the call, so the same
+functions serve both the threaded and the async server.
+Last Revised: 10/18/26
+'''
+
+from flask import current_app
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from server.DB import o_session_scope
+from server.DB.changes import track_changes
+from server.DB.engine import D_SQLITE_PRAGMAS, get_database_url, setup_sqlite_pragmas
+from server.DB.versions import track_table_changes
+
+# The async drivers replacing the drivers of the database url
+D_ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg'
+}
+
+class SXAsyncSyncSession(Session):
+    '''
+    The session the models see while they run on the async engine.
+    '''
+
+def get_async_database_url(d_config: dict) -> URL:
+    '''
+    A method for getting the url of the database for an async driver.
+    :param: d_config: the configuration of the application.
+    :return: ASYNC_DATABASE_URL from the config or the database url with
+    its driver replaced by the async one.
+    '''
+    if d_config.get('ASYNC_DATABASE_URL'):
+        return make_url(d_config['ASYNC_DATABASE_URL'])
+    o_url = make_url(get_database_url(d_config))
+    s_backend = o_url.get_backend_name()
+    if s_backend not in D_ASYNC_DRIVERS:
+        raise ValueError(f'no async driver known for {s_backend}')
+    if s_backend == 'sqlite' and o_url.database in (None, '', ':memory:'):
+        raise ValueError('the async engine can not share an in memory database')
+    return o_url.set(drivername=D_ASYNC_DRIVERS[s_backend])
+
+def create_async_db_engine(d_config: dict) -> AsyncEngine:
+    '''
+    A method for creating the async engine. The following keys are read
+    from the config on top of the ones of server.DB.engine:
+    ASYNC_DATABASE_URL: the url of the database with an async driver.
+    ASYNC_DB_POOL_SIZE: the number of connections kept open (20).
+    ASYNC_DB_MAX_OVERFLOW: the connections opened on top of the pool (20).
+    :param: d_config: the configuration of the application.
+    :return: the engine.
+    '''
+    o_url = get_async_database_url(d_config)
+    o_engine = create_async_engine(
+        o_url,
+        pool_size=int(d_config.get('ASYNC_DB_POOL_SIZE', 20)),
+        max_overflow=int(d_config.get('ASYNC_DB_MAX_OVERFLOW', 20)),
+        pool_timeout=float(d_config.get('DB_POOL_TIMEOUT', 30)),
+        pool_pre_ping=o_url.get_backend_name() != 'sqlite'
+    )
+    if o_url.get_backend_name() == 'sqlite':
+        setup_sqlite_pragmas(
+            o_engine.sync_engine,
+            {**D_SQLITE_PRAGMAS, **d_config.get('SQLITE_PRAGMAS', {})}
+        )
+    return o_engine
+
+def init() -> None:
+    '''
+    A method for setting up the async engine next to the regular one.
+    It must run within the app context after server.DB.init.
+    '''
+    o_engine = create_async_db_engine(current_app.config)
+    # The changes are tracked on the class of the sessions, which is
+    # made per app so apps do not see the sessions of each other
+    o_session_class = type('SXAsyncSyncSession', (SXAsyncSyncSession,), {})
+    track_changes(o_session_class, current_app.config['DB']['changes'].wake)
+    track_table_changes(o_session_class, current_app.config['DB']['versions'])
+    if 'METRICS' in current_app.config:
+        from server.metrics import instrument_engine
+        instrument_engine(current_app.config['METRICS'], o_engine.sync_engine)
+
+    current_app.config['DB']['async_engine'] = o_engine
+    current_app.config['DB']['async_session'] = async_sessionmaker(
+        o_engine,
+        autoflush=False,
+        expire_on_commit=False,
+        sync_session_class=o_session_class
+    )
+
+async def run_model(fn, *args, **kwargs):
+    '''
+    A method for running a model function on the async engine. The
+    function runs with current_app.config['DB']['session'] bound to a
+    new async session, and waiting for the database lets the other
+    tasks of the event loop run. It must be awaited within the app context.
+    :param: fn: the model function.
+    :return: whatever the function returns.
+    '''
+    o_scoped = current_app.config['DB']['session']
+    async with current_app.config['DB']['async_session']() as o_async:
+        def call(o_session):
+            o_token = o_session_scope.set(('async', id(o_session)))
+            o_scoped.registry.set(o_session)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                o_scoped.registry.clear()
+                o_session_scope.reset(o_token)
+        return await o_async.run_sync(call)
+
+async def dispose() -> None:
+    '''
+    A method for closing the connections of the async engine.
+    '''
+    await current_app.config['DB']['async_engine'].dispose()
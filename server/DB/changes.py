@@ -0,0 +1,299 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module keeps an append-only log of the rows
+written to the tables the clients display. Every
+change gets a version, increasing in the order the
+changes were committed, so a client that saw up to a
+version can ask for everything after it instead of
+fetching again. One thread per process reads the new
+changes and wakes the requests waiting for them.
+Last Revised: 10/18/26
+'''
+
+import bisect
+import datetime
+import os
+import threading
+from sqlalchemy import Column, DateTime, Integer, String, event, func, inspect, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from server.DB import SXBase
+
+# The tables whose changes are logged
+AS_FEED_TABLES = (
+    'sxcustomer',
+    'sxpatient',
+    'sxproduct',
+    'sxproductaggregate',
+    'sxinvoice',
+    'sxinvoiceitem',
+    'sxinvoicereturn',
+    'sxstockonhand'
+)
+
+# The PostgreSQL advisory lock serializing the commits that log changes
+# so that the versions become visible in order
+I_LOG_LOCK = 0x53584348
+
+class SXChange(SXBase):
+    '''
+    A change of a row. The op is insert, update or delete, or change
+    with no key when rows were written by a statement the session could
+    not see row by row.
+    '''
+
+    __tablename__ = 'sxchange'
+    # SQLite would otherwise be free to reuse the versions of deleted rows
+    __table_args__ = {'sqlite_autoincrement': True}
+    sx_version = Column(Integer, primary_key=True, autoincrement=True)
+    sx_table = Column(String(64), nullable=False)
+    sx_op = Column(String(8), nullable=False)
+    sx_key = Column(String(64))
+    sx_date = Column(DateTime, nullable=False)
+
+def _key(o) -> str:
+    '''
+    A method for getting the primary key of an object as a string.
+    :param: o: the object.
+    :return: the key, the values joined by commas for composite keys.
+    '''
+    return ','.join(str(v) for v in inspect(o).mapper.primary_key_from_instance(o))
+
+def track_changes(o_session_factory, fn_committed=None) -> None:
+    '''
+    A method for logging the changes committed by the sessions of a
+    factory. It must be called before server.DB.versions.track_table_changes
+    since it reads the tables that one collects.
+    :param: o_session_factory: the sessionmaker.
+    :param: fn_committed: a function called after a commit logged changes.
+    '''
+    @event.listens_for(o_session_factory, 'after_flush')
+    def after_flush(o_session, o_flush_context):
+        lt_rows = o_session.info.setdefault('sx_change_rows', [])
+        for s_op, ao in (('insert', o_session.new), ('update', o_session.dirty), ('delete', o_session.deleted)):
+            for o in ao:
+                s_table = o.__table__.name
+                if s_table in AS_FEED_TABLES and (s_op != 'update' or o_session.is_modified(o)):
+                    lt_rows.append((s_table, s_op, _key(o)))
+
+    @event.listens_for(o_session_factory, 'before_commit')
+    def before_commit(o_session):
+        o_session.flush()
+        lt_rows = list(dict.fromkeys(o_session.info.pop('sx_change_rows', ())))
+        # The tables written by bulk statements or raw sql, even the ones
+        # that had other rows flushed, as those rows say nothing of the rest
+        for s_table in sorted(o_session.info.get('sx_bulk_changed', ())):
+            if s_table in AS_FEED_TABLES:
+                lt_rows.append((s_table, 'change', None))
+        if not lt_rows:
+            return
+        o_conn = o_session.connection()
+        if o_conn.dialect.name == 'postgresql':
+            # A version handed out by a sequence could otherwise commit after
+            # a higher one that a client has already seen
+            o_conn.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': I_LOG_LOCK})
+        dt_now = datetime.datetime.now()
+        o_conn.execute(SXChange.__table__.insert(), [
+            {'sx_table': s_table, 'sx_op': s_op, 'sx_key': s_key, 'sx_date': dt_now}
+            for s_table, s_op, s_key in lt_rows
+        ])
+        o_session.info['sx_change_logged'] = True
+
+    @event.listens_for(o_session_factory, 'after_commit')
+    def after_commit(o_session):
+        if o_session.info.pop('sx_change_logged', False) and fn_committed is not None:
+            fn_committed()
+
+    @event.listens_for(o_session_factory, 'after_rollback')
+    def after_rollback(o_session):
+        for s_key in ('sx_change_rows', 'sx_change_logged'):
+            o_session.info.pop(s_key, None)
+
+class SXChangeFeed:
+    '''
+    The changes as seen by this process. The latest i_buffer changes are
+    kept in memory so the clients following the feed never query the
+    database, the ones behind read from the database. Changes committed
+    by this process are seen right away and the ones committed by other
+    workers within f_poll seconds.
+    '''
+
+    def __init__(self, o_engine, i_buffer: int = 10000, f_poll: float = 1.0) -> None:
+        '''
+        The constructor.
+        :param: o_engine: the engine the changes are read from.
+        :param: i_buffer: the number of changes kept in memory.
+        :param: f_poll: the number of seconds between two reads of the log.
+        '''
+        self.o_engine = o_engine
+        self.i_buffer = i_buffer
+        self.f_poll = f_poll
+        self._i_pid = None
+        self._o_start_lock = threading.Lock()
+
+    def _start(self) -> None:
+        '''
+        A method for starting the thread reading the log, once per process
+        since a forked worker does not inherit the thread of its parent.
+        '''
+        if self._i_pid == os.getpid():
+            return
+        with self._o_start_lock:
+            if self._i_pid == os.getpid():
+                return
+            self._o_cond = threading.Condition()
+            self._o_wake = threading.Event()
+            self._li_versions = []
+            self._ld_changes = []
+            self._set_waiters = set()
+            try:
+                with self.o_engine.connect() as o_conn:
+                    i_last = o_conn.execute(select(func.max(SXChange.sx_version))).scalar() or 0
+            except SQLAlchemyError:
+                # The log does not exist before the schema is upgraded
+                i_last = 0
+            # The changes up to _i_base are only in the database
+            self._i_base = self._i_last = i_last
+            threading.Thread(target=self._run, name='sx-changes', daemon=True).start()
+            self._i_pid = os.getpid()
+
+    def last(self) -> int:
+        '''
+        A method for getting the latest version.
+        :return: the version, 0 when nothing was logged.
+        '''
+        self._start()
+        return self._i_last
+
+    def covers(self, i_since: int) -> bool:
+        '''
+        A method for checking whether the changes after a version are
+        served from memory, i.e. changes would not query the database.
+        :param: i_since: the version.
+        '''
+        self._start()
+        return i_since >= self._i_base
+
+    def changes(self, i_since: int, i_limit: int = 500) -> list[dict]:
+        '''
+        A method for getting the changes after a version.
+        :param: i_since: the last version seen.
+        :param: i_limit: the most changes to return.
+        :return: the changes in order of version.
+        '''
+        self._start()
+        with self._o_cond:
+            if i_since >= self._i_base:
+                i_index = bisect.bisect_right(self._li_versions, i_since)
+                return self._ld_changes[i_index:i_index + i_limit]
+        return self._load(i_since, i_limit)
+
+    def wait(self, i_since: int, f_timeout: float) -> bool:
+        '''
+        A method for blocking until there are changes after a version.
+        :param: i_since: the last version seen.
+        :param: f_timeout: the most seconds to wait.
+        :return: False if it timed out.
+        '''
+        self._start()
+        with self._o_cond:
+            return self._o_cond.wait_for(lambda: self._i_last > i_since, f_timeout)
+
+    async def wait_async(self, i_since: int, f_timeout: float) -> bool:
+        '''
+        A method for waiting on an event loop until there are changes
+        after a version, without holding a thread.
+        :param: i_since: the last version seen.
+        :param: f_timeout: the most seconds to wait.
+        :return: False if it timed out.
+        '''
+        import asyncio
+        self._start()
+        o_loop = asyncio.get_running_loop()
+        o_future = o_loop.create_future()
+        t_waiter = (o_loop, o_future)
+        with self._o_cond:
+            if self._i_last > i_since:
+                return True
+            self._set_waiters.add(t_waiter)
+        try:
+            await asyncio.wait_for(o_future, f_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._o_cond:
+                self._set_waiters.discard(t_waiter)
+
+    def wake(self) -> None:
+        '''
+        A method for reading the log right away, called after this
+        process committed changes.
+        '''
+        if self._i_pid == os.getpid():
+            self._o_wake.set()
+
+    def _load(self, i_since: int, i_limit: int) -> list[dict]:
+        '''
+        A method for reading the changes after a version from the database.
+        '''
+        with self.o_engine.connect() as o_conn:
+            return [
+                {
+                    'version': i_version,
+                    'table': s_table,
+                    'op': s_op,
+                    'key': s_key,
+                    'date': dt_date.isoformat()
+                }
+                for i_version, s_table, s_op, s_key, dt_date in o_conn.execute(
+                    select(SXChange.sx_version, SXChange.sx_table, SXChange.sx_op,
+                           SXChange.sx_key, SXChange.sx_date)
+                    .where(SXChange.sx_version > i_since)
+                    .order_by(SXChange.sx_version)
+                    .limit(i_limit)
+                )
+            ]
+
+    def _run(self) -> None:
+        '''
+        The loop of the thread reading the log.
+        '''
+        while True:
+            self._o_wake.wait(self.f_poll)
+            self._o_wake.clear()
+            try:
+                self._poll()
+            except SQLAlchemyError:
+                # Tried again on the next poll
+                pass
+
+    def _poll(self) -> None:
+        '''
+        A method for appending the new changes to the buffer and waking
+        whoever waits for them.
+        '''
+        while True:
+            ld_new = self._load(self._i_last, self.i_buffer)
+            if not ld_new:
+                return
+            with self._o_cond:
+                self._li_versions.extend(d['version'] for d in ld_new)
+                self._ld_changes.extend(ld_new)
+                self._i_last = ld_new[-1]['version']
+                if len(self._ld_changes) > 2 * self.i_buffer:
+                    # Dropping the oldest changes in one go rather than one by one
+                    i_drop = len(self._ld_changes) - self.i_buffer
+                    self._i_base = self._li_versions[i_drop - 1]
+                    del self._li_versions[:i_drop]
+                    del self._ld_changes[:i_drop]
+                self._o_cond.notify_all()
+                lt_waiters = list(self._set_waiters)
+            for o_loop, o_future in lt_waiters:
+                o_loop.call_soon_threadsafe(_resolve, o_future)
+            if len(ld_new) < self.i_buffer:
+                return
+
+def _resolve(o_future) -> None:
+    if not o_future.done():
+        o_future.set_result(True)
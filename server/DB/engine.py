@@ -0,0 +1,154 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for creating the database
+engine from the configuration of the application.
+SQLite databases get a profile suited for concurrent
+requests while any other database gets a regular
+connection pool. Reads can be served by separate
+read engines, e.g. replicas.
+Last Revised: 10/18/26
+'''
+
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool, StaticPool
+
+# The url used when neither the config nor the environment provide one
+S_DEFAULT_URL = 'sqlite:///test.db'
+
+# The pragmas applied to every new SQLite connection. WAL lets readers
+# run while a writer commits and busy_timeout makes writers wait for each
+# other instead of failing with "database is locked".
+D_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'foreign_keys': 'ON',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY'
+}
+
+def get_database_url(d_config: dict) -> str:
+    '''
+    A method for getting the url of the database.
+    :param: d_config: the configuration of the application.
+    :return: DATABASE_URL from the config, SX_DATABASE_URL from
+    the environment or the default url in that order.
+    '''
+    return d_config.get('DATABASE_URL') or os.environ.get('SX_DATABASE_URL') or S_DEFAULT_URL
+
+def create_db_engine(d_config: dict) -> Engine:
+    '''
+    A method for creating the engine based on the configuration.
+    The following keys are read from the config:
+    DATABASE_URL: the url of the database.
+    DB_POOL_SIZE: the number of connections kept open (5).
+    DB_MAX_OVERFLOW: the connections opened on top of the pool (10).
+    DB_POOL_TIMEOUT: seconds to wait for a free connection (30).
+    DB_POOL_RECYCLE: seconds after which a connection is replaced (1800).
+    SQLITE_PRAGMAS: pragmas overriding D_SQLITE_PRAGMAS.
+    :param: d_config: the configuration of the application.
+    :return: the engine.
+    '''
+    o_url = make_url(get_database_url(d_config))
+    d_pool = {
+        'pool_size': int(d_config.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(d_config.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(d_config.get('DB_POOL_TIMEOUT', 30))
+    }
+
+    if o_url.get_backend_name() != 'sqlite':
+        return create_engine(
+            o_url,
+            pool_pre_ping=True,
+            pool_recycle=int(d_config.get('DB_POOL_RECYCLE', 1800)),
+            **d_pool
+        )
+
+    d_pragmas = {**D_SQLITE_PRAGMAS, **d_config.get('SQLITE_PRAGMAS', {})}
+    if o_url.database in (None, '', ':memory:'):
+        # An in memory database only lives as long as its connection
+        o_engine = create_engine(
+            o_url,
+            poolclass=StaticPool,
+            connect_args={'check_same_thread': False}
+        )
+    else:
+        o_engine = create_engine(
+            o_url,
+            poolclass=QueuePool,
+            connect_args={
+                'check_same_thread': False,
+                'timeout': int(d_pragmas['busy_timeout']) / 1000
+            },
+            **d_pool
+        )
+    setup_sqlite_pragmas(o_engine, d_pragmas)
+    return o_engine
+
+def setup_sqlite_pragmas(o_engine: Engine, d_pragmas: dict) -> None:
+    '''
+    A method for applying the pragmas to every connection the
+    engine opens.
+    :param: o_engine: the SQLite engine.
+    :param: d_pragmas: the pragmas mapped to their values.
+    '''
+    @event.listens_for(o_engine, 'connect')
+    def set_pragmas(o_dbapi_connection, o_connection_record):
+        o_cursor = o_dbapi_connection.cursor()
+        for s_pragma, value in d_pragmas.items():
+            o_cursor.execute(f'PRAGMA {s_pragma}={value}')
+        o_cursor.close()
+
+def create_read_engines(d_config: dict, o_engine: Engine) -> list[Engine]:
+    '''
+    A method for creating the engines the reads are sent to (see
+    server.DB.routing). The following keys are read from the config:
+    READ_DATABASE_URLS: the urls of the replicas, as a list or separated
+    by commas. SQLite files get a pool of read only connections to the
+    same file when it is not set.
+    READ_REPLICA: whether reads use separate engines at all (True).
+    READ_DB_POOL_SIZE: the connections kept open per read engine (DB_POOL_SIZE).
+    :param: d_config: the configuration of the application.
+    :param: o_engine: the primary engine.
+    :return: the read engines, empty when the reads use the primary.
+    '''
+    if not d_config.get('READ_REPLICA', True):
+        return []
+    d_read_config = {
+        **d_config,
+        'DB_POOL_SIZE': d_config.get('READ_DB_POOL_SIZE', d_config.get('DB_POOL_SIZE', 5))
+    }
+    as_urls = d_config.get('READ_DATABASE_URLS') or []
+    if isinstance(as_urls, str):
+        as_urls = [s.strip() for s in as_urls.split(',') if s.strip()]
+    if as_urls:
+        return [create_db_engine({**d_read_config, 'DATABASE_URL': s_url}) for s_url in as_urls]
+
+    o_url = o_engine.url
+    if o_url.get_backend_name() != 'sqlite' or o_url.database in (None, '', ':memory:'):
+        return []
+    # The readers see every commit of the writer right away under WAL
+    o_reader = create_engine(
+        o_url.set(
+            database='file:' + os.path.abspath(o_url.database),
+            query={**o_url.query, 'mode': 'ro', 'uri': 'true'}
+        ),
+        poolclass=QueuePool,
+        connect_args={
+            'check_same_thread': False,
+            'timeout': int(D_SQLITE_PRAGMAS['busy_timeout']) / 1000
+        },
+        pool_size=int(d_read_config['DB_POOL_SIZE']),
+        max_overflow=int(d_config.get('DB_MAX_OVERFLOW', 10)),
+        pool_timeout=float(d_config.get('DB_POOL_TIMEOUT', 30))
+    )
+    d_pragmas = {**D_SQLITE_PRAGMAS, **d_config.get('SQLITE_PRAGMAS', {})}
+    # The journal can only be set by the writer
+    for s_pragma in ('journal_mode', 'synchronous'):
+        d_pragmas.pop(s_pragma, None)
+    setup_sqlite_pragmas(o_reader, {**d_pragmas, 'query_only': 'ON'})
+    return [o_reader]
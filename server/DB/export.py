@@ -0,0 +1,108 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for reading the tables out
+for exporting them. The rows are streamed from the
+database a chunk at a time, without going through the
+orm, so an export takes the same memory whatever its size.
+Last Revised: 10/18/26
+'''
+
+import datetime
+from sqlalchemy import select
+from server.DB.routing import read_engine
+from server.DB.sxcustomer import SXCustomer
+from server.DB.sxpatient import SXPatient
+from server.DB.sxproduct import SXProduct
+from server.DB.sxinvoice import SXInvoice, SXInvoiceItem
+
+# The rows fetched from the database at a time
+I_EXPORT_CHUNK = 1000
+
+def _stream(o_query):
+    '''
+    A generator of the rows of a query. PostgreSQL keeps the result on
+    the server behind a cursor and SQLite steps through it as it is read.
+    :param: o_query: the query.
+    :return: the lists of rows, I_EXPORT_CHUNK at most each.
+    '''
+    with read_engine().connect() as o_conn:
+        o_result = o_conn.execution_options(
+            stream_results=True,
+            yield_per=I_EXPORT_CHUNK
+        ).execute(o_query)
+        for lt_rows in o_result.partitions():
+            yield lt_rows
+
+def export_customers() -> (tuple, object):
+    '''
+    A method for exporting the customers in the format they are imported in.
+    :return: the keys of the columns and a generator of chunks of rows.
+    '''
+    return ('name', 'address', 'phone', 'email'), _stream(
+        select(
+            SXCustomer.sx_customer_display_name,
+            SXCustomer.sx_customer_display_addr,
+            SXCustomer.sx_customer_phone,
+            SXCustomer.sx_customer_display_email
+        ).order_by(SXCustomer.sx_customer_id)
+    )
+
+def export_patients() -> (tuple, object):
+    '''
+    A method for exporting the patients along with their customer.
+    :return: the keys of the columns and a generator of chunks of rows.
+    '''
+    return ('customer', 'name'), _stream(
+        select(
+            SXCustomer.sx_customer_display_name,
+            SXPatient.sx_patient_display_name
+        ).join(
+            SXCustomer, SXCustomer.sx_customer_id == SXPatient.sx_doctor_id
+        ).order_by(SXPatient.sx_patient_id)
+    )
+
+def export_invoices(d_start: datetime.date = None, d_end: datetime.date = None,
+                    i_customer_id: int = None) -> (tuple, object):
+    '''
+    A method for exporting the invoices with a row per item. Invoices
+    without items get a single row without a product.
+    :param: d_start: the first day of the invoices exported.
+    :param: d_end: the last day of the invoices exported.
+    :param: i_customer_id: the customer whose invoices are exported.
+    :return: the keys of the columns and a generator of chunks of rows.
+    '''
+    o_query = select(
+        SXInvoice.sx_invoice_id,
+        SXInvoice.sx_date,
+        SXInvoice.sx_due_date,
+        SXInvoice.sx_invoice_status,
+        SXCustomer.sx_customer_display_name,
+        SXPatient.sx_patient_display_name,
+        SXProduct.sx_product_display_name,
+        SXInvoiceItem.sx_invoice_item_count,
+        SXProduct.sx_normal_rate,
+        SXProduct.sx_ministery_rate
+    ).outerjoin(
+        SXCustomer, SXCustomer.sx_customer_id == SXInvoice.sx_customer_id
+    ).outerjoin(
+        SXPatient, SXPatient.sx_patient_id == SXInvoice.sx_patient_id
+    ).outerjoin(
+        SXInvoiceItem, SXInvoiceItem.sx_invoice_id == SXInvoice.sx_invoice_id
+    ).outerjoin(
+        SXProduct, SXProduct.sx_product_id == SXInvoiceItem.sx_product_id
+    ).order_by(SXInvoice.sx_invoice_id, SXInvoiceItem.sx_invoice_item_id)
+
+    if d_start is not None:
+        o_query = o_query.where(SXInvoice.sx_date >= datetime.datetime.combine(d_start, datetime.time()))
+    if d_end is not None:
+        o_query = o_query.where(SXInvoice.sx_date < datetime.datetime.combine(
+            d_end + datetime.timedelta(days=1), datetime.time()
+        ))
+    if i_customer_id is not None:
+        o_query = o_query.where(SXInvoice.sx_customer_id == i_customer_id)
+
+    return (
+        'invoice', 'date', 'due_date', 'status', 'customer', 'patient',
+        'product', 'count', 'normal_rate', 'ministery_rate'
+    ), _stream(o_query)
@@ -0,0 +1,200 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for upgrading the schema of
+the database. Every change is a module of this package
+named v<version>_<name> with an S_DESCRIPTION and an
+upgrade(o_engine) function, and the versions applied
+are recorded in sxschemaversion. A new database gets
+the latest tables from the first version so every
+upgrade must be safe to run against a schema that
+already has its changes, which the helpers below are.
+The versions filling tables through the models write
+with the session of the application, so they check
+with require_app_context that they run within it.
+Last Revised: 10/18/26
+'''
+
+import datetime
+import importlib
+import pkgutil
+import re
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn
+
+# The rows updated per transaction by backfill
+I_BACKFILL_CHUNK = 1000
+
+# The modules of this package holding a version
+O_VERSION_PATTERN = re.compile(r'^v(\d+)_\w+$')
+
+# The versions applied to the database, kept out of the metadata of
+# the models so creating the models never creates it
+o_metadata = MetaData()
+o_version_table = Table(
+    'sxschemaversion',
+    o_metadata,
+    Column('sx_version', Integer, primary_key=True),
+    Column('sx_description', String, nullable=False),
+    Column('sx_applied', DateTime, nullable=False),
+    Column('sx_seconds', Float, nullable=False)
+)
+
+def available() -> list[tuple]:
+    '''
+    A method for finding the versions of this package.
+    :return: (version, description, module) sorted by version.
+    '''
+    lt_versions = []
+    for o_info in pkgutil.iter_modules(__path__):
+        o_match = O_VERSION_PATTERN.match(o_info.name)
+        if o_match is None:
+            continue
+        o_module = importlib.import_module(f'{__name__}.{o_info.name}')
+        lt_versions.append((int(o_match.group(1)), o_module.S_DESCRIPTION, o_module))
+    lt_versions.sort(key=lambda t: t[0])
+    if len({t[0] for t in lt_versions}) != len(lt_versions):
+        raise RuntimeError('two migrations have the same version')
+    return lt_versions
+
+def applied(o_engine: Engine) -> dict:
+    '''
+    A method for getting the versions applied to the database.
+    :param: o_engine: the engine of the database.
+    :return: the rows of sxschemaversion mapped by their version.
+    '''
+    o_metadata.create_all(o_engine, checkfirst=True)
+    with o_engine.connect() as o_conn:
+        return {
+            d['sx_version']: d for d in o_conn.execute(
+                select(o_version_table).order_by(o_version_table.c.sx_version)
+            ).mappings()
+        }
+
+def current(o_engine: Engine) -> int:
+    '''
+    A method for getting the version of the database.
+    :param: o_engine: the engine of the database.
+    :return: the highest version applied, 0 for a database never upgraded.
+    '''
+    return max(applied(o_engine), default=0)
+
+def upgrade(o_engine: Engine, i_target: int = None, fn_log=None) -> list[int]:
+    '''
+    A method for applying the versions missing from the database in order.
+    Each version is recorded as soon as it succeeds so a failed upgrade
+    resumes from the version that failed.
+    :param: o_engine: the engine of the database.
+    :param: i_target: the last version to apply, every version by default.
+    :param: fn_log: a function called with a line for every version applied.
+    :return: the versions applied.
+    '''
+    d_applied = applied(o_engine)
+    li_done = []
+    for i_version, s_description, o_module in available():
+        if i_version in d_applied or (i_target is not None and i_version > i_target):
+            continue
+        if fn_log is not None:
+            fn_log(f'applying {i_version}: {s_description}')
+        f_start = time.monotonic()
+        o_module.upgrade(o_engine)
+        with o_engine.begin() as o_conn:
+            # Another process may have applied it at the same time
+            if o_conn.execute(select(o_version_table.c.sx_version).where(
+                o_version_table.c.sx_version == i_version
+            )).first() is None:
+                o_conn.execute(o_version_table.insert().values(
+                    sx_version=i_version,
+                    sx_description=s_description,
+                    sx_applied=datetime.datetime.now(),
+                    sx_seconds=round(time.monotonic() - f_start, 3)
+                ))
+        li_done.append(i_version)
+    return li_done
+
+def require_app_context(o_engine: Engine) -> None:
+    '''
+    A method for making sure a version writing through the models runs
+    within the app context of the database being upgraded, e.g. through
+    flask db upgrade, since the models write with the session of the
+    application rather than with the engine given to the version.
+    :param: o_engine: the engine of the database.
+    :raise: RuntimeError if the session of the application is not
+    bound to the engine.
+    '''
+    if not has_app_context() or current_app.config.get('DB', {}).get('engine') is not o_engine:
+        raise RuntimeError('this version must run within the app context of the database')
+
+def add_columns(o_engine: Engine, o_table: Table) -> list[str]:
+    '''
+    A method for adding the columns of a model missing from its table.
+    Only nullable columns without constraints can be added this way.
+    :param: o_engine: the engine of the database.
+    :param: o_table: the table of the model.
+    :return: the names of the columns added.
+    '''
+    ss_existing = {d['name'] for d in inspect(o_engine).get_columns(o_table.name)}
+    as_added = []
+    with o_engine.begin() as o_conn:
+        for o_column in o_table.columns:
+            if o_column.name not in ss_existing:
+                o_conn.execute(text('ALTER TABLE {} ADD COLUMN {}'.format(
+                    o_table.name,
+                    CreateColumn(o_column).compile(dialect=o_engine.dialect)
+                )))
+                as_added.append(o_column.name)
+    return as_added
+
+def create_index(o_engine: Engine, s_name: str, s_table: str, as_columns: list[str]) -> None:
+    '''
+    A method for building an index without stopping the server. PostgreSQL
+    builds it concurrently, letting writes continue. SQLite only blocks the
+    writers while it builds since its readers never wait in WAL mode.
+    :param: o_engine: the engine of the database.
+    :param: s_name: the name of the index.
+    :param: s_table: the table.
+    :param: as_columns: the columns of the index.
+    '''
+    s_columns = ', '.join(as_columns)
+    if o_engine.dialect.name == 'postgresql':
+        # A concurrent build can not run within a transaction
+        with o_engine.connect().execution_options(isolation_level='AUTOCOMMIT') as o_conn:
+            o_conn.execute(text(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {s_name} ON {s_table} ({s_columns})'
+            ))
+        return
+    with o_engine.begin() as o_conn:
+        o_conn.execute(text(f'CREATE INDEX IF NOT EXISTS {s_name} ON {s_table} ({s_columns})'))
+
+def backfill(o_engine: Engine, s_table: str, s_key: str, s_set: str, s_where: str,
+             i_chunk: int = I_BACKFILL_CHUNK, f_pause: float = 0.0) -> int:
+    '''
+    A method for updating the rows of a large table a chunk at a time.
+    Every chunk is its own short transaction so the requests writing to
+    the table only ever wait for a chunk.
+    :param: o_engine: the engine of the database.
+    :param: s_table: the table.
+    :param: s_key: the primary key of the table.
+    :param: s_set: the SET clause, e.g. "b = upper(a)".
+    :param: s_where: the condition of the rows still to update, which the
+    update must make false, e.g. "b IS NULL".
+    :param: i_chunk: the number of rows per transaction.
+    :param: f_pause: the seconds to sleep between two chunks.
+    :return: the number of rows updated.
+    '''
+    o_update = text(
+        f'UPDATE {s_table} SET {s_set} WHERE {s_key} IN '
+        f'(SELECT {s_key} FROM {s_table} WHERE {s_where} LIMIT :limit)'
+    )
+    i_total = 0
+    while True:
+        with o_engine.begin() as o_conn:
+            i_rows = o_conn.execute(o_update, {'limit': i_chunk}).rowcount
+        i_total += i_rows
+        if i_rows < i_chunk:
+            return i_total
+        if f_pause:
+            time.sleep(f_pause)
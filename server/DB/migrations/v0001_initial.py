@@ -0,0 +1,15 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+The tables of the models. Tables that already exist
+are left as they are.
+Last Revised: 10/18/26
+'''
+
+from server.DB import SXBase, load_models
+
+S_DESCRIPTION = 'create the tables'
+
+def upgrade(o_engine) -> None:
+    load_models()
+    SXBase.metadata.create_all(bind=o_engine)
@@ -0,0 +1,31 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+The display values stored next to the search keys of
+the customers, patients and products, filled for the
+rows stored before they were kept.
+Last Revised: 10/18/26
+'''
+
+from server.DB.migrations import add_columns, backfill
+
+S_DESCRIPTION = 'store the display values next to the search keys'
+
+def upgrade(o_engine) -> None:
+    import server.DB.sxcustomer as sxcustomer
+    from server.DB.sxpatient import SXPatient
+    from server.DB.sxproduct import SXProduct
+    for o_model in (sxcustomer.SXCustomer, SXPatient, SXProduct):
+        add_columns(o_engine, o_model.__table__)
+    # The customers are title cased in Python the way the search used to display them
+    sxcustomer.fill_display_values(o_engine)
+    backfill(
+        o_engine, 'sxpatient', 'sx_patient_id',
+        'sx_patient_display_name = sx_patient_name',
+        'sx_patient_display_name IS NULL'
+    )
+    backfill(
+        o_engine, 'sxproduct', 'sx_product_id',
+        'sx_product_display_name = sx_product_name',
+        'sx_product_display_name IS NULL'
+    )
@@ -0,0 +1,12 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+The full text index of the customers on SQLite.
+Last Revised: 10/18/26
+'''
+
+S_DESCRIPTION = 'index the customers for the full text search'
+
+def upgrade(o_engine) -> None:
+    import server.DB.sxcustomer as sxcustomer
+    sxcustomer.setup_search_index(o_engine)
@@ -0,0 +1,15 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+The indexes of the invoices of a customer by date and
+of the items of a product.
+Last Revised: 10/18/26
+'''
+
+from server.DB.migrations import create_index
+
+S_DESCRIPTION = 'index the invoices by customer and date and the items by product'
+
+def upgrade(o_engine) -> None:
+    create_index(o_engine, 'ix_sxinvoice_sx_customer_id_sx_date', 'sxinvoice', ['sx_customer_id', 'sx_date'])
+    create_index(o_engine, 'ix_sxinvoiceitem_sx_product_id', 'sxinvoiceitem', ['sx_product_id'])
@@ -0,0 +1,15 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+The log of the changes followed by the clients
+(see server.DB.changes).
+Last Revised: 10/18/26
+'''
+
+from server.DB import SXBase, load_models
+
+S_DESCRIPTION = 'create the change log'
+
+def upgrade(o_engine) -> None:
+    load_models()
+    SXBase.metadata.create_all(bind=o_engine, tables=[SXBase.metadata.tables['sxchange']])
@@ -0,0 +1,22 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+The stock ledger, the quantities on hand and what the
+existing invoices take from the stock (see server.DB.sxstock).
+Last Revised: 10/18/26
+'''
+
+from server.DB import SXBase, load_models
+from server.DB.migrations import require_app_context
+
+S_DESCRIPTION = 'create the stock ledger'
+
+def upgrade(o_engine) -> None:
+    require_app_context(o_engine)
+    load_models()
+    import server.DB.sxstock as sxstock
+    SXBase.metadata.create_all(bind=o_engine, tables=[
+        SXBase.metadata.tables[s_table]
+        for s_table in ('sxstockmovement', 'sxstockposting', 'sxstockonhand')
+    ])
+    sxstock.fill_postings()
@@ -0,0 +1,18 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+The sales rollups of the invoices made before the rollups
+were kept (see server.DB.sxsales).
+Last Revised: 10/18/26
+'''
+
+from server.DB import load_models
+from server.DB.migrations import require_app_context
+
+S_DESCRIPTION = 'roll up the existing sales'
+
+def upgrade(o_engine) -> None:
+    require_app_context(o_engine)
+    load_models()
+    import server.DB.sxsales as sxsales
+    sxsales.fill_sales()
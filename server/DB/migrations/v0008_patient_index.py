@@ -0,0 +1,13 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+The index of the patients of a doctor by name.
+Last Revised: 10/18/26
+'''
+
+from server.DB.migrations import create_index
+
+S_DESCRIPTION = 'index the patients by doctor and name'
+
+def upgrade(o_engine) -> None:
+    create_index(o_engine, 'ix_sxpatient_sx_doctor_id_sx_patient_name', 'sxpatient', ['sx_doctor_id', 'sx_patient_name'])
@@ -0,0 +1,52 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module contains the helpers for the keyset
+pagination of the listings. A cursor holds the sort
+key of the last item of a page so that the next page
+starts right after it through the index, no matter
+how deep the page is.
+Last Revised: 10/18/26
+'''
+
+import base64
+import json
+
+# The largest page a listing can be asked for
+I_MAX_PAGE_SIZE = 100
+
+def encode_cursor(l_key: list) -> str:
+    '''
+    A method for turning the sort key of an item into an opaque cursor.
+    :param: l_key: the values the listing is sorted by.
+    :return: the cursor as a url safe string.
+    '''
+    return base64.urlsafe_b64encode(
+        json.dumps(l_key, separators=(',', ':')).encode()
+    ).decode().rstrip('=')
+
+def decode_cursor(s_cursor: str, i_size: int) -> list:
+    '''
+    A method for getting the sort key back from a cursor.
+    :param: s_cursor: the cursor.
+    :param: i_size: the number of values the sort key must have.
+    :return: the sort key or None if there is no cursor.
+    :raise: ValueError if the cursor is invalid.
+    '''
+    if not s_cursor:
+        return None
+    try:
+        l_key = json.loads(base64.urlsafe_b64decode(s_cursor + '=' * (-len(s_cursor) % 4)))
+    except (ValueError, TypeError) as o_error:
+        raise ValueError('invalid cursor') from o_error
+    if not isinstance(l_key, list) or len(l_key) != i_size:
+        raise ValueError('invalid cursor')
+    return l_key
+
+def clamp_page_size(i_limit: int) -> int:
+    '''
+    A method for bounding the size of a page.
+    :param: i_limit: the requested size.
+    :return: the size within 1 and I_MAX_PAGE_SIZE.
+    '''
+    return max(1, min(int(i_limit), I_MAX_PAGE_SIZE))
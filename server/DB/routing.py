@@ -0,0 +1,80 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for sending the reads of
+the model functions marked as read_only to the read
+engines (see server.DB.engine.create_read_engines)
+while everything else runs on the primary. Once a
+session writes, it reads from the primary until it is
+removed at the end of the request so a request always
+sees its own writes.
+Last Revised: 10/18/26
+'''
+
+import functools
+import random
+from flask import current_app, has_request_context, request
+from sqlalchemy.orm import Session
+
+# The methods of the requests that never write
+AS_SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+class SXRoutingSession(Session):
+    '''
+    A session choosing the engine of every statement. Each session
+    sticks to one of the read engines, picked when it is made.
+    '''
+
+    def __init__(self, *args, ao_readers=(), **kwargs) -> None:
+        '''
+        The constructor.
+        :param: ao_readers: the read engines, none to always use the primary.
+        '''
+        super().__init__(*args, **kwargs)
+        self.o_reader = random.choice(ao_readers) if ao_readers else None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        b_read_only = self.info.get('sx_read_only', 0) > 0
+        if self._flushing or getattr(clause, 'is_dml', False) \
+                or not (b_read_only or getattr(clause, 'is_select', False)):
+            # Anything that is not known to be a read counts as a write
+            self.info['sx_wrote'] = True
+        elif b_read_only and self.o_reader is not None and not self.info.get('sx_wrote'):
+            return self.o_reader
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+def read_only(fn):
+    '''
+    A decorator for the model functions that only read. They read from
+    a read engine when they serve a request that can not write, e.g. a
+    GET, and from the primary otherwise so the checks made before a
+    write never see a replica lagging behind.
+    :param: fn: the model function.
+    :return: the decorated function.
+    '''
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not has_request_context() or request.method not in AS_SAFE_METHODS:
+            return fn(*args, **kwargs)
+        o_session = current_app.config['DB']['session']()
+        i_depth = o_session.info.get('sx_read_only', 0)
+        o_session.info['sx_read_only'] = i_depth + 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            o_session.info['sx_read_only'] = i_depth
+    return wrapper
+
+def read_engine():
+    '''
+    A method for getting the engine a read_only function serving the
+    current request would read from, for reads made outside the session
+    such as streaming a large result.
+    :return: the engine.
+    '''
+    o_session = current_app.config['DB']['session']()
+    o_reader = getattr(o_session, 'o_reader', None)
+    if o_reader is not None and has_request_context() and request.method in AS_SAFE_METHODS \
+            and not o_session.info.get('sx_wrote'):
+        return o_reader
+    return current_app.config['DB']['engine']
@@ -3,14 +3,18 @@ Author: Kia Kalani
 Version: 1.00
 This module is responsible for handling
 all the events corresponding to the customer.
-Last Revision: 9/30/24
+Last Revision: 10/18/26
 '''
 
 import re
 from flask import current_app, jsonify
-from sqlalchemy import Column, Integer, String, ForeignKey, Index, func, or_
+from sqlalchemy import Column, Integer, String, ForeignKey, Index, func, or_, text, select
+from server.DB.pagination import encode_cursor, decode_cursor, clamp_page_size
+from server.serializer import row_encoder
+from server.DB import SXBase
+from server.DB.routing import read_only
 
-class SXCustomer(current_app.config['DB']['base']):
+class SXCustomer(SXBase):
     '''
     An orm model for representing the customer.
     '''
@@ -26,6 +30,10 @@ class SXCustomer(current_app.config['DB']['base']):
     sx_customer_phone = Column(String, index=True)
     # Customer's email
     sx_customer_email = Column(String, index=True)
+    # The name, address and email the way they were entered, for display
+    sx_customer_display_name = Column(String)
+    sx_customer_display_addr = Column(String)
+    sx_customer_display_email = Column(String)
 
     def __init__(
         self,
@@ -37,13 +45,234 @@ class SXCustomer(current_app.config['DB']['base']):
         '''
         Constructor for setting the initial values. Note that
         for the purpose of indexing, everything is stored as
-        upper case.
+        upper case next to the value for display.
         '''
 
         self.sx_customer_name = s_customer_name.upper()
         self.sx_customer_addr = s_customer_addr.upper()
         self.sx_customer_phone = s_customer_phone
-        self.sx_customer_email = s_customer_email.upper()
+        self.sx_customer_email = s_customer_email.upper() if s_customer_email else None
+        self.sx_customer_display_name = s_customer_name
+        self.sx_customer_display_addr = s_customer_addr
+        self.sx_customer_display_email = s_customer_email
+
+# The fields of a customer that patch_customers changes
+AS_PATCH_FIELDS = ('email', 'address', 'phone')
+
+# patterns for email and phone numbers
+O_EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+O_PHONE_NUMBER_PATTERN = re.compile(r'^\+[1-9]\d{1,14}$')
+
+# The number of customers validated and inserted together by the import
+I_IMPORT_CHUNK = 1000
+
+# Tokens that are sent to the full text index. Anything else (spaces,
+# punctuation, "+" of a phone number, "@" of an email) is a separator.
+O_SEARCH_TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+# Queries shorter than this are not ranked. They match a large part of the
+# table and sorting all of the matches would make every keystroke a scan.
+I_RANK_MIN_LENGTH = 3
+
+# The keys of the customers in the search results in the order of the
+# columns selected by the search queries
+encode_search_rows = row_encoder('name', 'address', 'email', 'phone')
+
+# The weights of bm25 in the column order of sxcustomer_fts so that a match
+# on the name ranks above address, phone and email. Ranking every match of
+# a common prefix would cost as much as the matches, so the candidates are
+# bounded by the field that matched instead: up to :candidates customers
+# matching on their name, then the customers matching on another field
+# only up to the same total. Each group is ranked by bm25 within its own
+# fields and the name matches come first; pages continue after the (group,
+# rank, name) of the last customer of the previous page.
+S_SEARCH_RANKED_QUERY = """
+    WITH name_hits AS MATERIALIZED (
+        SELECT rowid AS id, bm25(sxcustomer_fts, 8.0, 4.0, 2.0, 1.0) AS r
+        FROM sxcustomer_fts
+        WHERE sxcustomer_fts MATCH '{sx_customer_name} : ' || :q
+        LIMIT :candidates
+    ), other_hits AS MATERIALIZED (
+        SELECT rowid AS id, bm25(sxcustomer_fts, 8.0, 4.0, 2.0, 1.0) AS r
+        FROM sxcustomer_fts
+        WHERE sxcustomer_fts MATCH
+            '{sx_customer_addr sx_customer_phone sx_customer_email} : ' || :q
+            AND rowid NOT IN (SELECT id FROM name_hits)
+        LIMIT max(:candidates - (SELECT count(*) FROM name_hits), 0)
+    ), ranked AS (
+        SELECT 0 AS g, id, r FROM name_hits
+        UNION ALL
+        SELECT 1 AS g, id, r FROM other_hits
+    )
+    SELECT
+        sxcustomer.sx_customer_display_name, sxcustomer.sx_customer_display_addr,
+        sxcustomer.sx_customer_display_email, sxcustomer.sx_customer_phone,
+        ranked.g, ranked.r, sxcustomer.sx_customer_name
+    FROM ranked
+    JOIN sxcustomer ON sxcustomer.sx_customer_id = ranked.id
+    WHERE (ranked.g, ranked.r, sxcustomer.sx_customer_name) > (:g, :r, :name)
+    ORDER BY ranked.g, ranked.r, sxcustomer.sx_customer_name
+    LIMIT :limit
+"""
+# Unranked matches come in rowid order, so pages continue after the rowid
+# of the last customer of the previous page.
+S_SEARCH_QUERY = """
+    SELECT
+        sxcustomer.sx_customer_display_name, sxcustomer.sx_customer_display_addr,
+        sxcustomer.sx_customer_display_email, sxcustomer.sx_customer_phone,
+        sxcustomer_fts.rowid AS id
+    FROM sxcustomer_fts
+    JOIN sxcustomer ON sxcustomer.sx_customer_id = sxcustomer_fts.rowid
+    WHERE sxcustomer_fts MATCH :q AND sxcustomer_fts.rowid > :id
+    ORDER BY sxcustomer_fts.rowid
+    LIMIT :limit
+"""
+
+# The full text index is an external content table over sxcustomer. It is
+# kept in sync through triggers so that every write to sxcustomer is
+# reflected in it, no matter which function performed it. Bulk inserts
+# pause the insert trigger through sxcustomer_fts_pause within their
+# transaction and index their rows with a single statement instead.
+AS_SEARCH_INDEX_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS sxcustomer_fts_pause (
+        sx_pause_id INTEGER PRIMARY KEY
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS sxcustomer_fts USING fts5(
+        sx_customer_name,
+        sx_customer_addr,
+        sx_customer_phone,
+        sx_customer_email,
+        content='sxcustomer',
+        content_rowid='sx_customer_id',
+        tokenize='unicode61',
+        prefix='1 2 3'
+    )
+    """,
+    """
+    DROP TRIGGER IF EXISTS sxcustomer_fts_ai
+    """,
+    """
+    CREATE TRIGGER sxcustomer_fts_ai AFTER INSERT ON sxcustomer
+    WHEN NOT EXISTS (SELECT 1 FROM sxcustomer_fts_pause) BEGIN
+        INSERT INTO sxcustomer_fts(
+            rowid, sx_customer_name, sx_customer_addr,
+            sx_customer_phone, sx_customer_email
+        ) VALUES (
+            new.sx_customer_id, new.sx_customer_name, new.sx_customer_addr,
+            new.sx_customer_phone, new.sx_customer_email
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS sxcustomer_fts_ad AFTER DELETE ON sxcustomer BEGIN
+        INSERT INTO sxcustomer_fts(
+            sxcustomer_fts, rowid, sx_customer_name, sx_customer_addr,
+            sx_customer_phone, sx_customer_email
+        ) VALUES (
+            'delete', old.sx_customer_id, old.sx_customer_name, old.sx_customer_addr,
+            old.sx_customer_phone, old.sx_customer_email
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS sxcustomer_fts_au AFTER UPDATE ON sxcustomer BEGIN
+        INSERT INTO sxcustomer_fts(
+            sxcustomer_fts, rowid, sx_customer_name, sx_customer_addr,
+            sx_customer_phone, sx_customer_email
+        ) VALUES (
+            'delete', old.sx_customer_id, old.sx_customer_name, old.sx_customer_addr,
+            old.sx_customer_phone, old.sx_customer_email
+        );
+        INSERT INTO sxcustomer_fts(
+            rowid, sx_customer_name, sx_customer_addr,
+            sx_customer_phone, sx_customer_email
+        ) VALUES (
+            new.sx_customer_id, new.sx_customer_name, new.sx_customer_addr,
+            new.sx_customer_phone, new.sx_customer_email
+        );
+    END
+    """
+]
+
+# Fills the display values of the customers added before they were stored
+S_SELECT_MISSING_DISPLAY = """
+    SELECT sx_customer_id, sx_customer_name, sx_customer_addr, sx_customer_email
+    FROM sxcustomer WHERE sx_customer_display_name IS NULL LIMIT :limit
+"""
+S_UPDATE_DISPLAY = """
+    UPDATE sxcustomer SET
+        sx_customer_display_name = :name,
+        sx_customer_display_addr = :addr,
+        sx_customer_display_email = :email
+    WHERE sx_customer_id = :id
+"""
+
+# Indexes the customers added while the insert trigger was paused
+S_INDEX_CUSTOMERS_AFTER = """
+    INSERT INTO sxcustomer_fts(
+        rowid, sx_customer_name, sx_customer_addr,
+        sx_customer_phone, sx_customer_email
+    )
+    SELECT
+        sx_customer_id, sx_customer_name, sx_customer_addr,
+        sx_customer_phone, sx_customer_email
+    FROM sxcustomer WHERE sx_customer_id > :id
+"""
+
+def setup_search_index(o_engine) -> None:
+    '''
+    A method for creating the full text index of the customers along with
+    the triggers keeping it in sync. The index is rebuilt from sxcustomer
+    the first time it gets created and the triggers are recreated so they
+    follow their latest definition. This is a no-op for databases other
+    than SQLite.
+    :param: o_engine: the engine the tables were created on.
+    '''
+    if o_engine.dialect.name != 'sqlite':
+        return
+
+    with o_engine.begin() as o_conn:
+        b_exists = o_conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sxcustomer_fts'"
+        )).first() is not None
+        for s_ddl in AS_SEARCH_INDEX_DDL:
+            o_conn.execute(text(s_ddl))
+        # Indexing the customers that existed before the index
+        if not b_exists:
+            o_conn.execute(text(
+                "INSERT INTO sxcustomer_fts(sxcustomer_fts) VALUES ('rebuild')"
+            ))
+
+def fill_display_values(o_engine) -> None:
+    '''
+    A method for filling the display values of the customers stored
+    before those were kept, the way the search used to display them.
+    :param: o_engine: the engine the tables were created on.
+    '''
+    while True:
+        with o_engine.begin() as o_conn:
+            lo_rows = o_conn.execute(text(S_SELECT_MISSING_DISPLAY), {'limit': I_IMPORT_CHUNK}).all()
+            if not lo_rows:
+                return
+            o_conn.execute(text(S_UPDATE_DISPLAY), [{
+                'id': i_id,
+                'name': (s_name or '').title(),
+                'addr': (s_addr or '').title(),
+                'email': s_email.lower() if s_email else None
+            } for i_id, s_name, s_addr, s_email in lo_rows])
+
+def _fts_query(as_tokens: list[str]) -> str:
+    '''
+    A method for turning the search tokens into an fts5 query. The tokens
+    are matched as a phrase and the last one as a prefix since the user
+    is still typing it.
+    :param: as_tokens: the tokens of the search query.
+    :return: the fts5 query string.
+    '''
+    return '"' + ' '.join(as_tokens) + '" *'
 
 def add_customer(s_name: str, s_addr: str, s_phone: str, s_email=None) -> (str, int):
     '''
@@ -55,16 +284,12 @@ def add_customer(s_name: str, s_addr: str, s_phone: str, s_email=None) -> (str,
     :param: s_email: refers to the customer's email
     :return: the server's response to the operation.
     '''
-    # patterns for email and phone numbers
-    o_email_pattern = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
-    o_phone_number_pattern = re.compile(r'^\+[1-9]\d{1,14}$')
-
     # error checking email
-    if not (s_email and o_email_pattern.match(s_email)):
+    if not (s_email and O_EMAIL_PATTERN.match(s_email)):
         s_email = None
 
     # error checking phone number
-    if not o_phone_number_pattern.match(s_phone):
+    if not O_PHONE_NUMBER_PATTERN.match(s_phone):
         return jsonify({
             'message': 'invalid phone number'
         }), 400
@@ -85,6 +310,7 @@ def add_customer(s_name: str, s_addr: str, s_phone: str, s_email=None) -> (str,
         "message": "success"
     }), 200
 
+@read_only
 def get_customer(s_name: str) -> SXCustomer:
     '''
     A method for getting the customer by the provided name.
@@ -96,45 +322,147 @@ def get_customer(s_name: str) -> SXCustomer:
         SXCustomer.sx_customer_name == s_name.upper()
     ).first()
 
-def search_customer(s_query: str, i_limit=10) -> (str, int):
+@read_only
+def search_customer(s_query: str, i_limit=10, s_cursor: str = None) -> (str, int):
     '''
     A method that allows searching for customers through their name, address,
-    email, and phone number.
+    email, and phone number. On SQLite the lookup goes through the
+    sxcustomer_fts index. At most SEARCH_RANK_CANDIDATES customers (1000)
+    are ranked and paged through: the ones matching on their name come
+    first, then the ones matching on their address, phone or email fill
+    the rest. Each group is ordered by its bm25 rank. A longer list asks
+    for a more precise query.
     :param: s_query: the query string
     :param: i_limit: an integer to limit the number of items
     returned from the query.
-    :return: the response json with status code.
+    :param: s_cursor: the cursor of the page to continue from.
+    :return: the response json holding the customers and the cursor
+    of the next page with status code.
     '''
 
-    # since all fields are upper case
-    s_query = s_query.upper()
+    o_session = current_app.config['DB']['session']
+    as_tokens = O_SEARCH_TOKEN_PATTERN.findall(s_query)
+    i_limit = clamp_page_size(i_limit)
+    ao_columns = (
+        SXCustomer.sx_customer_display_name,
+        SXCustomer.sx_customer_display_addr,
+        SXCustomer.sx_customer_display_email,
+        SXCustomer.sx_customer_phone,
+        SXCustomer.sx_customer_name
+    )
 
-    # Querying for customers.
-    lo_q_res: list[SXCustomer] = current_app.config['DB']['session'].query(
-        SXCustomer
-    ).filter(
-        or_(
-            or_(
-                or_(
+    try:
+        if as_tokens and o_session.get_bind().dialect.name == 'sqlite':
+            # Searching through the full text index
+            if len(s_query.strip()) >= I_RANK_MIN_LENGTH:
+                l_after = decode_cursor(s_cursor, 3) or [-1, -1e308, '']
+                lo_rows = o_session.execute(text(S_SEARCH_RANKED_QUERY), {
+                    'q': _fts_query(as_tokens),
+                    'g': l_after[0],
+                    'r': l_after[1],
+                    'name': l_after[2],
+                    'limit': i_limit + 1,
+                    'candidates': int(current_app.config.get('SEARCH_RANK_CANDIDATES', 1000))
+                }).all()
+                fn_key = lambda o: [o.g, o.r, o.sx_customer_name]
+            else:
+                l_after = decode_cursor(s_cursor, 1) or [0]
+                lo_rows = o_session.execute(text(S_SEARCH_QUERY), {
+                    'q': _fts_query(as_tokens),
+                    'id': l_after[0],
+                    'limit': i_limit + 1
+                }).all()
+                fn_key = lambda o: [o.id]
+        else:
+            o_select = select(*ao_columns).order_by(SXCustomer.sx_customer_name)
+            if as_tokens:
+                # since all fields are upper case
+                s_query = s_query.upper()
+                o_select = o_select.where(or_(
                     SXCustomer.sx_customer_name.startswith(s_query),
-                    SXCustomer.sx_customer_addr.startswith(s_query)
-                ),
-                SXCustomer.sx_customer_phone.startswith(s_query)
-            ),
-            SXCustomer.sx_customer_email.startswith(s_query)
-        )
-    ).limit(i_limit).all()
-    
+                    SXCustomer.sx_customer_addr.startswith(s_query),
+                    SXCustomer.sx_customer_phone.startswith(s_query),
+                    SXCustomer.sx_customer_email.startswith(s_query)
+                ))
+            l_after = decode_cursor(s_cursor, 1)
+            if l_after:
+                o_select = o_select.where(SXCustomer.sx_customer_name > l_after[0])
+            lo_rows = o_session.execute(o_select.limit(i_limit + 1)).all()
+            fn_key = lambda o: [o.sx_customer_name]
+    except ValueError:
+        return jsonify({"message": "invalid cursor"}), 400
+
     # Providing the result
     return jsonify({
-        'message': [{
-            'name': o.sx_customer_name.title(),
-            'address': o.sx_customer_addr.title(),
-            'email': o.sx_customer_email.lower(),
-            'phone': o.sx_customer_phone
-        } for o in lo_q_res]
+        'message': encode_search_rows(lo_rows[:i_limit]),
+        'next': encode_cursor(fn_key(lo_rows[i_limit - 1])) if len(lo_rows) > i_limit else None
     }), 200
 
+def _set_customer_field(o_customer: SXCustomer, s_field: str, value) -> str:
+    '''
+    A method for changing a field of a customer after checking its value.
+    :param: o_customer: the customer instance.
+    :param: s_field: email, address or phone.
+    :param: value: the new value.
+    :return: the error, None if the field was changed.
+    '''
+    if s_field not in AS_PATCH_FIELDS:
+        return 'invalid field'
+    if not isinstance(value, str):
+        return f'invalid {s_field}'
+    if s_field == 'email':
+        if not O_EMAIL_PATTERN.match(value):
+            return 'invalid email'
+        o_customer.sx_customer_email = value.upper()
+        o_customer.sx_customer_display_email = value
+    elif s_field == 'address':
+        o_customer.sx_customer_addr = value.upper()
+        o_customer.sx_customer_display_addr = value
+    else:
+        if not O_PHONE_NUMBER_PATTERN.match(value):
+            return 'invalid phone number'
+        o_customer.sx_customer_phone = value
+    return None
+
+def patch_customers(d_patches: dict) -> (str, int):
+    '''
+    A method for changing any number of fields of any number of customers
+    with a single lookup and a single commit. Nothing is changed unless
+    every change is valid.
+    :param: d_patches: the changes mapped by the name of the customer,
+    each one a dictionary of the new values of email, address or phone.
+    :return: the json response with status code.
+    '''
+    if not d_patches:
+        return jsonify({"message": "invalid"}), 400
+    o_session = current_app.config['DB']['session']
+    d_customers = {
+        o.sx_customer_name: o for o in o_session.execute(
+            select(SXCustomer).where(SXCustomer.sx_customer_name.in_({s.upper() for s in d_patches}))
+        ).scalars()
+    }
+
+    d_errors = {}
+    for s_customer, d_changes in d_patches.items():
+        o_customer = d_customers.get(s_customer.upper())
+        if o_customer is None:
+            d_errors[s_customer] = 'invalid customer'
+            continue
+        if not isinstance(d_changes, dict) or not d_changes:
+            d_errors[s_customer] = 'invalid'
+            continue
+        for s_field, value in d_changes.items():
+            s_error = _set_customer_field(o_customer, s_field, value)
+            if s_error is not None:
+                d_errors[s_customer] = s_error
+                break
+    if d_errors:
+        o_session.rollback()
+        return jsonify({"message": next(iter(d_errors.values())), "errors": d_errors}), 400
+
+    o_session.commit()
+    return jsonify({"message": "success", "updated": len(d_patches)}), 200
+
 def update_customer_email(s_customer: str, s_email: str) -> (str, int):
     '''
     A method for updating the customer's email address.
@@ -142,21 +470,7 @@ def update_customer_email(s_customer: str, s_email: str) -> (str, int):
     :param: s_email: the customer's new email.
     :return: json response with status code.
     '''
-
-    # retrieving the customer
-    o_customer = get_customer(s_customer)
-    if o_customer is None:
-        return jsonify({"message", "invalid customer"}), 400
-    
-    # error checking the email
-    o_email_pattern = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
-    if not o_email_pattern.match(s_email):
-        return jsonify({"message": "invalid email"}), 400
-
-    # updating the email
-    o_customer.sx_customer_email = s_email
-    current_app.config['DB']['session'].commit()
-    return jsonify({"message": "success"}), 200
+    return patch_customers({s_customer: {'email': s_email}})
 
 def update_customer_address(s_customer: str, s_address: str) -> (str, int):
     '''
@@ -165,16 +479,7 @@ def update_customer_address(s_customer: str, s_address: str) -> (str, int):
     :param: s_address: customer's new address.
     :return: the json response with status code.
     '''
-
-    # retrieving the customer
-    o_customer = get_customer(s_customer)
-    if o_customer is None:
-        return jsonify({"message", "invalid customer"}), 400
-    
-    # updating the customer's address
-    o_customer.sx_customer_addr = s_address
-    current_app.config['DB']['session'].commit()
-    return jsonify({'message': 'success'}), 200
+    return patch_customers({s_customer: {'address': s_address}})
 
 def update_customer_phone_number(s_customer: str, s_number: str) -> (str, int):
     '''
@@ -183,18 +488,109 @@ def update_customer_phone_number(s_customer: str, s_number: str) -> (str, int):
     :param: s_number: the customer's new phone number
     :return: the json response with status code.
     '''
+    return patch_customers({s_customer: {'phone': s_number}})
 
-    # getting the customer
-    o_customer = get_customer(s_customer)
-    if o_customer is None:
-        return jsonify({"message": "invalid customer"}), 400
-    
-    # error checking the phone number
-    o_phone_number_pattern = re.compile(r'^\+[1-9]\d{1,14}$')
-    if not o_phone_number_pattern.match(s_number):
-        return jsonify({'message', 'invalid phone number'}), 400
+def import_customers(it_rows) -> (str, int):
+    '''
+    A method for adding many customers at once. The rows are validated
+    with the same rules as add_customer, checked for duplicates with a
+    single query per chunk and inserted in batches. All of the valid rows
+    are added in a single transaction and the invalid ones are reported.
+    :param: it_rows: an iterable of dictionaries holding the name, address,
+    phone and email of every customer. None stands for a row that could
+    not be parsed.
+    :return: the json response holding the number of inserted customers
+    and the errors by row number, with status code.
+    '''
+    o_session = current_app.config['DB']['session']
+    b_sqlite = o_session.get_bind().dialect.name == 'sqlite'
+    i_inserted = 0
+    ld_errors = []
+    # The names of the file so far, to catch duplicates within the file
+    ss_names = set()
 
-    # updating the phone number
-    o_customer.sx_customer_phone = s_number
-    current_app.config['DB']['session'].commit()
-    return jsonify({"message", "success"}), 200
+    if b_sqlite:
+        # Indexing the rows once at the end is far cheaper than a trigger per row
+        i_last_id = o_session.execute(select(func.max(SXCustomer.sx_customer_id))).scalar() or 0
+        o_session.execute(text("INSERT INTO sxcustomer_fts_pause DEFAULT VALUES"))
+
+    def flush_chunk(lt_chunk: list[tuple]) -> int:
+        # Dropping the customers that already exist
+        ss_existing = set(o_session.execute(
+            select(SXCustomer.sx_customer_name).where(
+                SXCustomer.sx_customer_name.in_([d['sx_customer_name'] for _, d in lt_chunk])
+            )
+        ).scalars())
+        ld_valid = []
+        for i_row, d_customer in lt_chunk:
+            if d_customer['sx_customer_name'] in ss_existing:
+                ld_errors.append({"row": i_row, "message": "duplicate"})
+            else:
+                ld_valid.append(d_customer)
+        if ld_valid:
+            o_session.execute(SXCustomer.__table__.insert(), ld_valid)
+        return len(ld_valid)
+
+    lt_chunk = []
+    try:
+        for i_row, d_row in enumerate(it_rows, start=1):
+            s_message = _validate_import_row(d_row)
+            if s_message is not None:
+                ld_errors.append({"row": i_row, "message": s_message})
+                continue
+
+            s_name = d_row['name'].strip().upper()
+            if s_name in ss_names:
+                ld_errors.append({"row": i_row, "message": "duplicate"})
+                continue
+            ss_names.add(s_name)
+
+            s_addr = (d_row.get('address') or '').strip()
+            s_email = (d_row.get('email') or '').strip()
+            if not O_EMAIL_PATTERN.match(s_email):
+                s_email = None
+            lt_chunk.append((i_row, {
+                'sx_customer_name': s_name,
+                'sx_customer_addr': s_addr.upper(),
+                'sx_customer_phone': d_row['phone'].strip(),
+                'sx_customer_email': s_email.upper() if s_email else None,
+                'sx_customer_display_name': d_row['name'].strip(),
+                'sx_customer_display_addr': s_addr,
+                'sx_customer_display_email': s_email
+            }))
+            if len(lt_chunk) >= I_IMPORT_CHUNK:
+                i_inserted += flush_chunk(lt_chunk)
+                lt_chunk = []
+        if lt_chunk:
+            i_inserted += flush_chunk(lt_chunk)
+        if b_sqlite:
+            o_session.execute(text(S_INDEX_CUSTOMERS_AFTER), {'id': i_last_id})
+            o_session.execute(text("DELETE FROM sxcustomer_fts_pause"))
+        o_session.commit()
+    except Exception:
+        o_session.rollback()
+        raise
+
+    return jsonify({
+        "message": {
+            "inserted": i_inserted,
+            "errors": sorted(ld_errors, key=lambda d: d["row"])
+        }
+    }), 200
+
+def _validate_import_row(d_row: dict) -> str:
+    '''
+    A method for validating a row of an import.
+    :param: d_row: the row.
+    :return: the error message or None if the row is valid.
+    '''
+    if not isinstance(d_row, dict):
+        return 'invalid row'
+    if not isinstance(d_row.get('name'), str) or not d_row['name'].strip():
+        return 'invalid name'
+    if not isinstance(d_row.get('phone'), str) or not O_PHONE_NUMBER_PATTERN.match(d_row['phone'].strip()):
+        return 'invalid phone number'
+    for s_key in ('address', 'email'):
+        if d_row.get(s_key) is not None and not isinstance(d_row[s_key], str):
+            return f'invalid {s_key}'
+    return None
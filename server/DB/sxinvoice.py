@@ -1,6 +1,14 @@
+import datetime
 import enum
-from flask import current_app
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Boolean
+from flask import current_app, jsonify
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Boolean, Index,\
+    select, func, case, exists, and_
+from sqlalchemy.exc import IntegrityError
+from server.DB.sxcustomer import SXCustomer
+from server.DB.sxpatient import SXPatient
+from server.DB.sxproduct import SXProduct
+from server.DB import SXBase
+from server.DB.routing import read_only
 
 class SXInvoiceStatus(enum.Enum):
     FINISH = 0
@@ -8,7 +16,7 @@ class SXInvoiceStatus(enum.Enum):
     MODIFIED = 2
     VOID = 3
 
-class SXInvoice(current_app.config['DB']['base']):
+class SXInvoice(SXBase):
     __tablename__ = 'sxinvoice'
     sx_invoice_id = Column(Integer, primary_key=True, index=True)
     sx_patient_id = Column(ForeignKey("sxpatient.sx_patient_id", ondelete='cascade'))
@@ -16,19 +24,226 @@ class SXInvoice(current_app.config['DB']['base']):
     sx_date = Column(DateTime) # should be now by default
     sx_due_date = Column(DateTime)
     sx_invoice_status = Column(Enum(SXInvoiceStatus), default=SXInvoiceStatus.FINISH)
+    __table_args__ = (
+        # The invoices of a customer in the order they were made
+        Index('ix_sxinvoice_sx_customer_id_sx_date', 'sx_customer_id', 'sx_date'),
+    )
 
-class SXInvoiceItem(current_app.config['DB']['base']):
+class SXInvoiceItem(SXBase):
     __tablename__ = 'sxinvoiceitem'
     # Disregard sx_invoice_item_id. It is the primary key of the table and has nothing to do with the logic
     sx_invoice_item_id = Column(Integer, primary_key=True)
     sx_invoice_id = Column(ForeignKey("sxinvoice.sx_invoice_id", ondelete="cascade"), index=True)
-    sx_product_id = Column(ForeignKey("sxproduct.sx_product_id", ondelete="cascade"))
+    sx_product_id = Column(ForeignKey("sxproduct.sx_product_id", ondelete="cascade"), index=True)
     sx_invoice_item_count = Column(Integer)
 
 
-class SXInvoiceReturn(current_app.config['DB']['base']):
+class SXInvoiceReturn(SXBase):
     __tablename__ = 'sxinvoicereturn'
     sx_invoice_return_id = Column(Integer, primary_key=True)
     sx_invoice_id = Column(ForeignKey('sxinvoice.sx_invoice_id', ondelete='cascade'), index=True)
     sx_description = Column(String)
     sx_warranty_coverage = Column(Boolean)
+
+def compute_invoice_totals(*ao_filters) -> list[dict]:
+    '''
+    A method for computing the totals of many invoices in a single query.
+    The items are priced with the current rates of their products. Void
+    invoices and invoices returned under warranty owe nothing.
+    :param: ao_filters: the conditions over SXInvoice selecting the invoices.
+    :return: a dictionary per invoice holding its id, status, number of items,
+    subtotals at the normal and ministery rates, whether it was returned and
+    the totals that are owed at each rate.
+    '''
+    o_count = func.coalesce(SXInvoiceItem.sx_invoice_item_count, 0)
+    o_normal = func.coalesce(func.sum(o_count * SXProduct.sx_normal_rate), 0.0)
+    o_ministery = func.coalesce(func.sum(
+        o_count * func.coalesce(SXProduct.sx_ministery_rate, SXProduct.sx_normal_rate)
+    ), 0.0)
+    o_returned = exists().where(
+        SXInvoiceReturn.sx_invoice_id == SXInvoice.sx_invoice_id
+    )
+    o_covered = exists().where(and_(
+        SXInvoiceReturn.sx_invoice_id == SXInvoice.sx_invoice_id,
+        SXInvoiceReturn.sx_warranty_coverage.is_(True)
+    ))
+    o_waived = (SXInvoice.sx_invoice_status == SXInvoiceStatus.VOID) | o_covered
+
+    o_query = select(
+        SXInvoice.sx_invoice_id.label('invoice'),
+        SXInvoice.sx_invoice_status.label('status'),
+        func.coalesce(func.sum(o_count), 0).label('items'),
+        o_normal.label('subtotal'),
+        o_ministery.label('ministery_subtotal'),
+        o_returned.label('returned'),
+        case((o_waived, 0.0), else_=o_normal).label('total'),
+        case((o_waived, 0.0), else_=o_ministery).label('ministery_total')
+    ).outerjoin(
+        SXInvoiceItem, SXInvoiceItem.sx_invoice_id == SXInvoice.sx_invoice_id
+    ).outerjoin(
+        SXProduct, SXProduct.sx_product_id == SXInvoiceItem.sx_product_id
+    ).where(
+        *ao_filters
+    ).group_by(
+        SXInvoice.sx_invoice_id, SXInvoice.sx_invoice_status
+    ).order_by(SXInvoice.sx_invoice_id)
+
+    return [
+        dict(o_row._mapping) for o_row in current_app.config['DB']['session'].execute(o_query)
+    ]
+
+@read_only
+def get_invoice_totals(li_invoice_ids: list[int] = None, i_customer_id: int = None) -> (str, int):
+    '''
+    A method for getting the totals of a batch of invoices.
+    :param: li_invoice_ids: the ids of the invoices.
+    :param: i_customer_id: the id of the customer whose invoices are totaled.
+    :return: the json response with status code.
+    '''
+    ao_filters = []
+    if li_invoice_ids is not None:
+        ao_filters.append(SXInvoice.sx_invoice_id.in_(li_invoice_ids))
+    if i_customer_id is not None:
+        ao_filters.append(SXInvoice.sx_customer_id == i_customer_id)
+    if not ao_filters:
+        return jsonify({"message": "invalid"}), 400
+
+    return jsonify({
+        "message": [{
+            **d_total,
+            "status": d_total["status"].name,
+            "returned": bool(d_total["returned"])
+        } for d_total in compute_invoice_totals(*ao_filters)]
+    }), 200
+
+def create_invoice(s_customer: str, s_patient: str, ld_items: list[dict],
+                   dt_date: datetime.datetime = None, dt_due_date: datetime.datetime = None,
+                   e_status: SXInvoiceStatus = SXInvoiceStatus.FINISH) -> (str, int):
+    '''
+    A method for creating an invoice with all of its items in a single
+    transaction. The customer and the patient are checked by one query
+    and the products of every item by another, whatever the number of
+    items, and the sales rollups are updated before the commit.
+    :param: s_customer: the name of the customer.
+    :param: s_patient: the name of a patient of the customer or None.
+    :param: ld_items: the items, each one a dictionary of the name of a
+    product and a count.
+    :param: dt_date: the date of the invoice, now by default.
+    :param: dt_due_date: the date the invoice is due.
+    :param: e_status: the status of the invoice.
+    :return: the json response with status code.
+    '''
+    import server.DB.sxsales as sxsales
+    import server.DB.sxstock as sxstock
+
+    if not ld_items or any(
+        not isinstance(d_item, dict) or not isinstance(d_item.get('product'), str)
+        or type(d_item.get('count')) is not int or d_item['count'] <= 0
+        for d_item in ld_items
+    ):
+        return jsonify({"message": "invalid items"}), 400
+    o_session = current_app.config['DB']['session']
+
+    # The customer and the patient
+    o_query = select(SXCustomer.sx_customer_id, SXPatient.sx_patient_id).outerjoin(
+        SXPatient, and_(
+            SXPatient.sx_doctor_id == SXCustomer.sx_customer_id,
+            SXPatient.sx_patient_name == (s_patient or '').upper()
+        )
+    ).where(SXCustomer.sx_customer_name == s_customer.upper())
+    o_row = o_session.execute(o_query).first()
+    if o_row is None:
+        return jsonify({"message": "invalid customer"}), 400
+    i_customer_id, i_patient_id = o_row
+    if s_patient and i_patient_id is None:
+        return jsonify({"message": "invalid patient"}), 400
+
+    # The products of all of the items
+    d_products = dict(o_session.execute(
+        select(SXProduct.sx_product_name, SXProduct.sx_product_id).where(
+            SXProduct.sx_product_name.in_({d_item['product'].upper() for d_item in ld_items})
+        )
+    ).all())
+    as_missing = sorted({
+        d_item['product'] for d_item in ld_items if d_item['product'].upper() not in d_products
+    })
+    if as_missing:
+        return jsonify({"message": "invalid products", "products": as_missing}), 400
+
+    o_invoice = SXInvoice(
+        sx_customer_id=i_customer_id,
+        sx_patient_id=i_patient_id,
+        sx_date=dt_date or datetime.datetime.now(),
+        sx_due_date=dt_due_date,
+        sx_invoice_status=e_status
+    )
+    try:
+        o_session.add(o_invoice)
+        o_session.flush()
+        i_invoice_id = o_invoice.sx_invoice_id
+        # The items are inserted together by a single statement, the unit of
+        # work would insert them one by one to read back their ids
+        o_session.execute(SXInvoiceItem.__table__.insert(), [
+            {
+                'sx_invoice_id': i_invoice_id,
+                'sx_product_id': d_products[d_item['product'].upper()],
+                'sx_invoice_item_count': d_item['count']
+            } for d_item in ld_items
+        ])
+        sxsales.sync_invoice_sales([i_invoice_id])
+        sxstock.sync_invoice_stock([i_invoice_id])
+        o_session.commit()
+    except IntegrityError:
+        # A product or the customer was deleted in the meantime
+        o_session.rollback()
+        return jsonify({"message": "invalid"}), 400
+    return jsonify({
+        "message": {"invoice": i_invoice_id, "items": len(ld_items)}
+    }), 200
+
+def update_invoice_status(i_invoice_id: int, e_status: SXInvoiceStatus) -> (str, int):
+    '''
+    A method for finalizing, modifying or voiding an invoice. The sales
+    rollups and the stock are updated in the same transaction.
+    :param: i_invoice_id: the id of the invoice.
+    :param: e_status: the new status of the invoice.
+    :return: the json response with status code.
+    '''
+    import server.DB.sxsales as sxsales
+    import server.DB.sxstock as sxstock
+
+    o_invoice = current_app.config['DB']['session'].get(SXInvoice, i_invoice_id)
+    if o_invoice is None:
+        return jsonify({"message": "invalid"}), 400
+    o_invoice.sx_invoice_status = e_status
+    sxsales.sync_invoice_sales([i_invoice_id])
+    sxstock.sync_invoice_stock([i_invoice_id])
+    current_app.config['DB']['session'].commit()
+    return jsonify({"message": "success"}), 200
+
+def add_invoice_return(i_invoice_id: int, s_description: str, b_warranty: bool) -> (str, int):
+    '''
+    A method for recording that the products of an invoice were returned.
+    A return covered by the warranty is no longer a sale and its products
+    go back to the stock, both updated in the same transaction. Any other
+    return is still paid for and leaves both as they are.
+    :param: i_invoice_id: the id of the invoice.
+    :param: s_description: the reason of the return.
+    :param: b_warranty: whether the warranty covers the return.
+    :return: the json response with status code.
+    '''
+    import server.DB.sxsales as sxsales
+    import server.DB.sxstock as sxstock
+
+    o_session = current_app.config['DB']['session']
+    if o_session.get(SXInvoice, i_invoice_id) is None:
+        return jsonify({"message": "invalid"}), 400
+    o_session.add(SXInvoiceReturn(
+        sx_invoice_id=i_invoice_id,
+        sx_description=s_description,
+        sx_warranty_coverage=b_warranty
+    ))
+    sxsales.sync_invoice_sales([i_invoice_id])
+    sxstock.sync_invoice_stock([i_invoice_id])
+    o_session.commit()
+    return jsonify({"message": "success"}), 200
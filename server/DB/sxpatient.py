@@ -2,14 +2,18 @@
 Author: Kia Kalani
 Version: 1.00
 This module contains the implementation of patients.
-Last revised: 9/30/24
+Last revised: 10/18/26
 '''
 
 from flask import current_app, jsonify
-from sqlalchemy import Column, Integer, String, ForeignKey, UniqueConstraint, and_
+from sqlalchemy import Column, Integer, String, ForeignKey, Index, UniqueConstraint, and_, select
 import server.DB.sxcustomer as sxcustomer
+from server.DB.pagination import encode_cursor, decode_cursor, clamp_page_size
+from server.serializer import row_encoder
+from server.DB import SXBase
+from server.DB.routing import read_only
 
-class SXPatient(current_app.config['DB']['base']):
+class SXPatient(SXBase):
     '''
     The ORM representation of SXPatient
     '''
@@ -24,13 +28,17 @@ class SXPatient(current_app.config['DB']['base']):
     ))
     # The name of the patient. It is also indexed for fast searching
     sx_patient_name = Column(String, nullable=False, index=True)
+    # The name of the patient the way it was entered, for display
+    sx_patient_display_name = Column(String)
     # addition table arguments
     __table_args__ = (
         UniqueConstraint( # making sure combination of doctor and patient are unique
             'sx_patient_name',
             'sx_doctor_id',
             name='uix_sx_patient_name_sx_doctor_id'
-        )
+        ),
+        # the patients of a doctor are listed by their name
+        Index('ix_sxpatient_sx_doctor_id_sx_patient_name', 'sx_doctor_id', 'sx_patient_name'),
     )
 
     def __init__(self, o_doctor: sxcustomer.SXCustomer, s_name: str) -> None:
@@ -41,7 +49,12 @@ class SXPatient(current_app.config['DB']['base']):
         '''
         self.sx_doctor_id = o_doctor.sx_customer_id
         self.sx_patient_name = s_name.upper()
+        self.sx_patient_display_name = s_name
+
+# The keys of the patients in the search results
+encode_search_rows = row_encoder('name')
 
+@read_only
 def get_patient(o_customer: sxcustomer.SXCustomer, s_patient: str) -> SXPatient:
     '''
     A method for getting the patient based on the arguments.
@@ -75,29 +88,42 @@ def add_patient(o_customer: sxcustomer.SXCustomer, s_patient: str) -> (str, int)
     current_app.config['DB']['session'].commit()
     return jsonify({"message": "success"}), 200
 
-def search_patient(o_customer: sxcustomer.SXCustomer, s_query: str, i_limit=10) -> (str, int):
+@read_only
+def search_patient(o_customer: sxcustomer.SXCustomer, s_query: str, i_limit=10, s_cursor: str = None) -> (str, int):
     '''
-    A method for searching for patients.
+    A method for searching for patients. The patients are listed by
+    their name and the pages continue after the last name of the
+    previous page.
     :param: o_customer: the customer instance.
     :param: s_query: the search query.
     :param: i_limit: the limit of the items to return for the search.
+    :param: s_cursor: the cursor of the page to continue from.
     :return: a json response with a status code.
     '''
 
+    try:
+        l_after = decode_cursor(s_cursor, 1)
+    except ValueError:
+        return jsonify({"message": "invalid cursor"}), 400
+    i_limit = clamp_page_size(i_limit)
+
     # executing the query
     s_query = s_query.upper()
-    lo_resp: list[SXPatient] = current_app.config['DB']['session'].query(
-        SXPatient
-    ).filter(
-        and_(
-            SXPatient.sx_doctor_id == o_customer.sx_customer_id,
-            SXPatient.sx_patient_name.startswith(s_query)
-        )
-    ).limit(i_limit).all()
+    o_select = select(
+        SXPatient.sx_patient_display_name,
+        SXPatient.sx_patient_name
+    ).where(
+        SXPatient.sx_doctor_id == o_customer.sx_customer_id,
+        SXPatient.sx_patient_name.startswith(s_query)
+    )
+    if l_after:
+        o_select = o_select.where(SXPatient.sx_patient_name > l_after[0])
+    lo_resp = current_app.config['DB']['session'].execute(
+        o_select.order_by(SXPatient.sx_patient_name).limit(i_limit + 1)
+    ).all()
 
     # returning the items as a json with a status code.
     return jsonify({
-        "message": [{
-            "name": o.sx_patient_name
-        } for o in lo_resp]
+        "message": encode_search_rows(lo_resp[:i_limit]),
+        "next": encode_cursor([lo_resp[i_limit - 1].sx_patient_name]) if len(lo_resp) > i_limit else None
     }), 200
@@ -2,24 +2,32 @@ import enum
 from flask import current_app, jsonify
 from sqlalchemy import Column, Integer, String, ForeignKey,\
     DateTime, Enum, Boolean, Float, CheckConstraint, UniqueConstraint, and_,\
-        select, literal
+        select, literal, text, update, func, cast, Numeric
+from server.cache import SXLRUCache
+from server.DB.pagination import encode_cursor, decode_cursor, clamp_page_size
+from server.serializer import row_encoder
+from server.DB import SXBase
+from server.DB.routing import read_only
 
 
-class SXProduct(current_app.config['DB']['base']):
+class SXProduct(SXBase):
     __tablename__ = 'sxproduct'
     sx_product_id = Column(Integer, primary_key=True, index=True)
     sx_product_name = Column(String, index=True, unique=True, nullable=False)
     sx_normal_rate = Column(Float, nullable=False)
     sx_ministery_rate = Column(Float, nullable=True)
     sx_product_description = Column(String)
+    # The name the way it was entered, for display
+    sx_product_display_name = Column(String)
 
     def __init__(self, s_name: str, f_normal_rate: float, f_min_rate: float, s_description: str) -> None:
         self.sx_product_name = s_name.upper()
+        self.sx_product_display_name = s_name
         self.sx_normal_rate = f_normal_rate
         self.sx_ministery_rate = f_min_rate
         self.sx_product_description = s_description
 
-class SXProductAggregate(current_app.config['DB']['base']):
+class SXProductAggregate(SXBase):
     __tablename__ = 'sxproductaggregate'
     sx_aggregate_id = Column(Integer, primary_key=True)
 
@@ -54,11 +62,49 @@ class SXProductAggregate(current_app.config['DB']['base']):
         self.sx_agg_product_id = o_dest.sx_product_id
         self.sx_count_aggregate = i_count
 
+# The keys of the products in the search results
+encode_search_rows = row_encoder('name', 'normal_rate', 'ministery_rate', 'description')
+
+@read_only
 def get_product(s_name: str) -> SXProduct:
     return current_app.config['DB']['session'].query(SXProduct).where(
         SXProduct.sx_product_name == s_name.upper()
     ).first()
 
+@read_only
+def search_product(s_query: str, i_limit: int = 10, s_cursor: str = None) -> (str, int):
+    '''
+    A method for searching for products by the start of their name. The
+    pages continue after the last name of the previous page.
+    :param: s_query: the search query.
+    :param: i_limit: the limit of the items to return for the search.
+    :param: s_cursor: the cursor of the page to continue from.
+    :return: the json response with status code.
+    '''
+    try:
+        l_after = decode_cursor(s_cursor, 1)
+    except ValueError:
+        return jsonify({"message": "invalid cursor"}), 400
+    i_limit = clamp_page_size(i_limit)
+
+    o_select = select(
+        SXProduct.sx_product_display_name,
+        SXProduct.sx_normal_rate,
+        SXProduct.sx_ministery_rate,
+        SXProduct.sx_product_description,
+        SXProduct.sx_product_name
+    ).where(SXProduct.sx_product_name.startswith(s_query.upper()))
+    if l_after:
+        o_select = o_select.where(SXProduct.sx_product_name > l_after[0])
+    lo_resp = current_app.config['DB']['session'].execute(
+        o_select.order_by(SXProduct.sx_product_name).limit(i_limit + 1)
+    ).all()
+
+    return jsonify({
+        "message": encode_search_rows(lo_resp[:i_limit]),
+        "next": encode_cursor([lo_resp[i_limit - 1].sx_product_name]) if len(lo_resp) > i_limit else None
+    }), 200
+
 def add_product(s_name: str, f_normal_rate: float, s_description: str, f_min_rate: float = None) -> (str, int):
     if get_product(s_name):
         return jsonify({"message": "duplicate"}), 400
@@ -68,39 +114,132 @@ def add_product(s_name: str, f_normal_rate: float, s_description: str, f_min_rat
     current_app.config['DB']['session'].commit()
     return jsonify({"message": "success"}), 200
 
-def update_product_name(s_name: str, s_new_name: str) -> (str, int):
-    if get_product(s_new_name):
-        return jsonify({"message": "duplicate"}), 400
-    o_product = get_product(s_name)
-    if not o_product:
+def _set_product_field(o_product: SXProduct, s_field: str, value) -> str:
+    '''
+    A method for changing a field of a product after checking its value.
+    :param: o_product: the product instance.
+    :param: s_field: name, normal_rate, ministery_rate or description.
+    :param: value: the new value.
+    :return: the error, None if the field was changed.
+    '''
+    if s_field == 'name':
+        if not isinstance(value, str) or not value:
+            return 'invalid name'
+        o_product.sx_product_name = value.upper()
+        o_product.sx_product_display_name = value
+    elif s_field == 'ministery_rate' and value is None:
+        # The products without a ministery rate are sold at the normal rate
+        o_product.sx_ministery_rate = None
+    elif s_field in ('normal_rate', 'ministery_rate'):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            return f'invalid {s_field}'
+        setattr(o_product, f'sx_{s_field}', value)
+    elif s_field == 'description':
+        if not isinstance(value, str):
+            return 'invalid description'
+        o_product.sx_product_description = value
+    else:
+        return 'invalid field'
+    return None
+
+def patch_products(d_patches: dict) -> (str, int):
+    '''
+    A method for changing any number of fields of any number of products
+    with a single lookup and a single commit. Nothing is changed unless
+    every change is valid.
+    :param: d_patches: the changes mapped by the name of the product, each
+    one a dictionary of the new name, normal_rate, ministery_rate or description.
+    :return: the json response with status code.
+    '''
+    if not d_patches:
         return jsonify({"message": "invalid"}), 400
-    o_product.sx_product_name = s_new_name
-    current_app.config['DB']['session'].commit()
-    return jsonify({"message": "success"}), 200
+    as_new_names = {
+        d['name'].upper() for d in d_patches.values()
+        if isinstance(d, dict) and isinstance(d.get('name'), str)
+    }
+    o_session = current_app.config['DB']['session']
+    # The products to change along with the ones holding their new names
+    d_products = {
+        o.sx_product_name: o for o in o_session.execute(
+            select(SXProduct).where(
+                SXProduct.sx_product_name.in_({s.upper() for s in d_patches} | as_new_names)
+            )
+        ).scalars()
+    }
 
-def update_product_normal_rate(s_name: str, f_rate: float) -> (str, int):
-    o_product = get_product(s_name)
-    if not o_product:
+    d_errors = {}
+    as_taken = set()
+    for s_product, d_changes in d_patches.items():
+        o_product = d_products.get(s_product.upper())
+        if o_product is None:
+            d_errors[s_product] = 'invalid'
+            continue
+        if not isinstance(d_changes, dict) or not d_changes:
+            d_errors[s_product] = 'invalid'
+            continue
+        if isinstance(d_changes.get('name'), str):
+            s_new_name = d_changes['name'].upper()
+            o_owner = d_products.get(s_new_name)
+            if (o_owner is not None and o_owner is not o_product) or s_new_name in as_taken:
+                d_errors[s_product] = 'duplicate'
+                continue
+            as_taken.add(s_new_name)
+        for s_field, value in d_changes.items():
+            s_error = _set_product_field(o_product, s_field, value)
+            if s_error is not None:
+                d_errors[s_product] = s_error
+                break
+    if d_errors:
+        o_session.rollback()
+        return jsonify({"message": next(iter(d_errors.values())), "errors": d_errors}), 400
+
+    o_session.commit()
+    return jsonify({"message": "success", "updated": len(d_patches)}), 200
+
+def reprice_products(f_percent: float, b_ministery: bool = False, s_prefix: str = None) -> (str, int):
+    '''
+    A method for changing the rates of the whole catalog, or of the products
+    whose name starts with a prefix, by a percentage in a single statement.
+    The new rates are rounded to the cent. The invoices already posted to the
+    sales keep the amounts they were posted with.
+    :param: f_percent: the percentage, negative for a discount.
+    :param: b_ministery: whether the ministery rates change as well.
+    :param: s_prefix: the start of the names of the products to change.
+    :return: the json response with status code.
+    '''
+    if isinstance(f_percent, bool) or not isinstance(f_percent, (int, float)) or f_percent <= -100:
         return jsonify({"message": "invalid"}), 400
-    o_product.sx_normal_rate = f_rate
-    current_app.config['DB']['session'].commit()
-    return jsonify({"message": "success"}), 200
+    f_factor = 1 + f_percent / 100
+
+    def fn_rate(o_column):
+        # PostgreSQL only rounds numerics to a number of digits
+        return func.round(cast(o_column * f_factor, Numeric), 2)
+
+    d_values = {SXProduct.sx_normal_rate: fn_rate(SXProduct.sx_normal_rate)}
+    if b_ministery:
+        d_values[SXProduct.sx_ministery_rate] = fn_rate(SXProduct.sx_ministery_rate)
+    o_update = update(SXProduct).values(d_values)
+    if s_prefix:
+        o_update = o_update.where(SXProduct.sx_product_name.startswith(s_prefix.upper()))
+
+    o_session = current_app.config['DB']['session']
+    i_count = o_session.execute(
+        o_update, execution_options={'synchronize_session': False}
+    ).rowcount
+    o_session.commit()
+    return jsonify({"message": "success", "updated": i_count}), 200
+
+def update_product_name(s_name: str, s_new_name: str) -> (str, int):
+    return patch_products({s_name: {'name': s_new_name}})
+
+def update_product_normal_rate(s_name: str, f_rate: float) -> (str, int):
+    return patch_products({s_name: {'normal_rate': f_rate}})
 
 def update_product_ministery_rate(s_name, f_rate: float) -> (str, int):
-    o_product = get_product(s_name)
-    if not o_product:
-        return jsonify({"message": "invalid"}), 400
-    o_product.sx_ministery_rate = f_rate
-    current_app.config['DB']['session'].commit()
-    return jsonify({"message": "success"}), 200
+    return patch_products({s_name: {'ministery_rate': f_rate}})
 
 def update_product_description(s_name: str, s_desc: str) -> (str, int):
-    o_product = get_product(s_name)
-    if not o_product:
-        return jsonify({"message": "invalid"}), 400
-    o_product.sx_product_description = s_desc
-    current_app.config['DB']['session'].commit()
-    return jsonify({"message": "success"}), 200
+    return patch_products({s_name: {'description': s_desc}})
 
 def define_aggregate(s_prod: str, s_agg_prod: str, i_count: int = 1) -> (str, int):
     o_prod = get_product(s_prod)
@@ -109,13 +248,18 @@ def define_aggregate(s_prod: str, s_agg_prod: str, i_count: int = 1) -> (str, in
     o_dest = get_product(s_agg_prod)
     if not o_dest:
         return jsonify({"message": "invalid dest"}), 400
+    if o_prod.sx_product_id == o_dest.sx_product_id:
+        return jsonify({"message": "invalid"}), 400
     if current_app.config['DB']['session'].query(SXProductAggregate).filter(
         and_(
             SXProductAggregate.sx_product_id == o_prod.sx_product_id,
-            SXProductAggregate.sx_agg_product_id == o_prod.sx_product_id
+            SXProductAggregate.sx_agg_product_id == o_dest.sx_product_id
         )
     ).first():
         return jsonify({"message": "invalid"}), 400
+    # The product can not be a component of its own component
+    if any(t_row[0] == o_prod.sx_product_id for t_row in _expand_aggregates(o_dest.sx_product_id)):
+        return jsonify({"message": "cycle"}), 400
     o_agg = SXProductAggregate(o_prod, o_dest, i_count)
     current_app.config['DB']['session'].add(o_agg)
     current_app.config['DB']['session'].commit()
@@ -134,7 +278,7 @@ def remove_aggregate(s_prod: str, s_agg_prod: str, i_count: int) -> (str, int):
     ).filter(
         and_(
             SXProductAggregate.sx_product_id == o_prod.sx_product_id,
-            SXProductAggregate.sx_agg_product_id == o_prod.sx_product_id
+            SXProductAggregate.sx_agg_product_id == o_dest.sx_product_id
         )
     ).first()
     if not o_agg:
@@ -143,5 +287,123 @@ def remove_aggregate(s_prod: str, s_agg_prod: str, i_count: int) -> (str, int):
     current_app.config['DB']['session'].commit()
     return jsonify({"message": "success"}), 200
 
+# Walks the aggregate tree of :root in a single query. Every row carries the
+# path of ids that led to it so that a product showing up twice on the same
+# path is reported as a cycle instead of being expanded forever.
+S_EXPAND_AGGREGATES_QUERY = """
+    WITH RECURSIVE bom(product_id, quantity, path, cycle) AS (
+        SELECT
+            a.sx_agg_product_id,
+            a.sx_count_aggregate,
+            '/' || CAST(a.sx_product_id AS VARCHAR) || '/'
+                || CAST(a.sx_agg_product_id AS VARCHAR) || '/',
+            0
+        FROM sxproductaggregate a
+        WHERE a.sx_product_id = :root
+        UNION ALL
+        SELECT
+            a.sx_agg_product_id,
+            bom.quantity * a.sx_count_aggregate,
+            bom.path || CAST(a.sx_agg_product_id AS VARCHAR) || '/',
+            CASE WHEN bom.path LIKE '%/' || CAST(a.sx_agg_product_id AS VARCHAR) || '/%'
+                THEN 1 ELSE 0 END
+        FROM bom
+        JOIN sxproductaggregate a ON a.sx_product_id = bom.product_id
+        WHERE bom.cycle = 0
+    )
+    SELECT
+        bom.product_id,
+        p.sx_product_display_name,
+        SUM(bom.quantity),
+        CASE WHEN EXISTS (
+            SELECT 1 FROM sxproductaggregate c WHERE c.sx_product_id = bom.product_id
+        ) THEN 0 ELSE 1 END,
+        MAX(bom.cycle)
+    FROM bom
+    JOIN sxproduct p ON p.sx_product_id = bom.product_id
+    GROUP BY bom.product_id, p.sx_product_display_name
+"""
+
+# The tables the flattened bills of materials are read from
+AS_BOM_TABLES = ('sxproductaggregate', 'sxproduct')
+
+def _bom_cache() -> SXLRUCache:
+    '''
+    A method for getting the cache of the flattened bills of materials.
+    The entries are kept under the versions of the products and their
+    aggregates, so a change committed by any worker makes them unreachable.
+    :return: the cache mapping product ids to their leaf components.
+    '''
+    if 'BOM_CACHE' not in current_app.config:
+        current_app.config['BOM_CACHE'] = SXLRUCache(
+            int(current_app.config.get('BOM_CACHE_SIZE', 4096))
+        )
+    return current_app.config['BOM_CACHE']
+
+def _expand_aggregates(i_product_id: int) -> list[tuple]:
+    '''
+    A method for expanding the aggregate tree of a product.
+    :param: i_product_id: the id of the product.
+    :return: a row per product reachable from the product holding the id,
+    display name, total quantity, whether it is a leaf and whether it is on
+    a cycle.
+    '''
+    return [
+        tuple(o_row) for o_row in current_app.config['DB']['session'].execute(
+            text(S_EXPAND_AGGREGATES_QUERY),
+            {'root': i_product_id}
+        )
+    ]
+
+def get_flattened_bom(o_product: SXProduct, b_cached: bool = True) -> list[tuple]:
+    '''
+    A method for getting the leaf components of a product along with the
+    quantity needed for a single unit of it. A product without aggregates
+    is its own only component.
+    :param: o_product: the product instance.
+    :param: b_cached: whether the bill may come from the cache. Writes
+    must read it within their transaction since the versions of other
+    workers are only seen after a while.
+    :return: a list of (product id, display name, quantity) or None if the
+    aggregates of the product form a cycle.
+    '''
+    o_cache = _bom_cache()
+    # Read before the expansion so an entry is never older than its key
+    t_key = (o_product.sx_product_id, *current_app.config['DB']['versions'].get(AS_BOM_TABLES))
+    if b_cached:
+        lt_bom = o_cache.get(t_key)
+        if lt_bom is not None:
+            return lt_bom
+
+    lt_rows = _expand_aggregates(o_product.sx_product_id)
+    if any(t_row[4] for t_row in lt_rows):
+        return None
+    lt_bom = [
+        (t_row[0], t_row[1], t_row[2]) for t_row in lt_rows if t_row[3]
+    ] or [(o_product.sx_product_id, o_product.sx_product_display_name, 1)]
+    o_cache.set(t_key, lt_bom)
+    return lt_bom
+
+@read_only
 def get_product_and_aggregates(s_prod: str) -> (str, int):
-    pass
+    '''
+    A method for getting a product along with the leaf components it
+    is made of.
+    :param: s_prod: the name of the product.
+    :return: the json response with status code.
+    '''
+    o_prod = get_product(s_prod)
+    if not o_prod:
+        return jsonify({"message": "invalid"}), 400
+    lt_bom = get_flattened_bom(o_prod)
+    if lt_bom is None:
+        return jsonify({"message": "cycle"}), 400
+    return jsonify({
+        "message": {
+            "name": o_prod.sx_product_display_name,
+            "components": [{
+                "name": s_name,
+                "count": i_count
+            } for _, s_name, i_count in lt_bom]
+        }
+    }), 200
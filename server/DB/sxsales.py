@@ -0,0 +1,313 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for the sales analytics.
+The sales are rolled up per day as well as per day,
+customer and product, so that the dashboard reads a
+handful of rows per day instead of the invoices.
+Last Revised: 10/18/26
+'''
+
+import datetime
+import click
+from flask import current_app, jsonify
+from flask.cli import AppGroup
+from sqlalchemy import Column, Integer, Float, Date, PrimaryKeyConstraint,\
+    select, delete, func, and_, exists
+from server.DB.sxinvoice import SXInvoice, SXInvoiceItem, SXInvoiceReturn,\
+    SXInvoiceStatus
+from server.DB.sxproduct import SXProduct
+from server.DB import SXBase
+from server.DB.routing import read_only
+from server.DB.upsert import upsert_add
+
+# The invoice statuses that count as a sale
+TE_SOLD_STATUSES = (SXInvoiceStatus.FINISH, SXInvoiceStatus.MODIFIED)
+
+def sold_condition():
+    '''
+    A method for getting the condition of the invoices that count as a
+    sale: finalized or modified and not returned under warranty. A return
+    the warranty does not cover is still paid for, so it is still a sale.
+    The stock (see server.DB.sxstock) follows the same rule.
+    :return: the condition on SXInvoice.
+    '''
+    return and_(
+        SXInvoice.sx_invoice_status.in_(TE_SOLD_STATUSES),
+        ~exists().where(and_(
+            SXInvoiceReturn.sx_invoice_id == SXInvoice.sx_invoice_id,
+            SXInvoiceReturn.sx_warranty_coverage.is_(True)
+        ))
+    )
+
+class SXSalesPosting(SXBase):
+    '''
+    What every invoice currently contributes to the rollups. Comparing
+    it with the invoice gives the change to apply whenever the invoice
+    is finalized, modified or voided.
+    '''
+
+    __tablename__ = 'sxsalesposting'
+    sx_invoice_id = Column(Integer, nullable=False)
+    sx_product_id = Column(Integer, nullable=False)
+    sx_day = Column(Date, nullable=False)
+    # 0 when the invoice has no customer
+    sx_customer_id = Column(Integer, nullable=False)
+    sx_quantity = Column(Integer, nullable=False)
+    sx_amount = Column(Float, nullable=False)
+    __table_args__ = (
+        PrimaryKeyConstraint('sx_invoice_id', 'sx_product_id'),
+    )
+
+class SXSalesDaily(SXBase):
+    '''
+    The sales of a day broken down by customer and product.
+    '''
+
+    __tablename__ = 'sxsalesdaily'
+    sx_day = Column(Date, nullable=False)
+    sx_customer_id = Column(Integer, nullable=False)
+    sx_product_id = Column(Integer, nullable=False)
+    sx_quantity = Column(Integer, nullable=False, default=0)
+    sx_amount = Column(Float, nullable=False, default=0.0)
+    __table_args__ = (
+        PrimaryKeyConstraint('sx_day', 'sx_customer_id', 'sx_product_id'),
+    )
+
+class SXSalesDay(SXBase):
+    '''
+    The total sales of a day.
+    '''
+
+    __tablename__ = 'sxsalesday'
+    sx_day = Column(Date, primary_key=True)
+    sx_invoice_count = Column(Integer, nullable=False, default=0)
+    sx_quantity = Column(Integer, nullable=False, default=0)
+    sx_amount = Column(Float, nullable=False, default=0.0)
+
+def sync_invoice_sales(li_invoice_ids: list[int]) -> None:
+    '''
+    A method for bringing the rollups up to date with the invoices. Only
+    the difference between what the invoices contribute now and what they
+    contributed before gets applied, so calling it again is harmless. It
+    must be called in the same transaction as the change of the invoices
+    and it does not commit.
+    :param: li_invoice_ids: the ids of the invoices that changed.
+    '''
+    o_session = current_app.config['DB']['session']
+    o_session.flush()
+
+    # What the invoices should contribute
+    d_target = {}
+    for o_row in o_session.execute(
+        select(
+            SXInvoice.sx_invoice_id,
+            SXInvoice.sx_date,
+            SXInvoice.sx_customer_id,
+            SXInvoiceItem.sx_product_id,
+            func.sum(SXInvoiceItem.sx_invoice_item_count),
+            func.sum(SXInvoiceItem.sx_invoice_item_count * SXProduct.sx_normal_rate)
+        ).join(
+            SXInvoiceItem, SXInvoiceItem.sx_invoice_id == SXInvoice.sx_invoice_id
+        ).join(
+            SXProduct, SXProduct.sx_product_id == SXInvoiceItem.sx_product_id
+        ).where(
+            SXInvoice.sx_invoice_id.in_(li_invoice_ids),
+            sold_condition(),
+            SXInvoice.sx_date.is_not(None)
+        ).group_by(
+            SXInvoice.sx_invoice_id,
+            SXInvoice.sx_date,
+            SXInvoice.sx_customer_id,
+            SXInvoiceItem.sx_product_id
+        )
+    ):
+        i_invoice, dt_date, i_customer, i_product, i_quantity, f_amount = o_row
+        d_target[(i_invoice, i_product)] = (
+            dt_date.date(), i_customer or 0, i_quantity or 0, f_amount or 0.0
+        )
+
+    # What the invoices contribute at the moment
+    d_posted = {
+        (o.sx_invoice_id, o.sx_product_id): (
+            o.sx_day, o.sx_customer_id, o.sx_quantity, o.sx_amount
+        ) for o in o_session.execute(
+            select(SXSalesPosting).where(SXSalesPosting.sx_invoice_id.in_(li_invoice_ids))
+        ).scalars()
+    }
+
+    # The difference to be applied to the rollups
+    d_daily = {}
+    d_day = {}
+    for t_key in d_target.keys() | d_posted.keys():
+        for t_value, i_sign in ((d_posted.get(t_key), -1), (d_target.get(t_key), 1)):
+            if t_value is None:
+                continue
+            d_day_, i_customer, i_quantity, f_amount = t_value
+            t_daily = (d_day_, i_customer, t_key[1])
+            i_old_quantity, f_old_amount = d_daily.get(t_daily, (0, 0.0))
+            d_daily[t_daily] = (
+                i_old_quantity + i_sign * i_quantity,
+                f_old_amount + i_sign * f_amount
+            )
+            i_old_quantity, f_old_amount, _ = d_day.get(d_day_, (0, 0.0, 0))
+            d_day[d_day_] = (
+                i_old_quantity + i_sign * i_quantity,
+                f_old_amount + i_sign * f_amount,
+                0
+            )
+
+    # An invoice is counted on the day it is posted on
+    for i_invoice in li_invoice_ids:
+        for d_values, i_sign in ((d_posted, -1), (d_target, 1)):
+            sd_days = {t_value[0] for t_key, t_value in d_values.items() if t_key[0] == i_invoice}
+            for d_day_ in sd_days:
+                i_quantity, f_amount, i_count = d_day.get(d_day_, (0, 0.0, 0))
+                d_day[d_day_] = (i_quantity, f_amount, i_count + i_sign)
+
+    upsert_add(SXSalesDaily.__table__, ['sx_day', 'sx_customer_id', 'sx_product_id'], [{
+        'sx_day': t_key[0],
+        'sx_customer_id': t_key[1],
+        'sx_product_id': t_key[2],
+        'sx_quantity': t_value[0],
+        'sx_amount': t_value[1]
+    } for t_key, t_value in d_daily.items() if t_value != (0, 0.0)])
+    upsert_add(SXSalesDay.__table__, ['sx_day'], [{
+        'sx_day': d_day_,
+        'sx_quantity': t_value[0],
+        'sx_amount': t_value[1],
+        'sx_invoice_count': t_value[2]
+    } for d_day_, t_value in d_day.items() if t_value != (0, 0.0, 0)])
+
+    # Remembering what the invoices contribute now
+    o_session.execute(
+        delete(SXSalesPosting).where(SXSalesPosting.sx_invoice_id.in_(li_invoice_ids))
+    )
+    if d_target:
+        o_session.execute(SXSalesPosting.__table__.insert(), [{
+            'sx_invoice_id': t_key[0],
+            'sx_product_id': t_key[1],
+            'sx_day': t_value[0],
+            'sx_customer_id': t_value[1],
+            'sx_quantity': t_value[2],
+            'sx_amount': t_value[3]
+        } for t_key, t_value in d_target.items()])
+
+def rebuild_sales() -> int:
+    '''
+    A method for rebuilding all of the rollups from the invoices. It is
+    meant for filling the rollups of an existing database and it commits.
+    :return: the number of invoices rolled up.
+    '''
+    o_session = current_app.config['DB']['session']
+    for o_table in (SXSalesPosting, SXSalesDaily, SXSalesDay):
+        o_session.execute(delete(o_table))
+    li_ids = list(o_session.execute(select(SXInvoice.sx_invoice_id)).scalars())
+    for i_start in range(0, len(li_ids), 500):
+        sync_invoice_sales(li_ids[i_start:i_start + 500])
+    o_session.commit()
+    return len(li_ids)
+
+def fill_sales() -> int:
+    '''
+    A method for rolling up the invoices of a database whose rollups were
+    never filled, e.g. one made before the rollups existed. Rollups that
+    are already kept are left alone.
+    :return: the number of invoices rolled up.
+    '''
+    o_session = current_app.config['DB']['session']
+    if o_session.execute(select(SXSalesPosting.sx_invoice_id).limit(1)).first() is not None:
+        return 0
+    return rebuild_sales()
+
+def _day_totals(d_start: datetime.date, d_end: datetime.date) -> dict:
+    '''
+    A method for getting the totals of the days within a range.
+    :param: d_start: the first day.
+    :param: d_end: the last day.
+    :return: the totals mapped by their day.
+    '''
+    return {
+        o.sx_day: {
+            'day': o.sx_day.isoformat(),
+            'invoices': o.sx_invoice_count,
+            'quantity': o.sx_quantity,
+            'amount': round(o.sx_amount, 2)
+        } for o in current_app.config['DB']['session'].execute(
+            select(SXSalesDay).where(SXSalesDay.sx_day.between(d_start, d_end))
+        ).scalars()
+    }
+
+def _empty_day(d_day: datetime.date) -> dict:
+    return {'day': d_day.isoformat(), 'invoices': 0, 'quantity': 0, 'amount': 0.0}
+
+@read_only
+def get_sales_summary(d_today: datetime.date = None) -> (str, int):
+    '''
+    A method for getting the sales of today compared to yesterday.
+    :param: d_today: the day considered as today.
+    :return: the json response with status code.
+    '''
+    d_today = d_today or datetime.date.today()
+    d_yesterday = d_today - datetime.timedelta(days=1)
+    d_totals = _day_totals(d_yesterday, d_today)
+    return jsonify({
+        "message": {
+            "today": d_totals.get(d_today, _empty_day(d_today)),
+            "yesterday": d_totals.get(d_yesterday, _empty_day(d_yesterday))
+        }
+    }), 200
+
+@read_only
+def get_sales_range(d_start: datetime.date, d_end: datetime.date, s_group: str = None) -> (str, int):
+    '''
+    A method for getting the sales within a range of days.
+    :param: d_start: the first day.
+    :param: d_end: the last day.
+    :param: s_group: None for the totals of every day, "customer" or
+    "product" for the totals of the range broken down by either.
+    :return: the json response with status code.
+    '''
+    if d_end < d_start:
+        return jsonify({"message": "invalid"}), 400
+
+    if s_group is None:
+        d_totals = _day_totals(d_start, d_end)
+        return jsonify({
+            "message": [
+                d_totals.get(d_start + datetime.timedelta(days=i), _empty_day(
+                    d_start + datetime.timedelta(days=i)
+                )) for i in range((d_end - d_start).days + 1)
+            ]
+        }), 200
+
+    d_columns = {
+        'customer': SXSalesDaily.sx_customer_id,
+        'product': SXSalesDaily.sx_product_id
+    }
+    if s_group not in d_columns:
+        return jsonify({"message": "invalid"}), 400
+    return jsonify({
+        "message": [{
+            s_group: i_id,
+            'quantity': i_quantity,
+            'amount': round(f_amount, 2)
+        } for i_id, i_quantity, f_amount in current_app.config['DB']['session'].execute(
+            select(
+                d_columns[s_group],
+                func.sum(SXSalesDaily.sx_quantity),
+                func.sum(SXSalesDaily.sx_amount)
+            ).where(
+                SXSalesDaily.sx_day.between(d_start, d_end)
+            ).group_by(d_columns[s_group]).order_by(func.sum(SXSalesDaily.sx_amount).desc())
+        )]
+    }), 200
+
+cli = AppGroup('sales', help='Maintain the sales rollups.')
+
+@cli.command('rebuild')
+def rebuild_sales_command():
+    '''
+    Rebuilds the rollups from the invoices.
+    '''
+    click.echo(f'{rebuild_sales()} invoices rolled up')
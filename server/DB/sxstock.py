@@ -0,0 +1,347 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for the stock of the
+products. Every movement is appended to a ledger and
+added to the quantity on hand of its product in the
+same transaction, so the stock of the whole catalog
+is read from one row per product instead of the
+history. Aggregate products are not stocked, selling
+one takes its components.
+Last Revised: 10/18/26
+'''
+
+import datetime
+import click
+from flask import current_app, jsonify
+from flask.cli import AppGroup
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, PrimaryKeyConstraint,\
+    select, delete, func, exists, literal, union_all
+from server.DB.sxinvoice import SXInvoice, SXInvoiceItem
+from server.DB.sxproduct import SXProduct, SXProductAggregate, get_product, get_flattened_bom
+from server.DB.sxsales import sold_condition
+from server.DB import SXBase
+from server.DB.routing import read_only
+from server.DB.upsert import upsert_add
+
+# The reasons of the movements
+S_REASON_INVOICE = 'invoice'
+S_REASON_ADJUST = 'adjust'
+S_REASON_COMPACT = 'compact'
+
+# The invoices synced per transaction when filling the postings
+I_FILL_CHUNK = 500
+
+class SXStockMovement(SXBase):
+    '''
+    A movement of stock, positive when it comes in. The ledger is only
+    ever appended to, except by compact which folds old movements into
+    one per product.
+    '''
+
+    __tablename__ = 'sxstockmovement'
+    sx_movement_id = Column(Integer, primary_key=True, autoincrement=True)
+    sx_product_id = Column(ForeignKey('sxproduct.sx_product_id', ondelete='cascade'), nullable=False)
+    sx_quantity = Column(Integer, nullable=False)
+    sx_reason = Column(String(16), nullable=False)
+    sx_invoice_id = Column(Integer)
+    sx_date = Column(DateTime, nullable=False)
+    __table_args__ = (
+        # The history of a product in the order it happened
+        Index('ix_sxstockmovement_sx_product_id_sx_date', 'sx_product_id', 'sx_date'),
+        {'sqlite_autoincrement': True}
+    )
+
+class SXStockPosting(SXBase):
+    '''
+    What every invoice currently takes from the stock of a product.
+    Comparing it with the invoice gives the movements to make whenever
+    the invoice is finalized, returned or voided.
+    '''
+
+    __tablename__ = 'sxstockposting'
+    sx_invoice_id = Column(Integer, nullable=False)
+    sx_product_id = Column(Integer, nullable=False)
+    sx_quantity = Column(Integer, nullable=False)
+    __table_args__ = (
+        PrimaryKeyConstraint('sx_invoice_id', 'sx_product_id'),
+    )
+
+class SXStockOnHand(SXBase):
+    '''
+    The quantity on hand of a product, the sum of its movements.
+    '''
+
+    __tablename__ = 'sxstockonhand'
+    sx_product_id = Column(
+        ForeignKey('sxproduct.sx_product_id', ondelete='cascade'),
+        primary_key=True
+    )
+    sx_quantity = Column(Integer, nullable=False, default=0)
+
+def _invoice_targets(li_invoice_ids: list[int]) -> dict:
+    '''
+    A method for getting what invoices should take from the stock. Only
+    the invoices that count as a sale take anything (see
+    server.DB.sxsales.sold_condition), so a return under warranty puts
+    the products back and any other return leaves them sold.
+    :param: li_invoice_ids: the ids of the invoices.
+    :return: the quantities mapped by (invoice id, component id).
+    '''
+    o_session = current_app.config['DB']['session']
+    lt_rows = o_session.execute(
+        select(
+            SXInvoiceItem.sx_invoice_id,
+            SXProduct,
+            func.sum(SXInvoiceItem.sx_invoice_item_count)
+        ).join(
+            SXInvoice, SXInvoice.sx_invoice_id == SXInvoiceItem.sx_invoice_id
+        ).join(
+            SXProduct, SXProduct.sx_product_id == SXInvoiceItem.sx_product_id
+        ).where(
+            SXInvoiceItem.sx_invoice_id.in_(li_invoice_ids),
+            sold_condition()
+        ).group_by(SXInvoiceItem.sx_invoice_id, SXProduct.sx_product_id)
+    ).all()
+    # Only the aggregates are expanded, most products being their own component
+    ss_aggregates = set(o_session.execute(
+        select(SXProductAggregate.sx_product_id).distinct().where(
+            SXProductAggregate.sx_product_id.in_({o_product.sx_product_id for _, o_product, _ in lt_rows})
+        )
+    ).scalars()) if lt_rows else set()
+
+    # Read within the transaction rather than from the cache, which may
+    # not have seen a change committed by another worker yet
+    d_boms = {}
+    for _, o_product, _ in lt_rows:
+        if o_product.sx_product_id in ss_aggregates and o_product.sx_product_id not in d_boms:
+            d_boms[o_product.sx_product_id] = get_flattened_bom(o_product, False)
+
+    d_target = {}
+    for i_invoice, o_product, i_count in lt_rows:
+        lt_bom = d_boms.get(o_product.sx_product_id)
+        # A product on a cycle is taken as it is rather than not at all
+        for i_component, _, i_quantity in lt_bom or [(o_product.sx_product_id, None, 1)]:
+            t_key = (i_invoice, i_component)
+            d_target[t_key] = d_target.get(t_key, 0) + (i_count or 0) * i_quantity
+    return d_target
+
+def _move(ld_movements: list[dict]) -> None:
+    '''
+    A method for appending movements to the ledger and adding them to
+    the quantities on hand. It does not commit.
+    :param: ld_movements: the movements, each one holding the id of a
+    product, a quantity, a reason and optionally the id of an invoice.
+    '''
+    if not ld_movements:
+        return
+    dt_now = datetime.datetime.now()
+    current_app.config['DB']['session'].execute(SXStockMovement.__table__.insert(), [
+        {'sx_invoice_id': None, 'sx_date': dt_now, **d_movement} for d_movement in ld_movements
+    ])
+    d_on_hand = {}
+    for d_movement in ld_movements:
+        d_on_hand[d_movement['sx_product_id']] = \
+            d_on_hand.get(d_movement['sx_product_id'], 0) + d_movement['sx_quantity']
+    upsert_add(SXStockOnHand.__table__, ['sx_product_id'], [
+        {'sx_product_id': i_product, 'sx_quantity': i_quantity}
+        for i_product, i_quantity in sorted(d_on_hand.items()) if i_quantity
+    ])
+
+def sync_invoice_stock(li_invoice_ids: list[int]) -> None:
+    '''
+    A method for bringing the stock up to date with the invoices. Only
+    the difference between what the invoices take now and what they took
+    before is moved, so calling it again is harmless. It must be called
+    in the same transaction as the change of the invoices and it does
+    not commit.
+    :param: li_invoice_ids: the ids of the invoices that changed.
+    '''
+    o_session = current_app.config['DB']['session']
+    o_session.flush()
+    d_target = _invoice_targets(li_invoice_ids)
+    d_posted = dict(((i_invoice, i_product), i_quantity) for i_invoice, i_product, i_quantity in o_session.execute(
+        select(SXStockPosting.sx_invoice_id, SXStockPosting.sx_product_id, SXStockPosting.sx_quantity)
+        .where(SXStockPosting.sx_invoice_id.in_(li_invoice_ids))
+    ))
+
+    # Taking from the stock is a negative movement
+    _move([{
+        'sx_product_id': t_key[1],
+        'sx_quantity': d_posted.get(t_key, 0) - d_target.get(t_key, 0),
+        'sx_reason': S_REASON_INVOICE,
+        'sx_invoice_id': t_key[0]
+    } for t_key in sorted(d_target.keys() | d_posted.keys())
+        if d_posted.get(t_key, 0) != d_target.get(t_key, 0)])
+
+    # Remembering what the invoices take now
+    if d_target != d_posted:
+        o_session.execute(
+            delete(SXStockPosting).where(SXStockPosting.sx_invoice_id.in_(li_invoice_ids))
+        )
+        if d_target:
+            o_session.execute(SXStockPosting.__table__.insert(), [{
+                'sx_invoice_id': t_key[0],
+                'sx_product_id': t_key[1],
+                'sx_quantity': i_quantity
+            } for t_key, i_quantity in d_target.items()])
+
+def fill_postings() -> int:
+    '''
+    A method for recording what the invoices of an existing database
+    take from the stock without moving it, so the stock is counted from
+    then on and voiding an old invoice puts its products back. It runs
+    within the app context and commits.
+    :return: the number of invoices recorded.
+    '''
+    o_session = current_app.config['DB']['session']
+    if o_session.execute(select(SXStockPosting.sx_invoice_id).limit(1)).first() is not None:
+        return 0
+    li_ids = list(o_session.execute(select(SXInvoice.sx_invoice_id)).scalars())
+    for i_start in range(0, len(li_ids), I_FILL_CHUNK):
+        d_target = _invoice_targets(li_ids[i_start:i_start + I_FILL_CHUNK])
+        if d_target:
+            o_session.execute(SXStockPosting.__table__.insert(), [{
+                'sx_invoice_id': t_key[0],
+                'sx_product_id': t_key[1],
+                'sx_quantity': i_quantity
+            } for t_key, i_quantity in d_target.items()])
+        o_session.commit()
+    return len(li_ids)
+
+def adjust_stock(s_product: str, i_quantity: int, s_reason: str = S_REASON_ADJUST) -> (str, int):
+    '''
+    A method for moving the stock of a product by hand, e.g. when it is
+    received or counted. Moving an aggregate product moves its components.
+    :param: s_product: the name of the product.
+    :param: i_quantity: the quantity, positive when it comes in.
+    :param: s_reason: the reason of the movement.
+    :return: the json response with status code.
+    '''
+    o_product = get_product(s_product)
+    if o_product is None or not i_quantity:
+        return jsonify({"message": "invalid"}), 400
+    lt_bom = get_flattened_bom(o_product, False)
+    if lt_bom is None:
+        return jsonify({"message": "cycle"}), 400
+    _move([{
+        'sx_product_id': i_component,
+        'sx_quantity': i_quantity * i_count,
+        'sx_reason': s_reason
+    } for i_component, _, i_count in lt_bom])
+    current_app.config['DB']['session'].commit()
+    return jsonify({"message": "success"}), 200
+
+@read_only
+def get_stock(s_product: str = None) -> (str, int):
+    '''
+    A method for getting the quantities on hand of every product that is
+    stocked, i.e. not an aggregate, in a single read.
+    :param: s_product: the name of a single product to get.
+    :return: the json response with status code.
+    '''
+    o_query = select(
+        SXProduct.sx_product_display_name,
+        func.coalesce(SXStockOnHand.sx_quantity, 0)
+    ).outerjoin(
+        SXStockOnHand, SXStockOnHand.sx_product_id == SXProduct.sx_product_id
+    ).where(
+        ~exists().where(SXProductAggregate.sx_product_id == SXProduct.sx_product_id)
+    ).order_by(SXProduct.sx_product_name)
+    if s_product is not None:
+        o_query = o_query.where(SXProduct.sx_product_name == s_product.upper())
+
+    return jsonify({
+        "message": [
+            {"name": s_name, "quantity": i_quantity}
+            for s_name, i_quantity in current_app.config['DB']['session'].execute(o_query)
+        ]
+    }), 200
+
+def reconcile() -> list[tuple]:
+    '''
+    A method for checking the quantities on hand against the sums of the
+    ledger and correcting the ones that drifted. It commits.
+    :return: (product id, quantity on hand, sum of the ledger) per product
+    that was corrected.
+    '''
+    o_session = current_app.config['DB']['session']
+    # Both sides are read by one statement so they are seen at the same
+    # point in time, and the correction is added rather than set so the
+    # movements made in the meantime are kept
+    o_both = union_all(
+        select(
+            SXStockOnHand.sx_product_id.label('product'),
+            SXStockOnHand.sx_quantity.label('on_hand'),
+            literal(0).label('ledger')
+        ),
+        select(
+            SXStockMovement.sx_product_id,
+            literal(0),
+            SXStockMovement.sx_quantity
+        )
+    ).subquery()
+    lt_drift = [tuple(o_row) for o_row in o_session.execute(
+        select(o_both.c.product, func.sum(o_both.c.on_hand), func.sum(o_both.c.ledger))
+        .group_by(o_both.c.product)
+        .having(func.sum(o_both.c.on_hand) != func.sum(o_both.c.ledger))
+        .order_by(o_both.c.product)
+    )]
+    upsert_add(SXStockOnHand.__table__, ['sx_product_id'], [
+        {'sx_product_id': i_product, 'sx_quantity': i_ledger - i_on_hand}
+        for i_product, i_on_hand, i_ledger in lt_drift
+    ])
+    o_session.commit()
+    return lt_drift
+
+def compact(dt_before: datetime.datetime) -> int:
+    '''
+    A method for folding the movements made before a date into a single
+    movement per product, keeping the ledger short. The quantities on
+    hand do not change. It commits.
+    :param: dt_before: the date before which the movements are folded.
+    :return: the number of movements removed.
+    '''
+    o_session = current_app.config['DB']['session']
+    o_old = SXStockMovement.sx_date < dt_before
+    lt_sums = o_session.execute(
+        select(SXStockMovement.sx_product_id, func.sum(SXStockMovement.sx_quantity))
+        .where(o_old)
+        .group_by(SXStockMovement.sx_product_id)
+    ).all()
+    i_removed = o_session.execute(delete(SXStockMovement).where(o_old)).rowcount
+    if lt_sums:
+        o_session.execute(SXStockMovement.__table__.insert(), [{
+            'sx_product_id': i_product,
+            'sx_quantity': i_quantity,
+            'sx_reason': S_REASON_COMPACT,
+            'sx_invoice_id': None,
+            'sx_date': dt_before
+        } for i_product, i_quantity in lt_sums])
+    o_session.commit()
+    return i_removed - len(lt_sums)
+
+cli = AppGroup('stock', help='Maintain the stock, e.g. from a nightly cron job.')
+
+@cli.command('reconcile')
+def reconcile_stock():
+    '''
+    Corrects the quantities on hand that differ from the ledger.
+    '''
+    lt_drift = reconcile()
+    for i_product, i_on_hand, i_ledger in lt_drift:
+        click.echo(f'product {i_product}: {i_on_hand} on hand, {i_ledger} in the ledger')
+    click.echo(f'{len(lt_drift)} products corrected')
+
+@cli.command('compact')
+@click.option('--days', 'i_days', type=int, default=None,
+              help='Fold the movements older than this many days (STOCK_COMPACT_DAYS, 365).')
+def compact_stock(i_days: int):
+    '''
+    Folds the old movements of the ledger, then reconciles.
+    '''
+    if i_days is None:
+        i_days = int(current_app.config.get('STOCK_COMPACT_DAYS', 365))
+    i_removed = compact(datetime.datetime.now() - datetime.timedelta(days=i_days))
+    click.echo(f'{i_removed} movements folded')
+    click.echo(f'{len(reconcile())} products corrected')
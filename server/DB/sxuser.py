@@ -2,14 +2,18 @@
 Author: Kia Kalani
 Version: 1.00
 This module contains the definition of SXUser.
-Last Revised: 9/24/24
+Last Revised: 10/18/26
 '''
 import enum
+import hashlib
 import re
+import time
+from collections import namedtuple
 from flask import current_app, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy import Column, Integer, Enum, String
 import jwt
+from server.hashing import SXHashingBusy
+from server.DB import SXBase
 
 class SXUserType(enum.Enum):
     '''
@@ -19,7 +23,7 @@ class SXUserType(enum.Enum):
     ADMIN = 0,
     CLIENT = 1
 
-class SXUser(current_app.config['DB']['base']):
+class SXUser(SXBase):
     '''
     The user instance for the project
     '''
@@ -39,25 +43,80 @@ class SXUser(current_app.config['DB']['base']):
         self.sx_password = s_password
         self.sx_usertype = e_usertype
 
-def get_sx_user(s_token: str) -> SXUserType:
+# A lightweight, detached copy of the user kept in the token cache
+SXUserRecord = namedtuple('SXUserRecord', ['sx_username', 'sx_usertype'])
+
+def get_sx_user(s_token: str) -> SXUserRecord:
     '''
     A getter method for the logged in user based on
-    the credentials.
+    the credentials. Verified tokens are cached along
+    with their user so that most requests skip both the
+    signature verification and the database.
     :param: s_token: The user's token
-    :return: The user instance based on their token
+    :return: The user record based on their token
     '''
+    if not s_token:
+        return None
+
+    o_cache = current_app.config['TOKEN_CACHE']
+    i_generation = current_app.config['KEYRING'].generation
+    # Users changed by any worker bump the version of their table
+    t_versions = current_app.config['DB']['versions'].get(('sxuser',))
+    s_digest = hashlib.sha256(s_token.encode()).hexdigest()
+
+    # The entries signed before a key change or a change of the users
+    # are verified again
+    t_entry = o_cache.get(s_digest)
+    if t_entry is not None and t_entry[0] == i_generation and t_entry[3] == t_versions:
+        return t_entry[2]
+
     try:
-        s_username = current_app.config['TOKEN_PARSE'](s_token)
-        return current_app.config['DB']['session'].query(SXUser).filter(
-            SXUser.sx_username == s_username
-        ).first()
+        d_claims = current_app.config['TOKEN_PARSE'](s_token)
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
-    return None
+
+    o_sxuser = current_app.config['DB']['session'].query(SXUser).filter(
+        SXUser.sx_username == d_claims.get('sub')
+    ).first()
+    if o_sxuser is None:
+        return None
+
+    o_record = SXUserRecord(o_sxuser.sx_username, o_sxuser.sx_usertype)
+    # Tokens must not outlive their expiry in the cache
+    f_ttl = None
+    if 'exp' in d_claims:
+        f_ttl = d_claims['exp'] - time.time()
+        if o_cache.f_ttl is not None:
+            f_ttl = min(o_cache.f_ttl, f_ttl)
+    if f_ttl is None or f_ttl > 0:
+        o_cache.set(s_digest, (i_generation, d_claims, o_record, t_versions), f_ttl)
+    return o_record
+
+def invalidate_sx_user(s_username: str) -> None:
+    '''
+    A method for dropping the cached tokens of a user right away in
+    this process. It must be called whenever the user gets changed,
+    the other workers verify the tokens again once they see the new
+    version of the users.
+    :param: s_username: the username.
+    '''
+    current_app.config['TOKEN_CACHE'].discard_if(
+        lambda s_digest, t_entry: t_entry[2].sx_username == s_username
+    )
+
+def _busy() -> (str, int, dict):
+    '''
+    A method for turning requests away while the password hasher
+    is saturated.
+    :return: the json response, status code and headers.
+    '''
+    return jsonify({
+        "message": "busy"
+    }), 429, {'Retry-After': str(current_app.config.get('PASSWORD_HASH_RETRY_AFTER', 1))}
 
 def register_sx_user(s_username: str, s_password: str, e_usertype: SXUserType) -> (str, int):
     '''
@@ -90,13 +149,18 @@ def register_sx_user(s_username: str, s_password: str, e_usertype: SXUserType) -
         }), 400
 
     # adding the user if everything is successful
+    try:
+        s_hash = current_app.config['PASSWORD_HASHER'].hash(s_password)
+    except SXHashingBusy:
+        return _busy()
     o_sxuser = SXUser(
         s_username,
-        generate_password_hash(s_password),
+        s_hash,
         e_usertype
     )
     current_app.config['DB']['session'].add(o_sxuser)
     current_app.config['DB']['session'].commit()
+    invalidate_sx_user(s_username)
 
     return jsonify({
         "message": "success"
@@ -123,8 +187,23 @@ def login_sx_user(s_username: str, s_password: str) -> (str, int):
             "message": "invalid"
         }), 400
 
+    o_hasher = current_app.config['PASSWORD_HASHER']
+    try:
+        b_valid = o_hasher.verify(o_sxuser.sx_password, s_password)
+    except SXHashingBusy:
+        return _busy()
+
+    # Upgrading hashes made with an older method or cost, which can
+    # wait for the next login if the hasher is saturated
+    if b_valid and o_hasher.needs_rehash(o_sxuser.sx_password):
+        try:
+            o_sxuser.sx_password = o_hasher.hash(s_password)
+            current_app.config['DB']['session'].commit()
+        except SXHashingBusy:
+            pass
+
     # Means password is correct
-    if check_password_hash(o_sxuser.sx_password, s_password):
+    if b_valid:
         return jsonify({
             "message": current_app.config['TOKEN_CREATE'](o_sxuser.sx_username)
         }), 200
@@ -0,0 +1,35 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for the upserts shared by
+the rollups, which add to the rows that exist in a
+single statement on both SQLite and PostgreSQL.
+Last Revised: 10/18/26
+'''
+
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+
+def upsert_add(o_table, as_keys: list[str], ld_rows: list[dict]) -> None:
+    '''
+    A method for adding the values of the rows to the existing rows of
+    the table, inserting the ones that do not exist yet.
+    :param: o_table: the table.
+    :param: as_keys: the columns identifying a row.
+    :param: ld_rows: the rows holding the keys and the values to be added.
+    '''
+    if not ld_rows:
+        return
+    o_session = current_app.config['DB']['session']
+    o_dialect = postgresql if o_session.get_bind().dialect.name == 'postgresql' else sqlite
+    o_insert = o_dialect.insert(o_table)
+    o_session.execute(
+        o_insert.on_conflict_do_update(
+            index_elements=as_keys,
+            set_={
+                s_column: o_table.c[s_column] + o_insert.excluded[s_column]
+                for s_column in ld_rows[0] if s_column not in as_keys
+            }
+        ),
+        ld_rows
+    )
@@ -0,0 +1,152 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module keeps a version number for every table
+that gets bumped in the same transaction as any write
+to the table. Anything derived from the content of a
+table can be cached under its version and becomes
+unreachable as soon as the table changes, in every
+worker sharing the database.
+Last Revised: 10/18/26
+'''
+
+import threading
+import time
+from flask import current_app
+from sqlalchemy import Column, Integer, String, event, select, text
+from server.DB import SXBase
+
+# The statement bumping the version of a table, understood by both
+# SQLite and PostgreSQL
+S_BUMP_QUERY = text(
+    'INSERT INTO sxtableversion (sx_table_name, sx_version) VALUES (:name, 1) '
+    'ON CONFLICT (sx_table_name) DO UPDATE SET sx_version = sxtableversion.sx_version + 1'
+)
+
+class SXTableVersion(SXBase):
+    '''
+    The version of a table.
+    '''
+
+    __tablename__ = 'sxtableversion'
+    sx_table_name = Column(String(64), primary_key=True)
+    sx_version = Column(Integer, nullable=False, default=0)
+
+class SXTableVersions:
+    '''
+    The versions of the tables as seen by this process. Writes committed
+    by this process are seen right away and writes committed by other
+    workers are picked up within f_refresh seconds.
+    '''
+
+    def __init__(self, o_engine, f_refresh: float = 1.0) -> None:
+        '''
+        The constructor.
+        :param: o_engine: the engine of the database.
+        :param: f_refresh: the number of seconds between two reads of the
+        versions from the database.
+        '''
+        self.o_engine = o_engine
+        self.f_refresh = f_refresh
+        self._o_lock = threading.Lock()
+        self._d_versions = {}
+        self._f_loaded = None
+
+    @property
+    def stale(self) -> bool:
+        '''
+        Whether the next read of the versions goes to the database.
+        '''
+        return self._f_loaded is None or time.monotonic() - self._f_loaded >= self.f_refresh
+
+    def get(self, as_tables) -> tuple:
+        '''
+        A method for getting the versions of tables.
+        :param: as_tables: the names of the tables.
+        :return: the versions in the same order, 0 for tables never written.
+        '''
+        if self.stale:
+            self.reload()
+        d_versions = self._d_versions
+        return tuple(d_versions.get(s_table, 0) for s_table in as_tables)
+
+    def reload(self) -> None:
+        '''
+        A method for reading the versions from the database.
+        '''
+        with self.o_engine.connect() as o_conn:
+            d_versions = dict(o_conn.execute(
+                select(SXTableVersion.sx_table_name, SXTableVersion.sx_version)
+            ).all())
+        with self._o_lock:
+            self._d_versions = d_versions
+            self._f_loaded = time.monotonic()
+
+    def update(self, d_versions: dict) -> None:
+        '''
+        A method for recording versions committed by this process.
+        :param: d_versions: the versions mapped by their table.
+        '''
+        with self._o_lock:
+            self._d_versions = {**self._d_versions, **d_versions}
+
+def mark_changed(o_session, *as_tables) -> None:
+    '''
+    A method for recording that tables were written by statements the
+    session can not see, such as raw sql.
+    :param: o_session: the session the statements ran in.
+    :param: as_tables: the names of the tables.
+    '''
+    o_session.info.setdefault('sx_changed', set()).update(as_tables)
+    # Kept apart for the change log (see server.DB.changes), which
+    # knows the rows of the flushes but not the ones of these statements
+    o_session.info.setdefault('sx_bulk_changed', set()).update(as_tables)
+
+def track_table_changes(o_session_factory, o_versions: SXTableVersions) -> None:
+    '''
+    A method for bumping the versions of the tables written by the
+    sessions of a factory whenever they commit.
+    :param: o_session_factory: the sessionmaker.
+    :param: o_versions: the versions of this process.
+    '''
+    @event.listens_for(o_session_factory, 'after_flush')
+    def after_flush(o_session, o_flush_context):
+        as_tables = o_session.info.setdefault('sx_changed', set())
+        for o in (*o_session.new, *o_session.dirty, *o_session.deleted):
+            as_tables.add(o.__table__.name)
+
+    @event.listens_for(o_session_factory, 'do_orm_execute')
+    def do_orm_execute(o_state):
+        # Bulk statements do not go through the flush
+        if o_state.is_insert or o_state.is_update or o_state.is_delete:
+            o_table = getattr(o_state.statement, 'table', None)
+            if o_table is not None and o_table.name != SXTableVersion.__tablename__:
+                mark_changed(o_state.session, o_table.name)
+
+    @event.listens_for(o_session_factory, 'before_commit')
+    def before_commit(o_session):
+        # The pending objects must be flushed before the bump
+        o_session.flush()
+        as_tables = sorted(o_session.info.pop('sx_changed', ()))
+        o_session.info.pop('sx_bulk_changed', None)
+        if not as_tables:
+            return
+        o_conn = o_session.connection()
+        o_conn.execute(S_BUMP_QUERY, [{'name': s_table} for s_table in as_tables])
+        o_session.info['sx_committed'] = dict(o_conn.execute(
+            select(SXTableVersion.sx_table_name, SXTableVersion.sx_version).where(
+                SXTableVersion.sx_table_name.in_(as_tables)
+            )
+        ).all())
+
+    @event.listens_for(o_session_factory, 'after_commit')
+    def after_commit(o_session):
+        d_versions = o_session.info.pop('sx_committed', None)
+        if d_versions:
+            o_versions.update(d_versions)
+
+    @event.listens_for(o_session_factory, 'after_rollback')
+    def after_rollback(o_session):
+        o_session.info.pop('sx_changed', None)
+        o_session.info.pop('sx_bulk_changed', None)
+        o_session.info.pop('sx_committed', None)
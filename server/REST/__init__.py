@@ -4,7 +4,7 @@ Version: 1.00
 This module is responsible for registering
 all of the necessary modules to the main
 application.
-Last revised: 9/24/24
+Last revised: 10/18/26
 '''
 
 from flask import current_app
@@ -15,4 +15,28 @@ def init():
     A method for initializing all of the blueprints.
     '''
     import server.REST.auth as auth
+    import server.REST.batch as batch
+    import server.REST.changes as changes
+    import server.REST.customer as customer
+    import server.REST.export as export
+    import server.REST.invoice as invoice
+    import server.REST.metrics as metrics
+    import server.REST.patient as patient
+    import server.REST.product as product
+    import server.REST.sales as sales
+    import server.REST.stock as stock
     current_app.register_blueprint(auth.bp)
+    current_app.register_blueprint(batch.bp)
+    current_app.register_blueprint(changes.bp)
+    current_app.register_blueprint(customer.bp)
+    current_app.register_blueprint(export.bp)
+    current_app.register_blueprint(invoice.bp)
+    current_app.register_blueprint(metrics.bp)
+    current_app.register_blueprint(patient.bp)
+    current_app.register_blueprint(product.bp)
+    current_app.register_blueprint(sales.bp)
+    current_app.register_blueprint(stock.bp)
+
+    # Compressing the responses of every blueprint
+    from server.REST.responses import setup_compression
+    setup_compression(current_app)
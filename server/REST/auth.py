@@ -3,14 +3,30 @@ Author: Kia Kalani
 Version: 1.00
 This module is responsible for providing the user
 with the authorization features.
-Last revised: 9/24/24
+Last revised: 10/18/26
 '''
 
-from flask import current_app, Blueprint, jsonify, request
+import functools
+from flask import current_app, Blueprint, jsonify, request, g
 import server.DB.sxuser as user
 
 bp = Blueprint("auth", __name__, url_prefix='/auth')
 
+def token_required(fn):
+    '''
+    A decorator for the routes that need a logged in user.
+    The user of the Auth-Token header is made available
+    as g.sx_user.
+    '''
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if g.get('sx_user') is None:
+            g.sx_user = user.get_sx_user(request.headers.get("Auth-Token"))
+            if g.sx_user is None:
+                return jsonify({"message": "invalid"}), 400
+        return fn(*args, **kwargs)
+    return wrapper
+
 @bp.route("/signin", methods=['POST'])
 def signin():
     '''
@@ -0,0 +1,148 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for running many requests
+in a single round trip, e.g. all of the widgets of the
+dashboard. The user is authenticated once for the whole
+batch.
+Last revised: 10/18/26
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, current_app, g, jsonify, request
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+from server.REST.auth import token_required
+
+bp = Blueprint("batch", __name__, url_prefix='/batch')
+
+# The methods that do not change anything and can run concurrently
+AS_READ_METHODS = ('GET', 'HEAD')
+
+# The endpoints streaming their response, which would hold the whole
+# batch for as long as they stream or be read into memory
+AS_STREAMED_ENDPOINTS = ('changes.stream', 'export.customers', 'export.patients', 'export.invoices')
+
+@bp.route("", methods=['POST'])
+@token_required
+def batch():
+    '''
+    This method gets invoked when the user sends many
+    requests at once. The body looks like
+    {"requests": [{"method": "GET", "path": "/sales/summary"},
+    {"method": "POST", "path": "/...", "body": {...}}],
+    "parallel": true}. The requests run in the given order
+    within the session of the batch, except that when
+    parallel is set consecutive reads run concurrently.
+    The responses come back in the same order.
+    '''
+    json_req = request.get_json(silent=True)
+    if not isinstance(json_req, dict) or not isinstance(json_req.get('requests'), list):
+        return jsonify({"message": "invalid"}), 400
+    ld_requests = json_req['requests']
+    if len(ld_requests) > int(current_app.config.get('BATCH_MAX_REQUESTS', 20)):
+        return jsonify({"message": "too many"}), 400
+
+    ld_responses = [None] * len(ld_requests)
+    li_reads = []
+    for i, d_request in enumerate(ld_requests):
+        if json_req.get('parallel') and _method(d_request) in AS_READ_METHODS:
+            li_reads.append(i)
+            continue
+        # A write waits for the reads before it
+        _run_concurrently(ld_requests, ld_responses, li_reads)
+        li_reads = []
+        ld_responses[i] = _run(d_request)
+    _run_concurrently(ld_requests, ld_responses, li_reads)
+
+    return jsonify({"message": ld_responses}), 200
+
+def _method(d_request) -> str:
+    return str(d_request.get('method', 'GET')).upper() if isinstance(d_request, dict) else None
+
+def _run_concurrently(ld_requests: list, ld_responses: list, li_indexes: list) -> None:
+    '''
+    A method for running read requests in threads. Every thread has its
+    own session as sessions can not be shared between threads.
+    :param: ld_requests: the requests of the batch.
+    :param: ld_responses: the responses the results are written to.
+    :param: li_indexes: the indexes of the requests to be run.
+    '''
+    if len(li_indexes) < 2:
+        for i in li_indexes:
+            ld_responses[i] = _run(ld_requests[i])
+        return
+
+    o_app = current_app._get_current_object()
+    o_user = g.sx_user
+    s_token = request.headers.get('Auth-Token')
+
+    def run(d_request):
+        with o_app.app_context():
+            g.sx_user = o_user
+            return _run(d_request, s_token)
+
+    with ThreadPoolExecutor(
+        min(len(li_indexes), int(current_app.config.get('BATCH_WORKERS', 4)))
+    ) as o_executor:
+        for i, d_response in zip(li_indexes, o_executor.map(run, [ld_requests[i] for i in li_indexes])):
+            ld_responses[i] = d_response
+
+def _run(d_request, s_token: str = None) -> dict:
+    '''
+    A method for running a single request of the batch within the
+    current app context, so it shares the session and the user of the
+    batch. The hooks of the app do not run for it. It runs within a
+    savepoint, so a request that fails only rolls back its own writes.
+    Streamed endpoints are turned away.
+    :param: d_request: the request holding the method, the path and
+    optionally the json body.
+    :param: s_token: the token of the batch when running outside of its
+    request.
+    :return: the status and the body of the response.
+    '''
+    s_path = d_request.get('path') if isinstance(d_request, dict) else None
+    if not isinstance(s_path, str) or not s_path.startswith('/') or \
+            s_path.split('?', 1)[0].rstrip('/') == bp.url_prefix:
+        return {"status": 400, "body": {"message": "invalid"}}
+
+    d_builder = {
+        'path': s_path,
+        'method': _method(d_request),
+        'headers': {'Auth-Token': s_token or request.headers.get('Auth-Token', '')}
+    }
+    if d_request.get('body') is not None:
+        d_builder['json'] = d_request['body']
+    o_builder = EnvironBuilder(**d_builder)
+    try:
+        environ = o_builder.get_environ()
+    finally:
+        o_builder.close()
+
+    with current_app.request_context(environ):
+        if request.endpoint in AS_STREAMED_ENDPOINTS:
+            return {"status": 400, "body": {"message": "streamed"}}
+        o_session = current_app.config['DB']['session']
+        # A failing request only undoes its own writes, not the ones the
+        # requests before it left in the session of the batch
+        o_savepoint = o_session.begin_nested()
+        try:
+            o_response = current_app.make_response(current_app.dispatch_request())
+            if o_response.is_streamed:
+                o_response.close()
+                o_response = current_app.make_response(({"message": "streamed"}, 400))
+        except HTTPException as e:
+            o_response = current_app.make_response(current_app.handle_user_exception(e))
+        except Exception as e:
+            if o_savepoint.is_active:
+                o_savepoint.rollback()
+            else:
+                o_session.rollback()
+            o_response = current_app.handle_exception(e)
+        if o_savepoint.is_active:
+            o_savepoint.commit()
+        return {
+            "status": o_response.status_code,
+            "body": o_response.get_json(silent=True) if o_response.is_json
+            else o_response.get_data(as_text=True)
+        }
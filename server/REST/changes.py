@@ -0,0 +1,136 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for telling the user
+about the customers, patients, products and invoices
+changed since they last looked, either on request or
+pushed as Server-Sent Events (see server.DB.changes).
+Last revised: 10/18/26
+'''
+
+import time
+from flask import Blueprint, current_app, jsonify, request, stream_with_context
+from server.REST.auth import token_required
+
+bp = Blueprint("changes", __name__, url_prefix='/changes')
+
+# The key of the environ asking the view to leave the events
+# to the ASGI server (see server.asgi)
+S_ASYNC_STREAM = 'sx.changes.stream'
+
+def stream_settings() -> tuple:
+    '''
+    A method for reading the settings of the streams from the config:
+    CHANGES_HEARTBEAT: the seconds between two keepalives of an idle stream (15).
+    CHANGES_STREAM_SECONDS: the seconds after which a stream ends and
+    the client reconnects from its last event (300).
+    CHANGES_RETRY: the milliseconds a client waits before reconnecting (2000).
+    :return: (heartbeat, seconds, retry).
+    '''
+    return (
+        float(current_app.config.get('CHANGES_HEARTBEAT', 15)),
+        float(current_app.config.get('CHANGES_STREAM_SECONDS', 300)),
+        int(current_app.config.get('CHANGES_RETRY', 2000))
+    )
+
+def encode_events(ld_changes: list) -> bytes:
+    '''
+    A method for encoding changes as Server-Sent Events, the version of
+    each change being its id so a client resumes from it.
+    :param: ld_changes: the changes.
+    :return: the events.
+    '''
+    fn_dumps = current_app.json.dumps
+    return ''.join(
+        f"id: {d['version']}\nevent: change\ndata: {fn_dumps(d)}\n\n" for d in ld_changes
+    ).encode()
+
+def open_event(i_retry: int, i_since: int) -> bytes:
+    '''
+    A method for encoding the first event of a stream. It has no data
+    and only sets the id a client resumes after if the stream ends before
+    any change.
+    :param: i_retry: the milliseconds a client waits before reconnecting.
+    :param: i_since: the version the stream starts after.
+    :return: the event.
+    '''
+    return f'retry: {i_retry}\nid: {i_since}\n\n'.encode()
+
+def _since() -> int:
+    s_since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    if s_since is None:
+        return None
+    i_since = int(s_since)
+    if i_since < 0:
+        raise ValueError()
+    return i_since
+
+def _limit() -> int:
+    i_limit = int(current_app.config.get('CHANGES_LIMIT', 500))
+    return max(1, min(request.args.get('limit', i_limit, type=int), i_limit))
+
+@bp.route("")
+@token_required
+def changes():
+    '''
+    This method gets invoked when the user asks for
+    the changes after the version in the since argument.
+    Without it only the latest version is returned,
+    to start from.
+    '''
+    try:
+        i_since = _since()
+    except ValueError:
+        return jsonify({"message": "invalid"}), 400
+    o_feed = current_app.config['DB']['changes']
+    if i_since is None:
+        return jsonify({"message": [], "last": o_feed.last()}), 200
+    ld_changes = o_feed.changes(i_since, _limit())
+    return jsonify({
+        "message": ld_changes,
+        "last": ld_changes[-1]['version'] if ld_changes else i_since
+    }), 200
+
+@bp.route("/stream")
+@token_required
+def stream():
+    '''
+    This method gets invoked when the user opens a
+    stream of the changes. It resumes after the
+    Last-Event-ID header or the since argument, or
+    starts from now without either.
+    '''
+    try:
+        i_since = _since()
+    except ValueError:
+        return jsonify({"message": "invalid"}), 400
+    if S_ASYNC_STREAM in request.environ:
+        request.environ[S_ASYNC_STREAM] = {'since': i_since}
+        return _event_stream(())
+
+    # The stream outlives the request, which must not keep its connection
+    current_app.config['DB']['session'].remove()
+    o_feed = current_app.config['DB']['changes']
+    f_heartbeat, f_seconds, i_retry = stream_settings()
+    i_limit = _limit()
+
+    def generate():
+        i_last = o_feed.last() if i_since is None else i_since
+        f_end = time.monotonic() + f_seconds
+        yield open_event(i_retry, i_last)
+        while time.monotonic() < f_end:
+            ld_changes = o_feed.changes(i_last, i_limit)
+            if ld_changes:
+                i_last = ld_changes[-1]['version']
+                yield encode_events(ld_changes)
+            elif not o_feed.wait(i_last, min(f_heartbeat, f_end - time.monotonic())):
+                yield b': keepalive\n\n'
+
+    return _event_stream(stream_with_context(generate()))
+
+def _event_stream(it_body):
+    o_response = current_app.response_class(it_body, mimetype='text/event-stream')
+    o_response.headers['Cache-Control'] = 'no-cache'
+    # Proxies such as nginx would otherwise hold the events back
+    o_response.headers['X-Accel-Buffering'] = 'no'
+    return o_response
@@ -0,0 +1,93 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for providing the user
+with the customer features.
+Last revised: 10/18/26
+'''
+
+import csv
+import io
+import json
+from flask import Blueprint, jsonify, request
+import server.DB.sxcustomer as customer
+from server.REST.auth import token_required
+from server.REST.responses import conditional
+from server.cache import typeahead_cached
+
+bp = Blueprint("customer", __name__, url_prefix='/customer')
+
+@bp.route("/import", methods=['POST'])
+@token_required
+def import_customers():
+    '''
+    This method gets invoked when the user uploads a
+    list of customers. The body is read as a stream of
+    either CSV with a name,address,phone,email header
+    (text/csv) or one JSON object per line
+    (application/x-ndjson).
+    '''
+    if request.mimetype == 'text/csv':
+        it_rows = _csv_rows(request.stream)
+    elif request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        it_rows = _ndjson_rows(request.stream)
+    else:
+        return jsonify({"message": "invalid"}), 400
+
+    return customer.import_customers(it_rows)
+
+def _csv_rows(o_stream):
+    '''
+    A generator for the rows of a CSV stream.
+    :param: o_stream: the binary stream.
+    '''
+    o_text = io.TextIOWrapper(o_stream, encoding='utf-8-sig', newline='')
+    for d_row in csv.DictReader(o_text):
+        yield {
+            s_key.strip().lower(): s_value
+            for s_key, s_value in d_row.items() if s_key is not None
+        }
+
+def _ndjson_rows(o_stream):
+    '''
+    A generator for the objects of a newline delimited JSON stream.
+    Lines that are not valid JSON are given as None.
+    :param: o_stream: the binary stream.
+    '''
+    for b_line in o_stream:
+        if not b_line.strip():
+            continue
+        try:
+            yield json.loads(b_line)
+        except ValueError:
+            yield None
+
+@bp.route("/search")
+@token_required
+@conditional('sxcustomer')
+@typeahead_cached('sxcustomer')
+def search():
+    '''
+    This method gets invoked when the user searches
+    for customers. The next page is asked for by sending
+    back the cursor of the previous response.
+    '''
+    return customer.search_customer(
+        request.args.get('q', ''),
+        request.args.get('limit', 10, type=int),
+        request.args.get('cursor')
+    )
+
+@bp.route("", methods=['PATCH'])
+@token_required
+def patch():
+    '''
+    This method gets invoked when the user changes
+    customers. The body maps the name of every customer
+    to its new email, address or phone, all of them
+    saved together or none.
+    '''
+    json_req = request.get_json(silent=True)
+    if not isinstance(json_req, dict) or not isinstance(json_req.get('changes'), dict):
+        return jsonify({"message": "invalid"}), 400
+    return customer.patch_customers(json_req['changes'])
@@ -0,0 +1,75 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for providing the user
+with downloads of the customers, the patients and
+the invoices as CSV or NDJSON.
+Last revised: 10/18/26
+'''
+
+import datetime
+from flask import Blueprint, jsonify, request
+import server.DB.export as export
+from server.REST.auth import token_required
+from server.REST.responses import stream_rows
+
+bp = Blueprint("export", __name__, url_prefix='/export')
+
+# The formats of the downloads
+AS_FORMATS = ('csv', 'ndjson')
+
+@bp.route("/customers")
+@token_required
+def customers():
+    '''
+    This method gets invoked when the user downloads
+    the customers, in the format they are imported in.
+    The optional format argument is csv or ndjson.
+    '''
+    s_format = request.args.get('format', 'csv')
+    if s_format not in AS_FORMATS:
+        return jsonify({"message": "invalid"}), 400
+    return stream_rows(*export.export_customers(), s_format, 'customers')
+
+@bp.route("/patients")
+@token_required
+def patients():
+    '''
+    This method gets invoked when the user downloads
+    the patients. The optional format argument is csv
+    or ndjson.
+    '''
+    s_format = request.args.get('format', 'csv')
+    if s_format not in AS_FORMATS:
+        return jsonify({"message": "invalid"}), 400
+    return stream_rows(*export.export_patients(), s_format, 'patients')
+
+@bp.route("/invoices")
+@token_required
+def invoices():
+    '''
+    This method gets invoked when the user downloads
+    the invoices, with a row per item. The optional
+    arguments are the start and end days (YYYY-MM-DD),
+    the id of a customer and the format, csv or ndjson.
+    '''
+    s_format = request.args.get('format', 'csv')
+    try:
+        d_start = _day(request.args.get('start'))
+        d_end = _day(request.args.get('end'))
+        i_customer_id = request.args.get('customer', type=int)
+        if 'customer' in request.args and i_customer_id is None:
+            raise ValueError()
+    except ValueError:
+        return jsonify({"message": "invalid"}), 400
+    if s_format not in AS_FORMATS or (d_start and d_end and d_start > d_end):
+        return jsonify({"message": "invalid"}), 400
+
+    return stream_rows(
+        *export.export_invoices(d_start, d_end, i_customer_id),
+        s_format,
+        'invoices'
+    )
+
+def _day(s_day: str) -> datetime.date:
+    return datetime.date.fromisoformat(s_day) if s_day else None
@@ -0,0 +1,114 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for providing the user
+with the invoice features.
+Last revised: 10/18/26
+'''
+
+import datetime
+from flask import Blueprint, current_app, jsonify, request
+import server.DB.sxcustomer as customer
+import server.DB.sxinvoice as invoice
+from server.REST.auth import token_required
+
+bp = Blueprint("invoice", __name__, url_prefix='/invoice')
+
+@bp.route("/create", methods=['POST'])
+@token_required
+def create():
+    '''
+    This method gets invoked when the user creates an
+    invoice. The body holds the customer, optionally a
+    patient of the customer, the date and due date
+    (ISO 8601), the status and the items, each one
+    having the name of a product and a count.
+    '''
+    json_req = request.get_json(silent=True)
+    if not isinstance(json_req, dict) or not isinstance(json_req.get('customer'), str) \
+            or not isinstance(json_req.get('items'), list) \
+            or not isinstance(json_req.get('patient') or '', str):
+        return jsonify({"message": "invalid"}), 400
+    try:
+        dt_date = _datetime(json_req.get('date'))
+        dt_due_date = _datetime(json_req.get('due_date'))
+        e_status = invoice.SXInvoiceStatus[json_req.get('status', 'FINISH')]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"message": "invalid"}), 400
+
+    return invoice.create_invoice(
+        json_req['customer'],
+        json_req.get('patient'),
+        json_req['items'],
+        dt_date,
+        dt_due_date,
+        e_status
+    )
+
+@bp.route("/status", methods=['POST'])
+@token_required
+def status():
+    '''
+    This method gets invoked when the user finalizes,
+    modifies or voids an invoice. The body holds the
+    id of the invoice and the new status.
+    '''
+    json_req = request.get_json(silent=True)
+    try:
+        i_invoice_id = json_req['invoice']
+        e_status = invoice.SXInvoiceStatus[json_req['status']]
+    except (KeyError, TypeError):
+        return jsonify({"message": "invalid"}), 400
+    if type(i_invoice_id) is not int:
+        return jsonify({"message": "invalid"}), 400
+    return invoice.update_invoice_status(i_invoice_id, e_status)
+
+@bp.route("/return", methods=['POST'])
+@token_required
+def invoice_return():
+    '''
+    This method gets invoked when the user records
+    the return of an invoice. The body holds the id
+    of the invoice, a description and whether the
+    warranty covers it.
+    '''
+    json_req = request.get_json(silent=True)
+    if not isinstance(json_req, dict) or type(json_req.get('invoice')) is not int \
+            or not isinstance(json_req.get('description', ''), str) \
+            or not isinstance(json_req.get('warranty', False), bool):
+        return jsonify({"message": "invalid"}), 400
+    return invoice.add_invoice_return(
+        json_req['invoice'],
+        json_req.get('description', ''),
+        json_req.get('warranty', False)
+    )
+
+@bp.route("/totals")
+@token_required
+def totals():
+    '''
+    This method gets invoked when the user asks for the
+    totals of a batch of invoices. The ids argument holds
+    the comma separated ids of at most INVOICE_TOTALS_MAX_IDS
+    invoices (100) and the customer argument the name of
+    a customer, either one or both narrowing the invoices.
+    '''
+    li_invoice_ids = None
+    if request.args.get('ids'):
+        try:
+            li_invoice_ids = [int(s_id) for s_id in request.args['ids'].split(',')]
+        except ValueError:
+            return jsonify({"message": "invalid"}), 400
+        if len(li_invoice_ids) > int(current_app.config.get('INVOICE_TOTALS_MAX_IDS', 100)):
+            return jsonify({"message": "too many"}), 400
+    i_customer_id = None
+    if request.args.get('customer'):
+        o_customer = customer.get_customer(request.args['customer'])
+        if o_customer is None:
+            return jsonify({"message": "invalid customer"}), 400
+        i_customer_id = o_customer.sx_customer_id
+
+    return invoice.get_invoice_totals(li_invoice_ids, i_customer_id)
+
+def _datetime(s_date: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(s_date) if s_date else None
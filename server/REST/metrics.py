@@ -0,0 +1,22 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for exposing the
+measurements of the server to Prometheus.
+Last revised: 10/18/26
+'''
+
+from flask import current_app, Blueprint, Response
+
+bp = Blueprint("metrics", __name__)
+
+@bp.route("/metrics")
+def metrics():
+    '''
+    This method gets invoked when the measurements
+    are scraped.
+    '''
+    return Response(
+        current_app.config['METRICS'].render(),
+        mimetype='text/plain; version=0.0.4'
+    )
@@ -0,0 +1,38 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for providing the user
+with the patient features.
+Last revised: 10/18/26
+'''
+
+from flask import Blueprint, jsonify, request
+import server.DB.sxcustomer as customer
+import server.DB.sxpatient as patient
+from server.REST.auth import token_required
+from server.REST.responses import conditional
+from server.cache import typeahead_cached
+
+bp = Blueprint("patient", __name__, url_prefix='/patient')
+
+@bp.route("/search")
+@token_required
+@conditional('sxcustomer', 'sxpatient')
+@typeahead_cached('sxcustomer', 'sxpatient')
+def search():
+    '''
+    This method gets invoked when the user searches
+    for the patients of a customer. The next page is
+    asked for by sending back the cursor of the previous
+    response.
+    '''
+    o_customer = customer.get_customer(request.args.get('customer', ''))
+    if o_customer is None:
+        return jsonify({"message": "invalid customer"}), 400
+
+    return patient.search_patient(
+        o_customer,
+        request.args.get('q', ''),
+        request.args.get('limit', 10, type=int),
+        request.args.get('cursor')
+    )
@@ -0,0 +1,64 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for providing the user
+with the product features.
+Last revised: 10/18/26
+'''
+
+from flask import Blueprint, jsonify, request
+import server.DB.sxproduct as product
+from server.REST.auth import token_required
+from server.REST.responses import conditional
+from server.cache import typeahead_cached
+
+bp = Blueprint("product", __name__, url_prefix='/product')
+
+@bp.route("/search")
+@token_required
+@conditional('sxproduct')
+@typeahead_cached('sxproduct')
+def search():
+    '''
+    This method gets invoked when the user searches
+    for products. The next page is asked for by sending
+    back the cursor of the previous response.
+    '''
+    return product.search_product(
+        request.args.get('q', ''),
+        request.args.get('limit', 10, type=int),
+        request.args.get('cursor')
+    )
+
+@bp.route("", methods=['PATCH'])
+@token_required
+def patch():
+    '''
+    This method gets invoked when the user changes
+    products. The body maps the name of every product
+    to its new name, normal_rate, ministery_rate or
+    description, all of them saved together or none.
+    '''
+    json_req = request.get_json(silent=True)
+    if not isinstance(json_req, dict) or not isinstance(json_req.get('changes'), dict):
+        return jsonify({"message": "invalid"}), 400
+    return product.patch_products(json_req['changes'])
+
+@bp.route("/reprice", methods=['POST'])
+@token_required
+def reprice():
+    '''
+    This method gets invoked when the user changes the
+    rates of the catalog by a percentage. The body holds
+    the percent, whether the ministery rates change too
+    and optionally the prefix of the product names.
+    '''
+    json_req = request.get_json(silent=True)
+    if not isinstance(json_req, dict) or not isinstance(json_req.get('ministery', False), bool) \
+            or not isinstance(json_req.get('prefix') or '', str):
+        return jsonify({"message": "invalid"}), 400
+    return product.reprice_products(
+        json_req.get('percent'),
+        json_req.get('ministery', False),
+        json_req.get('prefix')
+    )
@@ -0,0 +1,180 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for keeping the responses
+small on slow links. Responses derived from tables get
+an ETag made of the versions of the tables, so clients
+holding the latest copy get a 304 without the query
+running, and large responses are compressed. Exports
+are streamed as they are read.
+Last revised: 10/18/26
+'''
+
+import csv
+import datetime
+import enum
+import functools
+import gzip
+import hashlib
+import io
+import zlib
+from flask import Flask, current_app, request, stream_with_context
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# The mimetypes worth compressing
+AS_COMPRESSIBLE = ('application/json', 'application/x-ndjson', 'text/csv', 'text/plain', 'text/html')
+
+def conditional(*as_tables, fn_vary=None):
+    '''
+    A decorator for the GET routes whose responses only depend on the
+    arguments of the request and the content of the given tables. The
+    ETag of the response changes whenever one of the tables gets written.
+    :param: as_tables: the tables the responses are read from.
+    :param: fn_vary: a function returning anything else the responses
+    depend on, e.g. the current day.
+    '''
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            s_etag = hashlib.sha1(repr((
+                request.endpoint,
+                current_app.config['DB']['versions'].get(as_tables),
+                sorted(request.args.items(multi=True)),
+                fn_vary() if fn_vary is not None else None
+            )).encode()).hexdigest()
+
+            if request.if_none_match.contains_weak(s_etag):
+                o_response = current_app.response_class(status=304)
+            else:
+                o_response = current_app.make_response(fn(*args, **kwargs))
+                if o_response.status_code != 200:
+                    return o_response
+            # Weak as the compressed and plain bodies share the tag
+            o_response.set_etag(s_etag, weak=True)
+            o_response.headers['Cache-Control'] = 'private, no-cache'
+            return o_response
+        return wrapper
+    return decorator
+
+def setup_compression(o_app: Flask) -> None:
+    '''
+    A method for compressing the responses of the application with brotli
+    when it is installed and accepted or gzip otherwise. The following
+    keys are read from the config:
+    COMPRESS_MIN_SIZE: the size in bytes below which responses are sent
+    as they are (1024).
+    COMPRESS_LEVEL: the gzip compression level (6).
+    :param: o_app: the application.
+    '''
+    i_min_size = int(o_app.config.get('COMPRESS_MIN_SIZE', 1024))
+    i_level = int(o_app.config.get('COMPRESS_LEVEL', 6))
+    as_encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+    @o_app.after_request
+    def compress(o_response):
+        if o_response.direct_passthrough or o_response.is_streamed \
+                or o_response.status_code < 200 or o_response.status_code >= 300 \
+                or o_response.mimetype not in AS_COMPRESSIBLE \
+                or 'Content-Encoding' in o_response.headers:
+            return o_response
+        o_response.vary.add('Accept-Encoding')
+        if (o_response.content_length or 0) < i_min_size:
+            return o_response
+        s_encoding = request.accept_encodings.best_match(as_encodings)
+        if s_encoding is None:
+            return o_response
+
+        b_data = o_response.get_data()
+        if s_encoding == 'br':
+            o_response.set_data(brotli.compress(b_data, quality=5))
+        else:
+            o_response.set_data(gzip.compress(b_data, compresslevel=i_level, mtime=0))
+        o_response.headers['Content-Encoding'] = s_encoding
+        return o_response
+
+def _export_value(value):
+    if isinstance(value, enum.Enum):
+        return value.name
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+def _export_rows(lt_rows: list) -> list:
+    '''
+    A method for turning the enums and the dates of a chunk of rows into
+    text. Only the columns holding them are looked at.
+    :param: lt_rows: the rows.
+    :return: the rows ready to be written.
+    '''
+    if not lt_rows:
+        return lt_rows
+    li_columns = [
+        i for i in range(len(lt_rows[0]))
+        if isinstance(next((t[i] for t in lt_rows if t[i] is not None), None), (enum.Enum, datetime.date))
+    ]
+    if not li_columns:
+        return lt_rows
+    ll_rows = []
+    for t_row in lt_rows:
+        l_row = list(t_row)
+        for i in li_columns:
+            if l_row[i] is not None:
+                l_row[i] = _export_value(l_row[i])
+        ll_rows.append(l_row)
+    return ll_rows
+
+def stream_rows(as_keys: tuple, it_chunks, s_format: str, s_filename: str):
+    '''
+    A method for streaming rows as a download, encoding a chunk of rows
+    at a time. The download is gzipped as it is sent when the client
+    accepts it.
+    :param: as_keys: the keys of the columns.
+    :param: it_chunks: a generator of lists of rows.
+    :param: s_format: either csv, with a header of the keys, or ndjson.
+    :param: s_filename: the name of the file without its extension.
+    :return: the streamed response.
+    '''
+    def csv_chunks():
+        o_buffer = io.StringIO()
+        o_writer = csv.writer(o_buffer)
+        o_writer.writerow(as_keys)
+        for lt_rows in it_chunks:
+            o_writer.writerows(_export_rows(lt_rows))
+            yield o_buffer.getvalue().encode()
+            o_buffer.seek(0)
+            o_buffer.truncate()
+        yield o_buffer.getvalue().encode()
+
+    def ndjson_chunks():
+        fn_dumps = current_app.json.dumps
+        for lt_rows in it_chunks:
+            yield ''.join(
+                fn_dumps(dict(zip(as_keys, t_row))) + '\n' for t_row in _export_rows(lt_rows)
+            ).encode()
+
+    fn_chunks = csv_chunks if s_format == 'csv' else ndjson_chunks
+    b_gzip = request.accept_encodings.best_match(['gzip']) is not None
+
+    def generate():
+        if not b_gzip:
+            yield from fn_chunks()
+            return
+        o_compressor = zlib.compressobj(int(current_app.config.get('COMPRESS_LEVEL', 6)), zlib.DEFLATED, 31)
+        for b_chunk in fn_chunks():
+            b_data = o_compressor.compress(b_chunk)
+            if b_data:
+                yield b_data
+        yield o_compressor.flush()
+
+    o_response = current_app.response_class(
+        stream_with_context(generate()),
+        mimetype='text/csv' if s_format == 'csv' else 'application/x-ndjson'
+    )
+    o_response.headers['Content-Disposition'] = f'attachment; filename={s_filename}.{s_format}'
+    o_response.vary.add('Accept-Encoding')
+    if b_gzip:
+        o_response.headers['Content-Encoding'] = 'gzip'
+    return o_response
@@ -0,0 +1,46 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for providing the user
+with the sales analytics.
+Last revised: 10/18/26
+'''
+
+import datetime
+from flask import Blueprint, current_app, jsonify, request
+import server.DB.sxsales as sales
+from server.REST.auth import token_required
+from server.REST.responses import conditional
+
+bp = Blueprint("sales", __name__, url_prefix='/sales')
+
+@bp.route("/summary")
+@token_required
+@conditional('sxsalesday', fn_vary=datetime.date.today)
+def summary():
+    '''
+    This method gets invoked when the user asks for
+    the sales of today compared to yesterday.
+    '''
+    return sales.get_sales_summary()
+
+@bp.route("/range")
+@token_required
+@conditional('sxsalesday', 'sxsalesdaily')
+def sales_range():
+    '''
+    This method gets invoked when the user asks for
+    the sales between the start and end days (YYYY-MM-DD).
+    The optional group argument breaks the sales down
+    by customer or product. The range spans at most
+    SALES_RANGE_MAX_DAYS days (366).
+    '''
+    try:
+        d_start = datetime.date.fromisoformat(request.args['start'])
+        d_end = datetime.date.fromisoformat(request.args['end'])
+    except (KeyError, ValueError):
+        return jsonify({"message": "invalid"}), 400
+    if (d_end - d_start).days >= int(current_app.config.get('SALES_RANGE_MAX_DAYS', 366)):
+        return jsonify({"message": "range too long"}), 400
+
+    return sales.get_sales_range(d_start, d_end, request.args.get('group'))
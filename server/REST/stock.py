@@ -0,0 +1,40 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for providing the user
+with the stock of the products.
+Last revised: 10/18/26
+'''
+
+from flask import Blueprint, jsonify, request
+import server.DB.sxstock as stock
+from server.REST.auth import token_required
+from server.REST.responses import conditional
+
+bp = Blueprint("stock", __name__, url_prefix='/stock')
+
+@bp.route("/onhand")
+@token_required
+@conditional('sxstockonhand', 'sxproduct', 'sxproductaggregate')
+def onhand():
+    '''
+    This method gets invoked when the user asks for
+    the quantities on hand of the products, or of the
+    one in the optional product argument.
+    '''
+    return stock.get_stock(request.args.get('product'))
+
+@bp.route("/adjust", methods=['POST'])
+@token_required
+def adjust():
+    '''
+    This method gets invoked when the user receives
+    or counts a product. The body holds the name of
+    the product and the quantity, negative when it
+    goes out.
+    '''
+    json_req = request.get_json(silent=True)
+    if not isinstance(json_req, dict) or not isinstance(json_req.get('product'), str) \
+            or type(json_req.get('quantity')) is not int:
+        return jsonify({"message": "invalid"}), 400
+    return stock.adjust_stock(json_req['product'], json_req['quantity'])
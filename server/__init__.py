@@ -2,72 +2,110 @@
 Author: Kia Kalani
 Version: 1.00
 This module is responsible for assembling
-the project together.
-Last revised: 9/24/24
+the project together. Importing it has no side
+effects, the application is made by create_app,
+e.g. flask --app server run.
+Last revised: 10/18/26
 '''
 
+import atexit
+import os
+import time
 from flask import Flask
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
-import jwt
+import server.hashing as hashing
+import server.keyring as keyring
+import server.metrics as metrics
+from server.cache import SXLRUCache, create_typeahead_cache
+from server.serializer import SXJSONProvider
 
-
-
-app = Flask('server', static_folder='static')
-
-def setup_tokenization():
+def setup_tokenization(o_app: Flask):
     '''
     This method sets up the tokenization for the
     application to allow users authenticating to
-    the app.
+    the app. The signing keys are loaded from the
+    key directory the first time a token is made or
+    verified and are only generated the first time,
+    so all of the workers and restarts share them.
+    :param: o_app: the application.
     '''
+    o_app.config.setdefault('KEY_DIR', os.path.join(o_app.instance_path, 'keys'))
+    o_app.config.setdefault('TOKEN_ALGORITHM', 'RS256')
 
-    private_key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=2048
+    o_keyring = keyring.SXKeyRing(
+        o_app.config['KEY_DIR'],
+        o_app.config['TOKEN_ALGORITHM'],
+        b_lazy=True
     )
+    o_app.config['KEYRING'] = o_keyring
 
-    public_key = private_key.public_key()
+    # The lambda functions that perform the authentication. The tokens
+    # expire after TOKEN_LIFETIME seconds (a day)
+    i_lifetime = int(o_app.config.get('TOKEN_LIFETIME', 86400))
+    o_app.config['TOKEN_CREATE'] = lambda a: o_keyring.encode({
+        'sub': a,
+        'iat': int(time.time()),
+        'exp': int(time.time()) + i_lifetime
+    })
+    o_app.config["TOKEN_PARSE"] = lambda a: o_keyring.decode(a)
 
-    pem_private = private_key.private_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PrivateFormat.PKCS8,
-        encryption_algorithm=serialization.NoEncryption()
+    # Verified tokens along with their users
+    o_app.config['TOKEN_CACHE'] = SXLRUCache(
+        int(o_app.config.get('TOKEN_CACHE_SIZE', 10000)),
+        float(o_app.config.get('TOKEN_CACHE_TTL', 60))
     )
 
-    pem_public = public_key.public_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PublicFormat.SubjectPublicKeyInfo
-    )
-
-    # The lambda functions that perform the authentication
-    app.config['TOKEN_CREATE'] = lambda a: jwt.encode(
-        a,
-        pem_private,
-        algorithm="RS256"
-    )
-    app.config["TOKEN_PARSE"] = lambda a: jwt.decode(
-        a,
-        pem_public,
-        algorithms=["RS256"]
-    )
-
-def setup_app():
+def create_app(d_config: dict = None) -> Flask:
     '''
-    A method that performs all of the
-    necessary setups for the app to function.
+    A method that makes the application and performs all
+    of the necessary setups for it to function. Nothing
+    is written to the database or the disk, the schema is
+    created by flask db init and the signing keys when first used.
+    :param: d_config: the configuration, taking precedence over
+    the SX_ variables of the environment, e.g. SX_DATABASE_URL
+    sets DATABASE_URL.
+    :return: the application.
     '''
-    with app.app_context():
+    o_app = Flask('server', static_folder='static')
+    o_app.json = SXJSONProvider(o_app)
+    o_app.config.from_prefixed_env('SX')
+    o_app.config.update(d_config or {})
+
+    with o_app.app_context():
         import server.DB as DB
         DB.init()
         DB.teardown()
+        o_metrics = metrics.setup_metrics(o_app, o_app.config['DB']['engine'])
+        for o_engine in o_app.config['DB']['read_engines']:
+            metrics.instrument_engine(o_metrics, o_engine)
         import server.REST as REST
 
         REST.init()
-        setup_tokenization()
+        setup_tokenization(o_app)
+        o_app.config['TYPEAHEAD_CACHE'] = create_typeahead_cache(o_app.config)
+        o_app.config['PASSWORD_HASHER'] = hashing.create_password_hasher(o_app.config)
+        # Stopping the processes before the interpreter tears down their pipes
+        atexit.register(o_app.config['PASSWORD_HASHER'].shutdown)
+        if o_app.config.get('CREATE_SCHEMA'):
+            DB.create_schema()
 
-setup_app()
+    import server.DB.sxsales as sxsales
+    import server.DB.sxstock as sxstock
+    o_app.cli.add_command(DB.cli)
+    o_app.cli.add_command(keyring.cli)
+    o_app.cli.add_command(sxsales.cli)
+    o_app.cli.add_command(sxstock.cli)
+    return o_app
 
-if __name__ == "__main__":
-    app.run()
+def warm(o_app: Flask) -> None:
+    '''
+    A method for loading everything the first requests would, so that
+    workers forked afterwards start warm and share it with the parent.
+    No connection is opened since those can not be shared.
+    :param: o_app: the application.
+    '''
+    o_app.config['KEYRING'].load()
+    # Compiling the routing rules, otherwise done by the first request
+    o_app.url_map.update()
 
+if __name__ == "__main__":
+    create_app({'CREATE_SCHEMA': True}).run()
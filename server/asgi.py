@@ -0,0 +1,213 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is the ASGI entry point of the server,
+e.g. uvicorn server.asgi:application. Idle connections
+are held by the event loop, the read endpoints listed
+in ASYNC_ENDPOINTS run on the event loop with the async
+engine and every other endpoint runs in a thread the
+same way it does under the threaded server. The streams
+of changes are held by the event loop too, so an open
+stream costs a task rather than a thread.
+Last revised: 10/18/26
+'''
+
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgiInstance
+from flask import Flask, current_app
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+import server.DB.aio as aio
+from server import create_app
+from server.REST.changes import S_ASYNC_STREAM, encode_events, open_event, stream_settings
+
+# The endpoints served on the event loop. They must not block on anything
+# but the database, e.g. the password hasher. The table versions and the
+# key ring are refreshed in a thread before the dispatch, so the only
+# reads left on the event loop are the key ring reloaded for a token
+# signed by a key this worker has not seen yet and a refresh coming due
+# during the dispatch itself, both rare and short.
+AS_ASYNC_ENDPOINTS = (
+    'auth.checktoken',
+    'changes.stream',
+    'customer.search',
+    'patient.search',
+    'product.search',
+    'sales.summary',
+    'sales.sales_range'
+)
+
+def create_asgi_app(o_app: Flask):
+    '''
+    A method for wrapping the application into an ASGI application.
+    The following keys are read from the config:
+    ASYNC_ENDPOINTS: the endpoints served on the event loop.
+    WSGI_THREADS: the number of threads serving the other endpoints (32).
+    :param: o_app: the application.
+    :return: the ASGI application.
+    '''
+    with o_app.app_context():
+        aio.init()
+    set_endpoints = set(o_app.config.get('ASYNC_ENDPOINTS', AS_ASYNC_ENDPOINTS))
+    o_executor = ThreadPoolExecutor(
+        int(o_app.config.get('WSGI_THREADS', 32)),
+        thread_name_prefix='sx-wsgi'
+    )
+
+    class SXWsgiInstance(WsgiToAsgiInstance):
+        # asgiref runs every request on one shared thread by default
+        run_wsgi_app = sync_to_async(
+            WsgiToAsgiInstance.__dict__['run_wsgi_app'].func,
+            thread_sensitive=False,
+            executor=o_executor
+        )
+
+    async def application(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await _lifespan(o_app, o_executor, receive, send)
+        elif scope['type'] == 'http' and (s_endpoint := _endpoint(o_app, scope)) in set_endpoints:
+            await _serve_async(o_app, s_endpoint, scope, receive, send)
+        else:
+            await SXWsgiInstance(o_app)(scope, receive, send)
+    return application
+
+def _endpoint(o_app: Flask, scope: dict) -> str:
+    '''
+    A method for finding the endpoint a request is routed to.
+    :param: o_app: the application.
+    :param: scope: the scope of the request.
+    :return: the endpoint or None if the request does not match one.
+    '''
+    try:
+        s_endpoint, _ = o_app.url_map.bind('').match(scope['path'], scope['method'])
+    except (HTTPException, RequestRedirect):
+        return None
+    return s_endpoint
+
+async def _serve_async(o_app: Flask, s_endpoint: str, scope: dict, receive, send) -> None:
+    '''
+    A method for serving a request on the event loop.
+    :param: o_app: the application.
+    :param: s_endpoint: the endpoint of the request.
+    :param: scope: the scope of the request.
+    :param: receive: the ASGI receive callable.
+    :param: send: the ASGI send callable.
+    '''
+    ab_body = []
+    while True:
+        d_message = await receive()
+        ab_body.append(d_message.get('body', b''))
+        if not d_message.get('more_body'):
+            break
+    o_instance = WsgiToAsgiInstance(o_app)
+    o_instance.scope = scope
+    environ = o_instance.build_environ(scope, io.BytesIO(b''.join(ab_body)))
+    if s_endpoint == 'changes.stream':
+        environ[S_ASYNC_STREAM] = None
+
+    def dispatch():
+        with o_app.request_context(environ):
+            try:
+                o_response = o_app.full_dispatch_request()
+            except Exception as e:
+                o_response = o_app.handle_exception(e)
+            return o_response.status_code, o_response.headers.to_wsgi_list(), o_response.get_data()
+
+    with o_app.app_context():
+        await _refresh(o_app)
+        i_status, lt_headers, b_data = await aio.run_model(dispatch)
+    await send({
+        'type': 'http.response.start',
+        'status': i_status,
+        'headers': [(s_key.lower().encode('latin1'), s_value.encode('latin1')) for s_key, s_value in lt_headers]
+    })
+    if i_status != 200 or not environ.get(S_ASYNC_STREAM):
+        await send({'type': 'http.response.body', 'body': b_data})
+        return
+    with o_app.app_context():
+        await _stream_changes(environ[S_ASYNC_STREAM]['since'], receive, send)
+
+async def _refresh(o_app: Flask) -> None:
+    '''
+    A method for reading the table versions and the key ring in a thread
+    when they are due, so the dispatch finds them fresh rather than
+    reading the database and the key files on the event loop.
+    :param: o_app: the application.
+    '''
+    o_versions = o_app.config['DB']['versions']
+    if o_versions.stale:
+        await asyncio.to_thread(o_versions.reload)
+    o_keyring = o_app.config['KEYRING']
+    if o_keyring.stale:
+        await asyncio.to_thread(o_keyring.refresh)
+
+async def _stream_changes(i_since: int, receive, send) -> None:
+    '''
+    A method for sending the changes as they come until the client goes
+    away or the stream reaches its end (see server.REST.changes.stream).
+    It must be awaited within the app context.
+    :param: i_since: the version to resume after, None to start from now.
+    :param: receive: the ASGI receive callable.
+    :param: send: the ASGI send callable.
+    '''
+    o_feed = current_app.config['DB']['changes']
+    f_heartbeat, f_seconds, i_retry = stream_settings()
+    i_limit = int(current_app.config.get('CHANGES_LIMIT', 500))
+    if i_since is None:
+        # The first call reads the log
+        i_since = await asyncio.to_thread(o_feed.last)
+
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    o_disconnect = asyncio.ensure_future(disconnected())
+    f_end = time.monotonic() + f_seconds
+    try:
+        await send({'type': 'http.response.body', 'body': open_event(i_retry, i_since), 'more_body': True})
+        while not o_disconnect.done() and time.monotonic() < f_end:
+            if o_feed.covers(i_since):
+                ld_changes = o_feed.changes(i_since, i_limit)
+            else:
+                # Catching up reads the database
+                ld_changes = await asyncio.to_thread(o_feed.changes, i_since, i_limit)
+            if ld_changes:
+                i_since = ld_changes[-1]['version']
+                await send({'type': 'http.response.body', 'body': encode_events(ld_changes), 'more_body': True})
+                continue
+            o_wait = asyncio.ensure_future(
+                o_feed.wait_async(i_since, min(f_heartbeat, f_end - time.monotonic()))
+            )
+            await asyncio.wait((o_wait, o_disconnect), return_when=asyncio.FIRST_COMPLETED)
+            if not o_wait.done():
+                o_wait.cancel()
+            elif not o_wait.result():
+                await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+        if not o_disconnect.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        o_disconnect.cancel()
+
+async def _lifespan(o_app: Flask, o_executor: ThreadPoolExecutor, receive, send) -> None:
+    '''
+    A method for handling the startup and the shutdown of the server.
+    '''
+    while True:
+        d_message = await receive()
+        if d_message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif d_message['type'] == 'lifespan.shutdown':
+            with o_app.app_context():
+                await aio.dispose()
+            # The server ends by raising the signal that stopped it, which
+            # skips the exit handlers that would stop the hashing processes
+            await asyncio.to_thread(o_app.config['PASSWORD_HASHER'].shutdown, True)
+            o_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+application = create_asgi_app(create_app())
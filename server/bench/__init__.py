@@ -0,0 +1,7 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This package contains the benchmarks of the server.
+Run python -m server.bench --help for the options.
+Last revised: 10/18/26
+'''
@@ -0,0 +1,144 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module runs the benchmarks and writes their
+results as json, e.g.
+python -m server.bench --customers 100000 --output a.json
+python -m server.bench --reuse --compare a.json
+Last revised: 10/18/26
+'''
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+def parse_args(as_args=None) -> argparse.Namespace:
+    o_parser = argparse.ArgumentParser(prog='python -m server.bench', description='Benchmarks of the server.')
+    o_parser.add_argument('--database', default=os.path.join(tempfile.gettempdir(), 'sx_bench.db'),
+                          help='the SQLite file the data is generated in')
+    o_parser.add_argument('--reuse', action='store_true',
+                          help='use the data already in the database instead of generating it')
+    o_parser.add_argument('--customers', type=int, default=10000)
+    o_parser.add_argument('--patients-per-customer', type=int, default=2)
+    o_parser.add_argument('--products', type=int, default=1000)
+    o_parser.add_argument('--invoices', type=int, default=10000)
+    o_parser.add_argument('--seed', type=int, default=1)
+    o_parser.add_argument('--suites', default='micro,client,http',
+                          help='a comma separated list out of micro, client and http')
+    o_parser.add_argument('--iterations', type=int, default=200,
+                          help='the calls per micro benchmark')
+    o_parser.add_argument('--requests', type=int, default=2000,
+                          help='the requests per load run')
+    o_parser.add_argument('--threads', type=int, default=8,
+                          help='the concurrent clients of the load runs')
+    o_parser.add_argument('--url', help='drive a running server instead of starting one')
+    o_parser.add_argument('--output', default='-', help='the json file of the results')
+    o_parser.add_argument('--compare', help='the json results of a previous run to compare with')
+    return o_parser.parse_args(as_args)
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(d_old: dict, d_new: dict) -> list[str]:
+    '''
+    A method for comparing the results of two runs.
+    :param: d_old: the previous results.
+    :param: d_new: the current results.
+    :return: a line per benchmark present in both, with the change of
+    its median latency and throughput.
+    '''
+    def index(d_results):
+        return {
+            (s_suite, d['name']): d
+            for s_suite in ('micro', 'client', 'http')
+            for d in d_results.get(s_suite, [])
+        }
+    d_before = index(d_old)
+    as_lines = []
+    for t_key, d_after in index(d_new).items():
+        d_prev = d_before.get(t_key)
+        if d_prev is None or not d_prev.get('p50_ms') or not d_prev.get('ops_per_second'):
+            continue
+        as_lines.append('{:<8} {:<40} p50 {:>9.3f} -> {:>9.3f} ms ({:+.1f}%)  ops/s {:+.1f}%'.format(
+            t_key[0], t_key[1], d_prev['p50_ms'], d_after['p50_ms'],
+            (d_after['p50_ms'] / d_prev['p50_ms'] - 1) * 100,
+            ((d_after['ops_per_second'] or 0) / d_prev['ops_per_second'] - 1) * 100
+        ))
+    return as_lines
+
+def main(as_args=None) -> int:
+    o_args = parse_args(as_args)
+    as_suites = [s.strip() for s in o_args.suites.split(',') if s.strip()]
+    if not o_args.reuse and os.path.exists(o_args.database):
+        for s_suffix in ('', '-wal', '-shm'):
+            if os.path.exists(o_args.database + s_suffix):
+                os.remove(o_args.database + s_suffix)
+
+    from server import create_app
+    from server.bench import datagen, load, micro
+    app = create_app({
+        'DATABASE_URL': 'sqlite:///' + os.path.abspath(o_args.database),
+        'KEY_DIR': os.environ.get('SX_KEY_DIR', os.path.join(tempfile.gettempdir(), 'sx_bench_keys')),
+        'CREATE_SCHEMA': True
+    })
+
+    d_results = {
+        'meta': {
+            'commit': _commit(),
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': o_args.database,
+            'args': vars(o_args)
+        }
+    }
+    with app.app_context():
+        if not o_args.reuse:
+            d_results['datagen'] = datagen.generate(
+                o_args.customers,
+                o_args.patients_per_customer,
+                o_args.products,
+                o_args.invoices,
+                o_args.seed
+            )
+            app.config['DB']['session'].remove()
+        if 'micro' in as_suites:
+            d_results['micro'] = micro.run(o_args.iterations, o_args.seed)
+        else:
+            micro.bench_user()
+        app.config['DB']['session'].remove()
+
+    if 'client' in as_suites or 'http' in as_suites:
+        lt_requests = load.request_mix(app, o_args.requests, o_args.seed)
+        if 'client' in as_suites:
+            d_results['client'] = load.run_client(app, lt_requests, o_args.threads)
+        if 'http' in as_suites:
+            d_results['http'] = load.run_http(lt_requests, o_args.threads, o_args.url, app)
+
+    s_json = json.dumps(d_results, indent=2)
+    if o_args.output == '-':
+        print(s_json)
+    else:
+        with open(o_args.output, 'w') as o_file:
+            o_file.write(s_json + '\n')
+
+    if o_args.compare:
+        with open(o_args.compare) as o_file:
+            for s_line in compare(json.load(o_file), d_results):
+                print(s_line, file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module generates synthetic data for the
+benchmarks. The same seed always produces the same
+data so runs of different commits are comparable.
+Last revised: 10/18/26
+'''
+
+import datetime
+import random
+import time
+from flask import current_app
+from sqlalchemy import func, select
+
+# The rows inserted per statement
+I_CHUNK = 5000
+
+# The words the names and addresses are made of
+AS_FIRST = ['Anna', 'Ben', 'Carla', 'Dario', 'Elena', 'Farid', 'Gina', 'Hugo', 'Iris', 'Jamal',
+            'Kira', 'Liam', 'Mona', 'Nils', 'Olga', 'Pavel', 'Rosa', 'Sami', 'Tara', 'Umar']
+AS_LAST = ['Adler', 'Brooks', 'Castillo', 'Dubois', 'Evans', 'Fischer', 'Garcia', 'Hansen',
+           'Ivanova', 'Jensen', 'Kowalski', 'Laurent', 'Moreau', 'Novak', 'Okafor', 'Petrov']
+AS_STREETS = ['Main St', 'Oak Ave', 'King Rd', 'Lake Dr', 'Hill St', 'Park Blvd', 'Elm Way']
+AS_PRODUCTS = ['Frame', 'Lens', 'Hinge', 'Screw', 'Pad', 'Temple', 'Bridge', 'Coating', 'Case',
+               'Cloth', 'Filter', 'Tint', 'Clip', 'Cord', 'Spray']
+
+def generate(i_customers: int = 10000, i_patients_per_customer: int = 2, i_products: int = 1000,
+             i_invoices: int = 10000, i_seed: int = 1) -> dict:
+    '''
+    A method for filling the database with synthetic data. It must run
+    within the app context on an empty database.
+    :param: i_customers: the number of customers.
+    :param: i_patients_per_customer: the number of patients of every customer.
+    :param: i_products: the number of products. A tenth of them are
+    assemblies made of 2 to 4 products with a lower id.
+    :param: i_invoices: the number of invoices, each with 1 to 5 items.
+    :param: i_seed: the seed of the random generator.
+    :return: the number of rows and the seconds it took per table.
+    '''
+    import server.DB.sxcustomer as sxcustomer
+    from server.DB.sxpatient import SXPatient
+    from server.DB.sxproduct import SXProduct, SXProductAggregate
+    from server.DB.sxinvoice import SXInvoice, SXInvoiceItem, SXInvoiceStatus
+    import server.DB.sxsales as sxsales
+    import server.DB.sxstock as sxstock
+
+    o_random = random.Random(i_seed)
+    o_session = current_app.config['DB']['session']
+    d_stats = {}
+
+    def timed(s_name: str, fn) -> None:
+        f_start = time.perf_counter()
+        i_rows = fn()
+        o_session.commit()
+        d_stats[s_name] = {'rows': i_rows, 'seconds': round(time.perf_counter() - f_start, 3)}
+
+    def insert(o_table, it_rows) -> int:
+        i_rows = 0
+        ld_chunk = []
+        for d_row in it_rows:
+            ld_chunk.append(d_row)
+            if len(ld_chunk) >= I_CHUNK:
+                o_session.execute(o_table.insert(), ld_chunk)
+                i_rows += len(ld_chunk)
+                ld_chunk = []
+        if ld_chunk:
+            o_session.execute(o_table.insert(), ld_chunk)
+            i_rows += len(ld_chunk)
+        return i_rows
+
+    def customers():
+        o_response, _ = sxcustomer.import_customers({
+            'name': f'{o_random.choice(AS_FIRST)} {o_random.choice(AS_LAST)} {i}',
+            'address': f'{o_random.randint(1, 9999)} {o_random.choice(AS_STREETS)}',
+            'phone': '+1{:010d}'.format(o_random.randint(0, 10 ** 10 - 1)),
+            'email': f'user{i}@example.com'
+        } for i in range(i_customers))
+        return o_response.get_json()['message']['inserted']
+    timed('customers', customers)
+    li_customers = list(o_session.execute(
+        select(sxcustomer.SXCustomer.sx_customer_id)
+    ).scalars())
+
+    def patients():
+        def rows():
+            for i_customer in li_customers:
+                for i in range(i_patients_per_customer):
+                    s_name = f'{o_random.choice(AS_FIRST)} {o_random.choice(AS_LAST)} {i}'
+                    yield {
+                        'sx_doctor_id': i_customer,
+                        'sx_patient_name': s_name.upper(),
+                        'sx_patient_display_name': s_name
+                    }
+        return insert(SXPatient.__table__, rows())
+    timed('patients', patients)
+
+    def products():
+        def rows():
+            for i in range(i_products):
+                s_name = f'{o_random.choice(AS_PRODUCTS)} {i:06d}'
+                f_rate = round(o_random.uniform(1, 500), 2)
+                yield {
+                    'sx_product_name': s_name.upper(),
+                    'sx_product_display_name': s_name,
+                    'sx_normal_rate': f_rate,
+                    'sx_ministery_rate': round(f_rate * 0.8, 2),
+                    'sx_product_description': f'Synthetic product {i}'
+                }
+        return insert(SXProduct.__table__, rows())
+    timed('products', products)
+    li_products = list(o_session.execute(select(SXProduct.sx_product_id)).scalars())
+
+    def aggregates():
+        def rows():
+            # Components always have a lower id so the aggregates never cycle
+            for i_index in range(max(len(li_products) * 9 // 10, 4), len(li_products)):
+                for i_component in o_random.sample(li_products[:i_index], o_random.randint(2, 4)):
+                    yield {
+                        'sx_product_id': li_products[i_index],
+                        'sx_agg_product_id': i_component,
+                        'sx_count_aggregate': o_random.randint(1, 3)
+                    }
+        return insert(SXProductAggregate.__table__, rows())
+    timed('aggregates', aggregates)
+
+    def invoices():
+        d_patients = {}
+        for i_patient, i_customer in o_session.execute(
+            select(SXPatient.sx_patient_id, SXPatient.sx_doctor_id)
+        ):
+            d_patients.setdefault(i_customer, []).append(i_patient)
+        i_first = (o_session.execute(select(func.max(SXInvoice.sx_invoice_id))).scalar() or 0) + 1
+        dt_now = datetime.datetime.now().replace(microsecond=0)
+        ld_invoices = []
+        ld_items = []
+        for i_invoice in range(i_first, i_first + i_invoices):
+            i_customer = o_random.choice(li_customers)
+            dt_date = dt_now - datetime.timedelta(minutes=o_random.randint(0, 365 * 24 * 60))
+            ld_invoices.append({
+                'sx_invoice_id': i_invoice,
+                'sx_customer_id': i_customer,
+                'sx_patient_id': o_random.choice(d_patients.get(i_customer) or [None]),
+                'sx_date': dt_date,
+                'sx_due_date': dt_date + datetime.timedelta(days=30),
+                'sx_invoice_status': o_random.choices(
+                    list(SXInvoiceStatus), weights=[80, 5, 10, 5]
+                )[0]
+            })
+            for i_product in o_random.sample(li_products, min(o_random.randint(1, 5), len(li_products))):
+                ld_items.append({
+                    'sx_invoice_id': i_invoice,
+                    'sx_product_id': i_product,
+                    'sx_invoice_item_count': o_random.randint(1, 10)
+                })
+        insert(SXInvoice.__table__, ld_invoices)
+        insert(SXInvoiceItem.__table__, ld_items)
+        return len(ld_invoices)
+    timed('invoices', invoices)
+
+    f_start = time.perf_counter()
+    sxsales.rebuild_sales()
+    d_stats['sales'] = {'rows': None, 'seconds': round(time.perf_counter() - f_start, 3)}
+
+    def stock():
+        # The products that are not assemblies are received once, through
+        # the ledger so that it agrees with the quantities on hand
+        dt_now = datetime.datetime.now()
+        ld_levels = [{
+            'sx_product_id': i_product,
+            'sx_quantity': o_random.randint(0, 500)
+        } for i_product in li_products[:max(len(li_products) * 9 // 10, 4)]]
+        insert(sxstock.SXStockMovement.__table__, ({
+            **d_level,
+            'sx_reason': sxstock.S_REASON_ADJUST,
+            'sx_invoice_id': None,
+            'sx_date': dt_now
+        } for d_level in ld_levels))
+        return insert(sxstock.SXStockOnHand.__table__, ld_levels)
+    timed('stock', stock)
+
+    # What the invoices take from the stock from now on
+    f_start = time.perf_counter()
+    i_postings = sxstock.fill_postings()
+    d_stats['postings'] = {'rows': i_postings, 'seconds': round(time.perf_counter() - f_start, 3)}
+    return d_stats
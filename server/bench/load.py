@@ -0,0 +1,212 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module drives http load against the server,
+either through the test client of Flask or over real
+connections to a local or remote server.
+Last revised: 10/18/26
+'''
+
+import http.client
+import json
+import logging
+import random
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from flask import Flask
+from werkzeug.serving import make_server
+from server.bench.micro import S_BENCH_PASSWORD, summarize
+
+def request_mix(o_app: Flask, i_requests: int, i_seed: int = 1) -> list[tuple]:
+    '''
+    A method for making the requests of a run, the way the screens of
+    the client would send them.
+    :param: o_app: the application holding the data.
+    :param: i_requests: the number of requests.
+    :param: i_seed: the seed of the random generator.
+    :return: a list of (name, method, path, body).
+    '''
+    from sqlalchemy import func, select
+    import server.DB.sxcustomer as sxcustomer
+    import server.DB.sxproduct as sxproduct
+
+    o_random = random.Random(i_seed)
+    with o_app.app_context():
+        o_session = o_app.config['DB']['session']
+        as_customers = list(o_session.execute(
+            select(sxcustomer.SXCustomer.sx_customer_display_name).order_by(func.random()).limit(200)
+        ).scalars())
+        as_products = list(o_session.execute(
+            select(sxproduct.SXProduct.sx_product_display_name).order_by(func.random()).limit(200)
+        ).scalars())
+
+    def quote(s_value: str) -> str:
+        return urllib.parse.quote(s_value)
+
+    # The requests along with their share of the traffic
+    lt_kinds = [
+        (40, lambda: ('customer.search', 'GET', '/customer/search?q={}'.format(
+            quote(o_random.choice(as_customers)[:o_random.randint(1, 5)])
+        ), None)),
+        (20, lambda: ('patient.search', 'GET', '/patient/search?customer={}&q='.format(
+            quote(o_random.choice(as_customers))
+        ), None)),
+        (20, lambda: ('product.search', 'GET', '/product/search?q={}'.format(
+            quote(o_random.choice(as_products)[:o_random.randint(1, 4)])
+        ), None)),
+        (10, lambda: ('sales.summary', 'GET', '/sales/summary', None)),
+        (10, lambda: ('auth.checktoken', 'GET', '/auth/checktoken', None)),
+    ]
+    ai_weights = [t[0] for t in lt_kinds]
+    return [
+        o_random.choices(lt_kinds, weights=ai_weights)[0][1]() for _ in range(i_requests)
+    ]
+
+def _drive(lt_requests: list[tuple], i_threads: int, fn_send) -> list[dict]:
+    '''
+    A method for sending the requests from many threads.
+    :param: lt_requests: the requests.
+    :param: i_threads: the number of threads.
+    :param: fn_send: a function making the sender of a thread. The sender
+    takes the method, the path and the body and returns the status.
+    :return: the results per kind of request and for all of them.
+    '''
+    d_latencies = {}
+    o_statuses = Counter()
+    o_lock = threading.Lock()
+    o_next = iter(lt_requests)
+
+    def worker():
+        fn_request = fn_send()
+        while True:
+            with o_lock:
+                t_request = next(o_next, None)
+            if t_request is None:
+                return
+            s_name, s_method, s_path, d_body = t_request
+            f_start = time.perf_counter()
+            i_status = fn_request(s_method, s_path, d_body)
+            f_seconds = time.perf_counter() - f_start
+            with o_lock:
+                d_latencies.setdefault(s_name, []).append(f_seconds)
+                o_statuses[i_status] += 1
+
+    f_start = time.perf_counter()
+    ao_threads = [threading.Thread(target=worker) for _ in range(i_threads)]
+    for o_thread in ao_threads:
+        o_thread.start()
+    for o_thread in ao_threads:
+        o_thread.join()
+    f_wall = time.perf_counter() - f_start
+
+    d_all = summarize('all', [f for af in d_latencies.values() for f in af], f_wall)
+    d_all['statuses'] = {str(i): i_count for i, i_count in sorted(o_statuses.items())}
+    return [d_all] + [
+        summarize(s_name, af_seconds) for s_name, af_seconds in sorted(d_latencies.items())
+    ]
+
+def run_client(o_app: Flask, lt_requests: list[tuple], i_threads: int = 8) -> list[dict]:
+    '''
+    A method for driving the application through the test client of
+    Flask, which measures the application without any networking.
+    :param: o_app: the application.
+    :param: lt_requests: the requests made by request_mix.
+    :param: i_threads: the number of threads.
+    :return: the results.
+    '''
+    s_token = _sign_in(o_app.test_client().post)
+
+    def sender():
+        o_client = o_app.test_client()
+
+        def send(s_method, s_path, d_body):
+            return o_client.open(
+                s_path, method=s_method, json=d_body, headers={'Auth-Token': s_token}
+            ).status_code
+        return send
+    return _drive(lt_requests, i_threads, sender)
+
+def run_http(lt_requests: list[tuple], i_threads: int = 8, s_url: str = None, o_app: Flask = None) -> list[dict]:
+    '''
+    A method for driving a server over http. A local threaded server is
+    started for the application when no url is given.
+    :param: lt_requests: the requests made by request_mix.
+    :param: i_threads: the number of threads, each keeping its connection.
+    :param: s_url: the url of a running server, e.g. http://127.0.0.1:8000.
+    :param: o_app: the application served when no url is given.
+    :return: the results.
+    '''
+    o_server = None
+    if s_url is None:
+        # The log line of every request would slow the server down
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        o_server = make_server('127.0.0.1', 0, o_app, threaded=True)
+        # Keeping the connections open between requests
+        o_server.RequestHandlerClass.protocol_version = 'HTTP/1.1'
+        threading.Thread(target=o_server.serve_forever, daemon=True).start()
+        s_url = f'http://127.0.0.1:{o_server.server_port}'
+    o_url = urllib.parse.urlsplit(s_url)
+
+    def connection():
+        return http.client.HTTPConnection(o_url.hostname, o_url.port or 80, timeout=30)
+
+    def post(s_path, json=None):
+        o_conn = connection()
+        o_conn.request('POST', s_path, body=_dumps(json), headers={'Content-Type': 'application/json'})
+        o_response = o_conn.getresponse()
+        o_result = _JsonResponse(o_response.read())
+        o_conn.close()
+        return o_result
+
+    try:
+        s_token = _sign_in(post)
+
+        def sender():
+            o_state = {'conn': connection()}
+
+            def send(s_method, s_path, d_body):
+                d_headers = {'Auth-Token': s_token}
+                if d_body is not None:
+                    d_headers['Content-Type'] = 'application/json'
+                for i_attempt in range(2):
+                    try:
+                        o_state['conn'].request(s_method, s_path, body=_dumps(d_body), headers=d_headers)
+                        o_response = o_state['conn'].getresponse()
+                        o_response.read()
+                        return o_response.status
+                    except (http.client.HTTPException, OSError):
+                        # The server closed the connection, opening another one
+                        o_state['conn'].close()
+                        o_state['conn'] = connection()
+                return 0
+            return send
+        return _drive(lt_requests, i_threads, sender)
+    finally:
+        if o_server is not None:
+            o_server.shutdown()
+
+class _JsonResponse:
+    '''
+    The part of a response of the test client that _sign_in uses.
+    '''
+
+    def __init__(self, b_data: bytes) -> None:
+        self.json = json.loads(b_data) if b_data else None
+
+def _dumps(d_body) -> bytes:
+    return None if d_body is None else json.dumps(d_body).encode()
+
+def _sign_in(fn_post) -> str:
+    '''
+    A method for getting a token of the benchmark user.
+    :param: fn_post: a function posting json to a path.
+    :return: the token.
+    '''
+    d_credentials = {'username': 'bench', 'password': S_BENCH_PASSWORD}
+    fn_post('/auth/signup', json={**d_credentials, 'repeat_password': S_BENCH_PASSWORD})
+    d_response = fn_post('/auth/signin', json=d_credentials).json
+    if not d_response or 'message' not in d_response or d_response['message'] in ('invalid', 'busy'):
+        raise RuntimeError('could not sign in as the benchmark user')
+    return d_response['message']
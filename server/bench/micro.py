@@ -0,0 +1,157 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module contains the micro benchmarks of the
+model functions. Every call runs the way a request
+would, with a fresh session.
+Last revised: 10/18/26
+'''
+
+import random
+import time
+from flask import current_app
+
+# The password of the user the benchmarks sign in as
+S_BENCH_PASSWORD = 'bench123!'
+
+def measure(s_name: str, fn, i_iterations: int) -> dict:
+    '''
+    A method for timing a function.
+    :param: s_name: the name of the benchmark.
+    :param: fn: the function, called with the index of the iteration.
+    :param: i_iterations: the number of calls.
+    :return: the throughput and the latency percentiles.
+    '''
+    o_session = current_app.config['DB']['session']
+    # A call that is not measured, for the caches of SQLite and Python
+    fn(0)
+    o_session.remove()
+
+    af_seconds = []
+    for i in range(i_iterations):
+        f_start = time.perf_counter()
+        fn(i)
+        o_session.remove()
+        af_seconds.append(time.perf_counter() - f_start)
+    return summarize(s_name, af_seconds)
+
+def summarize(s_name: str, af_seconds: list[float], f_wall: float = None) -> dict:
+    '''
+    A method for summarizing latencies.
+    :param: s_name: the name of the benchmark.
+    :param: af_seconds: the latency of every call.
+    :param: f_wall: the wall time of the calls when they ran concurrently.
+    :return: the throughput and the latency percentiles in milliseconds.
+    '''
+    af_sorted = sorted(af_seconds)
+    f_wall = sum(af_seconds) if f_wall is None else f_wall
+
+    def percentile(f_rank: float) -> float:
+        if not af_sorted:
+            return None
+        return round(af_sorted[min(int(len(af_sorted) * f_rank), len(af_sorted) - 1)] * 1000, 3)
+
+    return {
+        'name': s_name,
+        'iterations': len(af_seconds),
+        'seconds': round(f_wall, 4),
+        'ops_per_second': round(len(af_seconds) / f_wall, 1) if f_wall else None,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'max_ms': percentile(1.0)
+    }
+
+def bench_user() -> str:
+    '''
+    A method for making sure the benchmark user exists.
+    :return: the username.
+    '''
+    import server.DB.sxuser as sxuser
+    sxuser.register_sx_user('bench', S_BENCH_PASSWORD, sxuser.SXUserType.CLIENT)
+    return 'bench'
+
+def run(i_iterations: int = 200, i_seed: int = 1) -> list[dict]:
+    '''
+    A method for running every micro benchmark. It must run within the
+    app context on a database filled by server.bench.datagen.
+    :param: i_iterations: the number of calls of the fast benchmarks.
+    The slow ones, e.g. hashing a password, run a tenth as many times.
+    :param: i_seed: the seed of the random generator.
+    :return: the results of the benchmarks.
+    '''
+    import server.DB.sxcustomer as sxcustomer
+    import server.DB.sxpatient as sxpatient
+    import server.DB.sxproduct as sxproduct
+    import server.DB.sxuser as sxuser
+    from sqlalchemy import func, select
+
+    o_random = random.Random(i_seed)
+    o_session = current_app.config['DB']['session']
+    i_slow = max(i_iterations // 10, 1)
+
+    # What the benchmarks look for, drawn from the data
+    as_customers = list(o_session.execute(
+        select(sxcustomer.SXCustomer.sx_customer_name).order_by(func.random()).limit(100)
+    ).scalars())
+    as_products = list(o_session.execute(
+        select(sxproduct.SXProduct.sx_product_name).order_by(func.random()).limit(100)
+    ).scalars())
+    as_assemblies = list(o_session.execute(
+        select(sxproduct.SXProduct.sx_product_name).where(
+            sxproduct.SXProduct.sx_product_id.in_(
+                select(sxproduct.SXProductAggregate.sx_product_id)
+            )
+        ).limit(100)
+    ).scalars()) or as_products
+    o_session.remove()
+    if not as_customers or not as_products:
+        raise ValueError('the database has no data, run the generator first')
+
+    def prefix(s_value: str, i_min: int = 1, i_max: int = 4) -> str:
+        return s_value[:o_random.randint(i_min, i_max)]
+
+    s_user = bench_user()
+    s_token = current_app.config['TOKEN_CREATE'](s_user)
+    o_session.remove()
+
+    ld_results = [
+        measure('search_customer.short_prefix', lambda i: sxcustomer.search_customer(
+            prefix(o_random.choice(as_customers), 1, 2)
+        ), i_iterations),
+        measure('search_customer.ranked', lambda i: sxcustomer.search_customer(
+            prefix(o_random.choice(as_customers), 3, 6)
+        ), i_iterations),
+        measure('search_customer.page_100', lambda i: sxcustomer.search_customer(
+            prefix(o_random.choice(as_customers), 1, 1), 100
+        ), i_iterations),
+        measure('search_patient', lambda i: sxpatient.search_patient(
+            sxcustomer.get_customer(o_random.choice(as_customers)), prefix('ABCDEFGHIJKLMNOP', 0, 1)
+        ), i_iterations),
+        measure('search_product', lambda i: sxproduct.search_product(
+            prefix(o_random.choice(as_products))
+        ), i_iterations),
+        measure('get_product', lambda i: sxproduct.get_product(
+            o_random.choice(as_products)
+        ), i_iterations),
+        measure('get_product_and_aggregates.cached', lambda i: sxproduct.get_product_and_aggregates(
+            o_random.choice(as_assemblies)
+        ), i_iterations),
+    ]
+
+    def bom_cold(i):
+        sxproduct._bom_cache().clear()
+        sxproduct.get_product_and_aggregates(o_random.choice(as_assemblies))
+    ld_results.append(measure('get_product_and_aggregates.cold', bom_cold, i_iterations))
+
+    ld_results.append(measure('get_sx_user.cached', lambda i: sxuser.get_sx_user(s_token), i_iterations))
+
+    def token_cold(i):
+        current_app.config['TOKEN_CACHE'].clear()
+        sxuser.get_sx_user(s_token)
+    ld_results.append(measure('get_sx_user.cold', token_cold, i_iterations))
+
+    ld_results.append(measure('login_sx_user', lambda i: sxuser.login_sx_user(
+        s_user, S_BENCH_PASSWORD
+    ), i_slow))
+    return ld_results
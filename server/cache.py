@@ -0,0 +1,325 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module contains the in-process caches shared
+by the different parts of the server.
+Last revised: 10/18/26
+'''
+
+import functools
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, request
+
+class SXLRUCache:
+    '''
+    A thread safe cache bounded by the number of items it holds and
+    optionally by their size. The least recently used items are evicted
+    first and every item expires after its time to live.
+    '''
+
+    def __init__(self, i_max_items: int = 1024, f_ttl: float = None,
+                 i_max_bytes: int = None, fn_size=None) -> None:
+        '''
+        The constructor.
+        :param: i_max_items: the maximum number of items kept in the cache.
+        :param: f_ttl: the default number of seconds an item lives for. None
+        means the items never expire.
+        :param: i_max_bytes: the maximum total size of the items. None means
+        the size is not bounded.
+        :param: fn_size: a function giving the size of a value in bytes,
+        required when i_max_bytes is given.
+        '''
+        self.i_max_items = i_max_items
+        self.f_ttl = f_ttl
+        self.i_max_bytes = i_max_bytes
+        self.fn_size = fn_size
+        self._i_bytes = 0
+        self._o_lock = threading.Lock()
+        self._d_items = OrderedDict()
+
+    def get(self, key, default=None):
+        '''
+        A method for getting an item from the cache.
+        :param: key: the key of the item.
+        :param: default: the value returned when the item is missing.
+        :return: the cached value or default.
+        '''
+        with self._o_lock:
+            t_item = self._d_items.get(key)
+            if t_item is None:
+                return default
+            f_expiry, value = t_item
+            if f_expiry is not None and f_expiry <= time.monotonic():
+                self._remove(key)
+                return default
+            self._d_items.move_to_end(key)
+            return value
+
+    def set(self, key, value, f_ttl: float = None) -> None:
+        '''
+        A method for adding an item to the cache.
+        :param: key: the key of the item.
+        :param: value: the value to be cached.
+        :param: f_ttl: the number of seconds the item lives for. Defaults to
+        the ttl of the cache.
+        '''
+        f_ttl = self.f_ttl if f_ttl is None else f_ttl
+        f_expiry = None if f_ttl is None else time.monotonic() + f_ttl
+        i_size = self.fn_size(value) if self.i_max_bytes is not None else 0
+        if self.i_max_bytes is not None and i_size > self.i_max_bytes:
+            return
+        with self._o_lock:
+            self._remove(key)
+            self._d_items[key] = (f_expiry, value)
+            self._i_bytes += i_size
+            while len(self._d_items) > self.i_max_items or (
+                self.i_max_bytes is not None and self._i_bytes > self.i_max_bytes
+            ):
+                self._remove(next(iter(self._d_items)))
+
+    def delete(self, key) -> None:
+        '''
+        A method for removing an item from the cache.
+        :param: key: the key of the item.
+        '''
+        with self._o_lock:
+            self._remove(key)
+
+    def discard_if(self, fn_predicate) -> None:
+        '''
+        A method for removing all of the items matching a predicate.
+        :param: fn_predicate: a function taking the key and the value of an
+        item and returning whether it must be removed.
+        '''
+        with self._o_lock:
+            for key in [
+                key for key, (_, value) in self._d_items.items()
+                if fn_predicate(key, value)
+            ]:
+                self._remove(key)
+
+    def clear(self) -> None:
+        '''
+        A method for removing every item from the cache.
+        '''
+        with self._o_lock:
+            self._d_items.clear()
+            self._i_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._d_items)
+
+    def _remove(self, key) -> None:
+        '''
+        A method for removing an item. The caller must hold the lock.
+        :param: key: the key of the item.
+        '''
+        t_item = self._d_items.pop(key, None)
+        if t_item is not None and self.i_max_bytes is not None:
+            self._i_bytes -= self.fn_size(t_item[1])
+
+class SXSQLiteCache:
+    '''
+    A cache stored in a local SQLite file so that every worker of the
+    server on the machine shares it. It is bounded by the number of items
+    and the oldest items are evicted first.
+    '''
+
+    # The number of writes between two evictions
+    I_EVICT_EVERY = 256
+
+    def __init__(self, s_path: str, i_max_items: int = 100000, f_ttl: float = 300.0) -> None:
+        '''
+        The constructor.
+        :param: s_path: the path of the SQLite file.
+        :param: i_max_items: the maximum number of items kept in the cache.
+        :param: f_ttl: the number of seconds an item lives for.
+        '''
+        self.s_path = s_path
+        self.i_max_items = i_max_items
+        self.f_ttl = f_ttl
+        self._o_local = threading.local()
+        self._i_writes = 0
+        o_conn = self._connection()
+        o_conn.execute(
+            'CREATE TABLE IF NOT EXISTS sxcache ('
+            'sx_key TEXT PRIMARY KEY, sx_value BLOB, sx_expires REAL, sx_stored REAL)'
+        )
+        o_conn.execute('CREATE INDEX IF NOT EXISTS ix_sxcache_sx_stored ON sxcache (sx_stored)')
+        # Workers forked afterwards must not share the connection
+        o_conn.close()
+        self._o_local = threading.local()
+
+    def get(self, s_key: str, default=None):
+        '''
+        A method for getting an item from the cache.
+        :param: s_key: the key of the item.
+        :param: default: the value returned when the item is missing.
+        :return: the cached bytes or default.
+        '''
+        try:
+            t_row = self._connection().execute(
+                'SELECT sx_value, sx_expires FROM sxcache WHERE sx_key = ?', (s_key,)
+            ).fetchone()
+        except sqlite3.Error:
+            return default
+        if t_row is None or t_row[1] <= time.time():
+            return default
+        return t_row[0]
+
+    def set(self, s_key: str, b_value: bytes) -> None:
+        '''
+        A method for adding an item to the cache.
+        :param: s_key: the key of the item.
+        :param: b_value: the bytes to be cached.
+        '''
+        f_now = time.time()
+        try:
+            o_conn = self._connection()
+            o_conn.execute(
+                'INSERT OR REPLACE INTO sxcache VALUES (?, ?, ?, ?)',
+                (s_key, b_value, f_now + self.f_ttl, f_now)
+            )
+            self._i_writes += 1
+            if self._i_writes % self.I_EVICT_EVERY == 0:
+                o_conn.execute('DELETE FROM sxcache WHERE sx_expires <= ?', (f_now,))
+                o_conn.execute(
+                    'DELETE FROM sxcache WHERE sx_key IN (SELECT sx_key FROM sxcache '
+                    'ORDER BY sx_stored DESC LIMIT -1 OFFSET ?)',
+                    (self.i_max_items,)
+                )
+        except sqlite3.Error:
+            # The shared tier is best effort, the local tier still works
+            pass
+
+    def clear(self) -> None:
+        '''
+        A method for removing every item from the cache.
+        '''
+        self._connection().execute('DELETE FROM sxcache')
+
+    def _connection(self) -> sqlite3.Connection:
+        '''
+        A method for getting the connection of the current thread.
+        :return: the connection in autocommit mode.
+        '''
+        o_conn = getattr(self._o_local, 'o_conn', None)
+        if o_conn is None:
+            o_conn = sqlite3.connect(self.s_path, timeout=1.0, isolation_level=None)
+            o_conn.execute('PRAGMA journal_mode=WAL')
+            o_conn.execute('PRAGMA synchronous=OFF')
+            self._o_local.o_conn = o_conn
+        return o_conn
+
+class SXTieredCache:
+    '''
+    A cache made of an in-process tier in front of an optional tier
+    shared between the workers. The values are bytes.
+    '''
+
+    def __init__(self, o_local: SXLRUCache, o_shared: SXSQLiteCache = None) -> None:
+        '''
+        The constructor.
+        :param: o_local: the in-process tier.
+        :param: o_shared: the shared tier.
+        '''
+        self.o_local = o_local
+        self.o_shared = o_shared
+
+    def get(self, s_key: str, default=None):
+        '''
+        A method for getting an item from the first tier holding it.
+        :param: s_key: the key of the item.
+        :param: default: the value returned when the item is missing.
+        :return: the cached bytes or default.
+        '''
+        b_value = self.o_local.get(s_key)
+        if b_value is None and self.o_shared is not None:
+            b_value = self.o_shared.get(s_key)
+            if b_value is not None:
+                self.o_local.set(s_key, b_value)
+        return default if b_value is None else b_value
+
+    def set(self, s_key: str, b_value: bytes) -> None:
+        '''
+        A method for adding an item to every tier.
+        :param: s_key: the key of the item.
+        :param: b_value: the bytes to be cached.
+        '''
+        self.o_local.set(s_key, b_value)
+        if self.o_shared is not None:
+            self.o_shared.set(s_key, b_value)
+
+    def clear(self) -> None:
+        '''
+        A method for removing every item from every tier.
+        '''
+        self.o_local.clear()
+        if self.o_shared is not None:
+            self.o_shared.clear()
+
+def create_typeahead_cache(d_config: dict) -> SXTieredCache:
+    '''
+    A method for creating the cache of the search results. The following
+    keys are read from the config:
+    TYPEAHEAD_CACHE_SIZE: the number of results kept in process (10000).
+    TYPEAHEAD_CACHE_BYTES: the memory the results can use in process (64 MB).
+    TYPEAHEAD_CACHE_TTL: the number of seconds a result lives for (300).
+    TYPEAHEAD_CACHE_PATH: the SQLite file shared between the workers. No
+    shared tier is used when it is not set.
+    :param: d_config: the configuration of the application.
+    :return: the cache.
+    '''
+    f_ttl = float(d_config.get('TYPEAHEAD_CACHE_TTL', 300))
+    s_path = d_config.get('TYPEAHEAD_CACHE_PATH')
+    if s_path:
+        os.makedirs(os.path.dirname(os.path.abspath(s_path)), exist_ok=True)
+    return SXTieredCache(
+        SXLRUCache(
+            int(d_config.get('TYPEAHEAD_CACHE_SIZE', 10000)),
+            f_ttl,
+            int(d_config.get('TYPEAHEAD_CACHE_BYTES', 64 * 1024 * 1024)),
+            len
+        ),
+        SXSQLiteCache(s_path, int(d_config.get('TYPEAHEAD_CACHE_SIZE', 10000)) * 10, f_ttl)
+        if s_path else None
+    )
+
+def typeahead_cached(*as_tables):
+    '''
+    A decorator for the search routes whose results only depend on the
+    arguments of the request and the content of the given tables. The
+    results are cached under the versions of the tables, so any write to
+    them makes the cached results unreachable. Hits are answered without
+    running the route or touching the database.
+    :param: as_tables: the tables the results are read from.
+    '''
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            o_cache = current_app.config.get('TYPEAHEAD_CACHE')
+            if o_cache is None:
+                return fn(*args, **kwargs)
+
+            t_versions = current_app.config['DB']['versions'].get(as_tables)
+            s_key = hashlib.sha1(repr((
+                request.endpoint,
+                t_versions,
+                sorted(request.args.items(multi=True))
+            )).encode()).hexdigest()
+
+            b_value = o_cache.get(s_key)
+            if b_value is not None:
+                return current_app.response_class(b_value, mimetype='application/json')
+
+            o_response, i_status = fn(*args, **kwargs)
+            if i_status == 200:
+                o_cache.set(s_key, o_response.get_data())
+            return o_response, i_status
+        return wrapper
+    return decorator
@@ -0,0 +1,181 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for hashing and checking
+the passwords outside of the request threads. The work
+runs in a small pool of processes and the number of
+waiting requests is bounded, so a burst of logins gets
+turned away early instead of stalling the whole API.
+Last revised: 10/18/26
+'''
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+class SXHashingBusy(Exception):
+    '''
+    Raised when the pool can not take any more work.
+    '''
+
+def _hash(s_password: str, s_method: str, i_salt_length: int) -> str:
+    return generate_password_hash(s_password, s_method, i_salt_length)
+
+def _verify(s_hash: str, s_password: str) -> bool:
+    return check_password_hash(s_hash, s_password)
+
+def _method_prefix(s_method: str) -> str:
+    '''
+    A method for getting the part of a hash before its salt without hashing,
+    with the default cost werkzeug uses for a method given without one.
+    :param: s_method: the werkzeug hashing method.
+    :return: the method along with its cost, e.g. "scrypt:32768:8:1".
+    :raise: ValueError if the method is not supported.
+    '''
+    s_name, *as_args = s_method.split(':')
+    if s_name == 'scrypt' and len(as_args) in (0, 3):
+        return 'scrypt:' + ':'.join(str(int(s)) for s in as_args or (2 ** 15, 8, 1))
+    if s_name == 'pbkdf2' and len(as_args) <= 2:
+        as_args += ['sha256', DEFAULT_PBKDF2_ITERATIONS][len(as_args):]
+        return f'pbkdf2:{as_args[0]}:{int(as_args[1])}'
+    raise ValueError(f'unsupported hashing method {s_method}')
+
+class SXPasswordHasher:
+    '''
+    Hashes and checks passwords in a pool of processes. At most
+    i_workers + i_max_pending operations are accepted at once and any
+    operation past that raises SXHashingBusy right away.
+    '''
+
+    def __init__(self, s_method: str = 'scrypt', i_salt_length: int = 16, i_workers: int = 1,
+                 i_max_pending: int = 8, f_timeout: float = 10.0) -> None:
+        '''
+        The constructor. The processes are only started on first use.
+        :param: s_method: the werkzeug hashing method along with its cost,
+        e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000".
+        :param: i_salt_length: the length of the salts.
+        :param: i_workers: the number of processes. 0 hashes on the calling
+        thread, which is only meant for development.
+        :param: i_max_pending: the number of operations that can wait for
+        a free process.
+        :param: f_timeout: the number of seconds to wait for an operation.
+        '''
+        self.s_method = s_method
+        self.i_salt_length = i_salt_length
+        self.i_workers = i_workers
+        self.f_timeout = f_timeout
+        self._o_slots = threading.BoundedSemaphore(i_workers + i_max_pending)
+        self._o_lock = threading.Lock()
+        self._o_pool = None
+        self._i_pid = None
+        self._s_prefix = _method_prefix(s_method)
+
+    def hash(self, s_password: str) -> str:
+        '''
+        A method for hashing a password with the configured method.
+        :param: s_password: the password.
+        :return: the hash.
+        :raise: SXHashingBusy if the pool is saturated.
+        '''
+        return self._run(_hash, s_password, self.s_method, self.i_salt_length)
+
+    def verify(self, s_hash: str, s_password: str) -> bool:
+        '''
+        A method for checking a password against its hash.
+        :param: s_hash: the stored hash.
+        :param: s_password: the password.
+        :return: whether the password matches.
+        :raise: SXHashingBusy if the pool is saturated.
+        '''
+        return self._run(_verify, s_hash, s_password)
+
+    def needs_rehash(self, s_hash: str) -> bool:
+        '''
+        A method for checking whether a hash was made with a different
+        method or cost than the configured ones.
+        :param: s_hash: the stored hash.
+        :return: whether the password should be hashed again.
+        '''
+        return s_hash.split('$', 1)[0] != self._s_prefix
+
+    def shutdown(self, b_wait: bool = False) -> None:
+        '''
+        A method for stopping the processes.
+        :param: b_wait: whether to wait for the processes to exit.
+        '''
+        with self._o_lock:
+            if self._o_pool is not None:
+                self._o_pool.shutdown(wait=b_wait, cancel_futures=True)
+                self._o_pool = None
+
+    def _run(self, fn, *args):
+        '''
+        A method for running a function in the pool.
+        :param: fn: the function.
+        :return: the result of the function.
+        '''
+        if not self._o_slots.acquire(blocking=False):
+            raise SXHashingBusy()
+        if self.i_workers == 0:
+            try:
+                return fn(*args)
+            finally:
+                self._o_slots.release()
+        try:
+            o_future = self._pool().submit(fn, *args)
+        except BaseException:
+            self._o_slots.release()
+            raise
+        # The slot is held until the operation is over rather than until the
+        # caller stops waiting, so operations that time out still count
+        o_future.add_done_callback(lambda _: self._o_slots.release())
+        try:
+            return o_future.result(self.f_timeout)
+        except FutureTimeoutError:
+            raise SXHashingBusy()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        '''
+        A method for getting the pool of the current process. A forked
+        worker of the server starts its own pool.
+        :return: the pool.
+        '''
+        with self._o_lock:
+            if self._o_pool is None or self._i_pid != os.getpid():
+                # The server is threaded by now and forking it could leave the
+                # processes stuck on a lock held by another thread. They are
+                # forked from a clean server process instead, which has
+                # the hashing loaded once for all of them. Like any pool that
+                # is not forked, it imports the main module of the program,
+                # which must keep its work under if __name__ == '__main__'.
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    o_context = multiprocessing.get_context('forkserver')
+                    o_context.set_forkserver_preload([__name__])
+                else:
+                    o_context = multiprocessing.get_context('spawn')
+                self._o_pool = ProcessPoolExecutor(self.i_workers, mp_context=o_context)
+                self._i_pid = os.getpid()
+            return self._o_pool
+
+def create_password_hasher(d_config: dict) -> SXPasswordHasher:
+    '''
+    A method for creating the password hasher. The following keys are
+    read from the config:
+    PASSWORD_METHOD: the werkzeug hashing method and cost (scrypt).
+    PASSWORD_SALT_LENGTH: the length of the salts (16).
+    PASSWORD_HASH_WORKERS: the number of processes (half of the cpus).
+    PASSWORD_HASH_QUEUE: the number of operations that can wait (4 per process).
+    PASSWORD_HASH_TIMEOUT: the seconds to wait for an operation (10).
+    :param: d_config: the configuration of the application.
+    :return: the hasher.
+    '''
+    i_workers = int(d_config.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+    return SXPasswordHasher(
+        d_config.get('PASSWORD_METHOD', 'scrypt'),
+        int(d_config.get('PASSWORD_SALT_LENGTH', 16)),
+        i_workers,
+        int(d_config.get('PASSWORD_HASH_QUEUE', 4 * max(i_workers, 1))),
+        float(d_config.get('PASSWORD_HASH_TIMEOUT', 10))
+    )
@@ -0,0 +1,346 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for managing the keys
+that sign the authentication tokens. The keys are
+kept on disk so that every worker of the server and
+every restart shares the same key ring.
+Last revised: 10/18/26
+'''
+
+import fcntl
+import os
+import secrets
+import threading
+import time
+import click
+import jwt
+from flask import current_app
+from flask.cli import AppGroup
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+# The algorithms a key can be generated for
+AS_ALGORITHMS = ['RS256', 'EdDSA']
+
+# The name of the file holding the id of the key used for signing
+S_ACTIVE_FILE = 'active'
+
+# The name of the file used for locking the directory between workers
+S_LOCK_FILE = '.lock'
+
+class SXKeyRing:
+    '''
+    A ring of signing keys stored in a directory. Every key lives in its
+    own <kid>.pem file and the active file names the key that signs new
+    tokens. Retired keys stay in the ring so tokens they signed keep
+    verifying until the keys are pruned.
+    '''
+
+    def __init__(self, s_directory: str, s_algorithm: str = 'RS256', f_check_interval: float = 5.0,
+                 b_lazy: bool = False) -> None:
+        '''
+        The constructor. The keys are loaded from the directory and a key
+        is generated if the directory does not have one yet.
+        :param: s_directory: the directory the keys are stored in.
+        :param: s_algorithm: the algorithm new keys are generated for.
+        :param: f_check_interval: the number of seconds between checks of the
+        directory for keys rotated by other workers.
+        :param: b_lazy: whether the keys are only loaded when first used.
+        '''
+        if s_algorithm not in AS_ALGORITHMS:
+            raise ValueError(f'unsupported token algorithm {s_algorithm}')
+        self.s_directory = s_directory
+        self.s_algorithm = s_algorithm
+        self.f_check_interval = f_check_interval
+        # Incremented every time the set of keys changes
+        self._i_generation = 0
+        self._o_lock = threading.Lock()
+        self._d_keys = {}
+        self._s_active = None
+        self._f_active_mtime = None
+        self._f_checked = 0.0
+        self._b_loaded = False
+        if not b_lazy:
+            self.load()
+
+    def load(self) -> None:
+        '''
+        A method for loading the keys, generating the first key if the
+        directory does not have one yet. It only does anything the first
+        time it gets called.
+        '''
+        if self._b_loaded:
+            return
+        os.makedirs(self.s_directory, mode=0o700, exist_ok=True)
+        self.reload()
+        if self._s_active is None:
+            with self._directory_lock():
+                # Another worker may have generated it while we were waiting
+                self.reload()
+                if self._s_active is None:
+                    self._generate()
+                    self.reload()
+        self._b_loaded = True
+
+    @property
+    def active_kid(self) -> str:
+        '''
+        The id of the key that signs new tokens.
+        '''
+        self.refresh()
+        return self._s_active
+
+    @property
+    def generation(self) -> int:
+        '''
+        A counter that changes every time keys are added, rotated or
+        removed, used for invalidating anything derived from the keys.
+        '''
+        self.refresh()
+        return self._i_generation
+
+    def kids(self) -> list[str]:
+        '''
+        A method for getting the ids of all the keys in the ring.
+        :return: the ids sorted from the oldest to the newest.
+        '''
+        self.refresh()
+        return sorted(self._d_keys)
+
+    def encode(self, d_claims: dict) -> str:
+        '''
+        A method for signing the claims with the active key.
+        :param: d_claims: the claims of the token.
+        :return: the signed token.
+        '''
+        self.refresh()
+        s_kid = self._s_active
+        o_private, _, s_algorithm = self._d_keys[s_kid]
+        return jwt.encode(
+            d_claims,
+            o_private,
+            algorithm=s_algorithm,
+            headers={'kid': s_kid}
+        )
+
+    def decode(self, s_token: str) -> dict:
+        '''
+        A method for verifying a token with the key it was signed by.
+        :param: s_token: the token.
+        :return: the claims of the token.
+        :raise: jwt.InvalidTokenError if the token can not be verified.
+        '''
+        self.load()
+        s_kid = jwt.get_unverified_header(s_token).get('kid')
+        o_key = self._d_keys.get(s_kid)
+        if o_key is None:
+            # The key may have been added by another worker
+            self.reload()
+            o_key = self._d_keys.get(s_kid)
+        if o_key is None:
+            raise jwt.InvalidTokenError('unknown key id')
+        _, o_public, s_algorithm = o_key
+        return jwt.decode(s_token, o_public, algorithms=[s_algorithm])
+
+    def rotate(self) -> str:
+        '''
+        A method for generating a new key and making it the active one.
+        The previous keys keep verifying the tokens they signed.
+        :return: the id of the new key.
+        '''
+        self.load()
+        with self._directory_lock():
+            s_kid = self._generate()
+        self.reload()
+        return s_kid
+
+    def prune(self, i_keep: int = 2) -> list[str]:
+        '''
+        A method for removing the oldest keys from the ring. Tokens signed
+        by the removed keys stop verifying. The active key is never removed.
+        :param: i_keep: the number of newest keys to keep.
+        :return: the ids of the removed keys.
+        '''
+        self.load()
+        as_removed = []
+        with self._directory_lock():
+            self.reload()
+            as_kids = sorted(self._d_keys)
+            for s_kid in as_kids[:max(len(as_kids) - i_keep, 0)]:
+                if s_kid == self._s_active:
+                    continue
+                os.remove(os.path.join(self.s_directory, f'{s_kid}.pem'))
+                as_removed.append(s_kid)
+            if as_removed:
+                # Touching the active file makes the other workers reload
+                _write_atomic(
+                    os.path.join(self.s_directory, S_ACTIVE_FILE),
+                    self._s_active.encode()
+                )
+        self.reload()
+        return as_removed
+
+    def reload(self) -> None:
+        '''
+        A method for loading the keys from the directory.
+        '''
+        with self._o_lock:
+            d_keys = {}
+            for s_file in os.listdir(self.s_directory):
+                if not s_file.endswith('.pem'):
+                    continue
+                s_kid = s_file[:-len('.pem')]
+                d_keys[s_kid] = self._d_keys.get(s_kid) or self._load_key(
+                    os.path.join(self.s_directory, s_file)
+                )
+
+            s_active = None
+            f_mtime = None
+            s_active_path = os.path.join(self.s_directory, S_ACTIVE_FILE)
+            if os.path.exists(s_active_path):
+                f_mtime = os.stat(s_active_path).st_mtime
+                with open(s_active_path) as o_file:
+                    s_active = o_file.read().strip() or None
+            if s_active not in d_keys:
+                s_active = None
+
+            if d_keys.keys() != self._d_keys.keys() or s_active != self._s_active:
+                self._i_generation += 1
+            self._d_keys = d_keys
+            self._s_active = s_active
+            self._f_active_mtime = f_mtime
+            self._f_checked = time.monotonic()
+
+    @property
+    def stale(self) -> bool:
+        '''
+        Whether the next use of the ring reads the directory.
+        '''
+        return not self._b_loaded or time.monotonic() - self._f_checked >= self.f_check_interval
+
+    def refresh(self) -> None:
+        '''
+        A method for picking up keys rotated by other workers. The
+        directory is checked at most once every f_check_interval seconds.
+        '''
+        if not self._b_loaded:
+            self.load()
+            return
+        if not self.stale:
+            return
+        self._f_checked = time.monotonic()
+        s_active_path = os.path.join(self.s_directory, S_ACTIVE_FILE)
+        try:
+            f_mtime = os.stat(s_active_path).st_mtime
+        except FileNotFoundError:
+            f_mtime = None
+        if f_mtime != self._f_active_mtime:
+            self.reload()
+
+    def _generate(self) -> str:
+        '''
+        A method for generating a new key and marking it as active. The
+        caller must hold the directory lock.
+        :return: the id of the new key.
+        '''
+        if self.s_algorithm == 'EdDSA':
+            o_private = ed25519.Ed25519PrivateKey.generate()
+        else:
+            o_private = rsa.generate_private_key(
+                public_exponent=65537,
+                key_size=2048
+            )
+        pem_private = o_private.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+
+        # The ids sort by their creation time
+        i_now = time.time_ns() // 1000
+        s_kid = '{}{:06d}-{}'.format(
+            time.strftime('%Y%m%d%H%M%S', time.gmtime(i_now // 10 ** 6)),
+            i_now % 10 ** 6,
+            secrets.token_hex(4)
+        )
+        _write_atomic(os.path.join(self.s_directory, f'{s_kid}.pem'), pem_private)
+        _write_atomic(os.path.join(self.s_directory, S_ACTIVE_FILE), s_kid.encode())
+        return s_kid
+
+    def _directory_lock(self):
+        '''
+        A method for getting an exclusive lock over the key directory
+        shared between all of the processes.
+        :return: a context manager holding the lock.
+        '''
+        return _FileLock(os.path.join(self.s_directory, S_LOCK_FILE))
+
+    @staticmethod
+    def _load_key(s_path: str) -> tuple:
+        '''
+        A method for loading a private key from the disk.
+        :param: s_path: the path of the pem file.
+        :return: the private key, the public key and the algorithm of the key.
+        '''
+        with open(s_path, 'rb') as o_file:
+            o_private = serialization.load_pem_private_key(o_file.read(), password=None)
+        s_algorithm = 'EdDSA' if isinstance(o_private, ed25519.Ed25519PrivateKey) else 'RS256'
+        return o_private, o_private.public_key(), s_algorithm
+
+class _FileLock:
+    '''
+    An exclusive flock over a file used as a context manager.
+    '''
+
+    def __init__(self, s_path: str) -> None:
+        self.s_path = s_path
+        self._i_fd = None
+
+    def __enter__(self):
+        self._i_fd = os.open(self.s_path, os.O_CREAT | os.O_RDWR, 0o600)
+        fcntl.flock(self._i_fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args) -> None:
+        fcntl.flock(self._i_fd, fcntl.LOCK_UN)
+        os.close(self._i_fd)
+
+def _write_atomic(s_path: str, b_data: bytes) -> None:
+    '''
+    A method for writing a file so that readers never see it half written.
+    :param: s_path: the destination path.
+    :param: b_data: the content of the file.
+    '''
+    s_tmp = f'{s_path}.{os.getpid()}.tmp'
+    i_fd = os.open(s_tmp, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+    with os.fdopen(i_fd, 'wb') as o_file:
+        o_file.write(b_data)
+    os.replace(s_tmp, s_path)
+
+cli = AppGroup('keys', help='Manage the keys signing the authentication tokens.')
+
+@cli.command('list')
+def list_keys():
+    '''
+    Lists the keys of the ring.
+    '''
+    o_keyring: SXKeyRing = current_app.config['KEYRING']
+    for s_kid in o_keyring.kids():
+        click.echo(f'{s_kid} (active)' if s_kid == o_keyring.active_kid else s_kid)
+
+@cli.command('rotate')
+def rotate_keys():
+    '''
+    Generates a new signing key and makes it active.
+    '''
+    click.echo(current_app.config['KEYRING'].rotate())
+
+@cli.command('prune')
+@click.option('--keep', default=2, show_default=True, help='The number of newest keys to keep.')
+def prune_keys(keep: int):
+    '''
+    Removes the oldest keys from the ring.
+    '''
+    for s_kid in current_app.config['KEYRING'].prune(keep):
+        click.echo(s_kid)
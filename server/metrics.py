@@ -0,0 +1,275 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for instrumenting the
+requests and the database queries. The measurements
+are kept in memory and rendered in the Prometheus
+text format by the /metrics endpoint.
+Last revised: 10/18/26
+'''
+
+import logging
+import threading
+import time
+from collections import Counter
+from flask import Flask, g, has_request_context, request
+from sqlalchemy import event
+
+# The upper bounds of the latency buckets in seconds
+AF_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The upper bounds of the buckets of queries per request
+AF_QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+o_logger = logging.getLogger('server.metrics')
+
+class SXHistogram:
+    '''
+    A cumulative histogram in the way Prometheus expects it.
+    '''
+
+    def __init__(self, af_buckets: tuple) -> None:
+        self.af_buckets = af_buckets
+        self.ai_counts = [0] * len(af_buckets)
+        self.f_sum = 0.0
+        self.i_count = 0
+
+    def observe(self, f_value: float) -> None:
+        '''
+        A method for recording a measurement.
+        :param: f_value: the measured value.
+        '''
+        for i, f_bound in enumerate(self.af_buckets):
+            if f_value <= f_bound:
+                self.ai_counts[i] += 1
+        self.f_sum += f_value
+        self.i_count += 1
+
+class SXMetrics:
+    '''
+    The measurements of the application. Every request records its
+    latency, the number of queries it ran and the time spent in them.
+    A request running the same statement many times is flagged as an
+    N+1 pattern.
+    '''
+
+    def __init__(self, i_n_plus_one_threshold: int = 10, f_slow_query_ms: float = None) -> None:
+        '''
+        The constructor.
+        :param: i_n_plus_one_threshold: the number of times a statement can
+        run within a request before it is flagged as N+1.
+        :param: f_slow_query_ms: the duration in milliseconds above which
+        queries are logged. None disables the slow query log.
+        '''
+        self.i_n_plus_one_threshold = i_n_plus_one_threshold
+        self.f_slow_query_ms = f_slow_query_ms
+        self._o_lock = threading.Lock()
+        self._d_latency = {}
+        self._d_queries = {}
+        self._d_requests = Counter()
+        self._d_query_seconds = Counter()
+        self._d_n_plus_one = Counter()
+        self._i_sql_queries = 0
+        self._f_sql_seconds = 0.0
+        self._i_slow_queries = 0
+
+    def record_request(self, s_endpoint: str, s_method: str, i_status: int,
+                       f_seconds: float, i_queries: int, f_query_seconds: float) -> None:
+        '''
+        A method for recording a finished request.
+        :param: s_endpoint: the endpoint that handled the request.
+        :param: s_method: the http method.
+        :param: i_status: the status code of the response.
+        :param: f_seconds: the time it took to handle the request.
+        :param: i_queries: the number of queries the request ran.
+        :param: f_query_seconds: the time spent in the queries.
+        '''
+        t_key = (s_endpoint, s_method)
+        with self._o_lock:
+            self._d_latency.setdefault(t_key, SXHistogram(AF_LATENCY_BUCKETS)).observe(f_seconds)
+            self._d_queries.setdefault(t_key, SXHistogram(AF_QUERY_BUCKETS)).observe(i_queries)
+            self._d_requests[(s_endpoint, s_method, str(i_status))] += 1
+            self._d_query_seconds[t_key] += f_query_seconds
+
+    def record_query(self, s_statement: str, f_seconds: float) -> None:
+        '''
+        A method for recording a query.
+        :param: s_statement: the sql statement.
+        :param: f_seconds: the time the query took.
+        '''
+        with self._o_lock:
+            self._i_sql_queries += 1
+            self._f_sql_seconds += f_seconds
+        if self.f_slow_query_ms is not None and f_seconds * 1000 >= self.f_slow_query_ms:
+            with self._o_lock:
+                self._i_slow_queries += 1
+            o_logger.warning(
+                'slow query (%.1f ms) in %s: %s',
+                f_seconds * 1000,
+                request.endpoint if has_request_context() else None,
+                ' '.join(s_statement.split())
+            )
+
+    def record_n_plus_one(self, s_endpoint: str, s_statement: str, i_times: int) -> None:
+        '''
+        A method for recording a statement that ran too many times
+        within a single request.
+        :param: s_endpoint: the endpoint that handled the request.
+        :param: s_statement: the sql statement.
+        :param: i_times: the number of times it ran.
+        '''
+        with self._o_lock:
+            self._d_n_plus_one[s_endpoint] += 1
+        o_logger.warning(
+            'possible N+1 in %s, statement ran %d times: %s',
+            s_endpoint,
+            i_times,
+            ' '.join(s_statement.split())
+        )
+
+    def render(self) -> str:
+        '''
+        A method for rendering the measurements.
+        :return: the measurements in the Prometheus text format.
+        '''
+        as_lines = []
+        with self._o_lock:
+            _render_histograms(
+                as_lines,
+                'sx_request_duration_seconds',
+                'The time it took to handle the requests.',
+                self._d_latency
+            )
+            _render_histograms(
+                as_lines,
+                'sx_request_queries',
+                'The number of sql queries run per request.',
+                self._d_queries
+            )
+
+            as_lines.append('# HELP sx_requests_total The number of handled requests.')
+            as_lines.append('# TYPE sx_requests_total counter')
+            for (s_endpoint, s_method, s_status), i_count in sorted(self._d_requests.items()):
+                as_lines.append('sx_requests_total{%s} %d' % (_labels(
+                    endpoint=s_endpoint, method=s_method, status=s_status
+                ), i_count))
+
+            as_lines.append('# HELP sx_request_query_seconds_total The time requests spent in sql queries.')
+            as_lines.append('# TYPE sx_request_query_seconds_total counter')
+            for (s_endpoint, s_method), f_seconds in sorted(self._d_query_seconds.items()):
+                as_lines.append('sx_request_query_seconds_total{%s} %r' % (_labels(
+                    endpoint=s_endpoint, method=s_method
+                ), f_seconds))
+
+            as_lines.append('# HELP sx_n_plus_one_total The requests that ran a statement repeatedly.')
+            as_lines.append('# TYPE sx_n_plus_one_total counter')
+            for s_endpoint, i_count in sorted(self._d_n_plus_one.items()):
+                as_lines.append('sx_n_plus_one_total{%s} %d' % (_labels(endpoint=s_endpoint), i_count))
+
+            as_lines.append('# HELP sx_sql_queries_total The number of sql queries.')
+            as_lines.append('# TYPE sx_sql_queries_total counter')
+            as_lines.append('sx_sql_queries_total %d' % self._i_sql_queries)
+            as_lines.append('# HELP sx_sql_query_seconds_total The time spent in sql queries.')
+            as_lines.append('# TYPE sx_sql_query_seconds_total counter')
+            as_lines.append('sx_sql_query_seconds_total %r' % self._f_sql_seconds)
+            as_lines.append('# HELP sx_sql_slow_queries_total The queries above the slow query threshold.')
+            as_lines.append('# TYPE sx_sql_slow_queries_total counter')
+            as_lines.append('sx_sql_slow_queries_total %d' % self._i_slow_queries)
+        return '\n'.join(as_lines) + '\n'
+
+def _labels(**kwargs) -> str:
+    '''
+    A method for formatting Prometheus labels.
+    :return: the labels separated by commas.
+    '''
+    return ','.join(
+        '%s="%s"' % (s_key, str(s_value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for s_key, s_value in kwargs.items()
+    )
+
+def _render_histograms(as_lines: list, s_name: str, s_help: str, d_histograms: dict) -> None:
+    '''
+    A method for rendering the histograms of every endpoint.
+    :param: as_lines: the lines the output is appended to.
+    :param: s_name: the name of the metric.
+    :param: s_help: the description of the metric.
+    :param: d_histograms: the histograms by endpoint and method.
+    '''
+    as_lines.append(f'# HELP {s_name} {s_help}')
+    as_lines.append(f'# TYPE {s_name} histogram')
+    for (s_endpoint, s_method), o_histogram in sorted(d_histograms.items()):
+        s_labels = _labels(endpoint=s_endpoint, method=s_method)
+        for f_bound, i_count in zip(o_histogram.af_buckets, o_histogram.ai_counts):
+            as_lines.append('%s_bucket{%s,le="%s"} %d' % (s_name, s_labels, f_bound, i_count))
+        as_lines.append('%s_bucket{%s,le="+Inf"} %d' % (s_name, s_labels, o_histogram.i_count))
+        as_lines.append('%s_sum{%s} %r' % (s_name, s_labels, o_histogram.f_sum))
+        as_lines.append('%s_count{%s} %d' % (s_name, s_labels, o_histogram.i_count))
+
+def setup_metrics(o_app: Flask, o_engine) -> SXMetrics:
+    '''
+    A method for instrumenting the requests of the application and the
+    queries of the engine. The following keys are read from the config:
+    N_PLUS_ONE_THRESHOLD: the number of times a statement can run within
+    a request before it is flagged (10).
+    SLOW_QUERY_MS: the duration above which queries are logged (disabled).
+    :param: o_app: the application.
+    :param: o_engine: the engine of the database.
+    :return: the metrics instance, also available as config['METRICS'].
+    '''
+    f_slow_query_ms = o_app.config.get('SLOW_QUERY_MS')
+    o_metrics = SXMetrics(
+        int(o_app.config.get('N_PLUS_ONE_THRESHOLD', 10)),
+        None if f_slow_query_ms is None else float(f_slow_query_ms)
+    )
+    o_app.config['METRICS'] = o_metrics
+
+    @o_app.before_request
+    def start_request():
+        g.sx_request_start = time.perf_counter()
+        g.sx_queries = Counter()
+        g.sx_query_seconds = 0.0
+
+    @o_app.after_request
+    def finish_request(o_response):
+        if 'sx_request_start' not in g:
+            return o_response
+        s_endpoint = request.endpoint or 'unmatched'
+        o_metrics.record_request(
+            s_endpoint,
+            request.method,
+            o_response.status_code,
+            time.perf_counter() - g.sx_request_start,
+            sum(g.sx_queries.values()),
+            g.sx_query_seconds
+        )
+        for s_statement, i_times in g.sx_queries.items():
+            if i_times >= o_metrics.i_n_plus_one_threshold:
+                o_metrics.record_n_plus_one(s_endpoint, s_statement, i_times)
+        return o_response
+
+    instrument_engine(o_metrics, o_engine)
+    return o_metrics
+
+def instrument_engine(o_metrics: SXMetrics, o_engine) -> None:
+    '''
+    A method for timing every query of an engine.
+    :param: o_metrics: the metrics instance.
+    :param: o_engine: the engine.
+    '''
+    @event.listens_for(o_engine, 'before_cursor_execute')
+    def before_cursor_execute(o_conn, o_cursor, s_statement, parameters, o_context, b_executemany):
+        o_conn.info.setdefault('sx_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(o_engine, 'after_cursor_execute')
+    def after_cursor_execute(o_conn, o_cursor, s_statement, parameters, o_context, b_executemany):
+        f_seconds = time.perf_counter() - o_conn.info['sx_query_start'].pop()
+        o_metrics.record_query(s_statement, f_seconds)
+        if has_request_context() and 'sx_queries' in g:
+            g.sx_queries[s_statement] += 1
+            g.sx_query_seconds += f_seconds
+
+    @event.listens_for(o_engine, 'handle_error')
+    def handle_error(o_context):
+        # The query failed before after_cursor_execute could pop its start
+        if o_context.connection is not None and o_context.connection.info.get('sx_query_start'):
+            o_context.connection.info['sx_query_start'].pop()
@@ -0,0 +1,64 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is responsible for turning the results of
+the queries into json. The rows are mapped to their
+keys without going through the orm and the json gets
+encoded by orjson when it is installed.
+Last revised: 10/18/26
+'''
+
+from flask.json.provider import DefaultJSONProvider
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class SXJSONProvider(DefaultJSONProvider):
+    '''
+    The json provider of the application. It produces the same output
+    as the default provider of Flask, only faster when orjson is around.
+    '''
+
+    def dumps(self, obj, **kwargs) -> str:
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            self._dumps_bytes(obj) + b'\n',
+            mimetype=self.mimetype
+        )
+
+    def _dumps_bytes(self, obj) -> bytes:
+        '''
+        A method for encoding an object with orjson. Dates and anything
+        orjson does not know are handled the way Flask handles them.
+        :param: obj: the object.
+        :return: the encoded json.
+        '''
+        i_options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            i_options |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=i_options)
+
+def row_encoder(*as_keys):
+    '''
+    A method for making the function that turns query rows into the
+    dictionaries of a response. The columns of the rows are mapped to
+    the keys by their position and any column past the keys is dropped.
+    :param: as_keys: the keys of the dictionaries in column order.
+    :return: a function taking the rows and returning the dictionaries.
+    '''
+    def encode(lo_rows) -> list[dict]:
+        return [dict(zip(as_keys, o)) for o in lo_rows]
+    return encode
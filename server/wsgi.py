@@ -0,0 +1,19 @@
+'''
+Author: Kia Kalani
+Version: 1.00
+This module is the WSGI entry point of the server,
+e.g. gunicorn --preload -w 4 server.wsgi:app. With
+--preload the application is made and warmed once
+in the parent and every forked worker shares its
+memory until it writes to it.
+Last revised: 10/18/26
+'''
+
+import gc
+from server import create_app, warm
+
+app = create_app()
+warm(app)
+# Moving the objects made so far out of the reach of the garbage
+# collector, whose passes would otherwise copy their pages in every worker
+gc.freeze()
@@ -4,6 +4,7 @@
 /// for a template client communicator.
 library;
 
+import 'dart:convert';
 import 'dart:io';
 
 import 'package:dio/dio.dart';
@@ -181,6 +182,95 @@ class SXServerTemplate {
     );
   }
 
+  /// <summary>
+  /// A wrapper method for running many requests
+  /// against the server in a single round trip.
+  /// </summary>
+  /// <param name="requests"> The requests, each one
+  /// being a map of method, path and optionally body.
+  /// </param>
+  /// <param name="parallel"> Whether the get requests
+  /// can run concurrently on the server.
+  /// </param>
+  /// <return> a response object holding the status and
+  /// body of every request in the same order.</return>
+  Future<Response?> batchRequest(List<Map<String, dynamic>> requests, {
+    bool parallel = true,
+    CancelToken? cancelToken,
+  }) async {
+    return await postRequest(
+      "batch",
+      data: {"requests": requests, "parallel": parallel},
+      cancelToken: cancelToken
+    );
+  }
+
+  /// <summary>
+  /// A method for following the changes made on the
+  /// server to the customers, patients, products and
+  /// invoices instead of fetching them again to notice.
+  /// The connection is opened again whenever it ends,
+  /// resuming after the last change received.
+  /// </summary>
+  /// <param name="since"> The version to resume after,
+  /// or null to only get the changes from now on.
+  /// </param>
+  /// <return> a stream of the changes, each one being a
+  /// map of version, table, op, key and date.</return>
+  Stream<Map<String, dynamic>> changes({
+    int? since,
+    CancelToken? cancelToken,
+  }) async* {
+    String? lastId = since?.toString();
+    Duration retry = const Duration(seconds: 2);
+    while (!(cancelToken?.isCancelled ?? false)) {
+      String? ip = await storage!.read(key: "ip");
+      String? port = await storage!.read(key: "port");
+      String? token = await storage!.read(key: "token");
+      if (null == ip || null == port || null == token) return;
+
+      try {
+        var resp = await dioInst!.get<ResponseBody>(
+          "http://$ip:$port/changes/stream",
+          options: Options(headers: {
+            'Accept': 'text/event-stream',
+            'Auth-Token': token,
+            if (null != lastId) 'Last-Event-ID': lastId,
+          }, responseType: ResponseType.stream,
+          // 4xx reach the check below, 5xx are retried like network errors
+          validateStatus: (status) => status! < 500),
+          cancelToken: cancelToken
+        );
+        // the token is no longer valid
+        if (resp.statusCode != 200 || null == resp.data) return;
+
+        // reading the events, each one ending with an empty line
+        String data = "";
+        var lines = resp.data!.stream
+          .cast<List<int>>()
+          .transform(utf8.decoder)
+          .transform(const LineSplitter());
+        await for (var line in lines) {
+          if (line.startsWith("retry:")) {
+            int? ms = int.tryParse(line.substring(6).trim());
+            if (null != ms) retry = Duration(milliseconds: ms);
+          } else if (line.startsWith("id:")) {
+            lastId = line.substring(3).trim();
+          } else if (line.startsWith("data:")) {
+            data = line.substring(5).trim();
+          } else if (line.isEmpty && data.isNotEmpty) {
+            yield jsonDecode(data) as Map<String, dynamic>;
+            data = "";
+          }
+        }
+      } on DioException catch (e) {
+        // network errors and server errors are retried
+        if (CancelToken.isCancel(e)) return;
+      }
+      await Future.delayed(retry);
+    }
+  }
+
   /// <summary>
   /// A method that would indicate if the user
   /// is currently logged in.